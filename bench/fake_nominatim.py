@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Local stand-in for Nominatim's ``/search`` and ``/reverse`` with tunable latency and errors.
+
+Answers are derived from a hash of the query, so they are stable between
+runs; ``none`` anywhere in a query gives an empty result. Each request sleeps
+``latency`` seconds (plus up to ``jitter``) and fails with HTTP 503 with
+probability ``error_rate``, which exercises the engine's retries.
+``/stats`` returns the number of requests and injected errors so far.
+
+    python bench/fake_nominatim.py --port 8765 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeNominatim:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real service; otherwise connection setup dominates at
+            # low latency. Headers and body are separate writes, so Nagle would hold the
+            # body back for an ACK
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body = fake.answer(
+                    url.path.rstrip("/").rsplit("/", 1)[-1],
+                    {k: v[0] for k, v in parse_qs(url.query).items()},
+                )
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def answer(self, endpoint: str, params: dict):
+        if endpoint == "stats":
+            return 200, {"requests": self.requests, "errors": self.errors}
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.error_rate
+            self.errors += fail
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return 503, {"error": "Service Unavailable"}
+        if endpoint == "reverse":
+            lat, lon = float(params["lat"]), float(params["lon"])
+            return 200, {
+                "lat": f"{lat:.7f}",
+                "lon": f"{lon:.7f}",
+                "type": "house",
+                "display_name": f"Fakestraße {int(abs(lat * 1e4)) % 200 + 1}, Österreich",
+            }
+        query = params.get("q", "")
+        if endpoint != "search" or "none" in query.lower():
+            return 200, []
+        h = int(hashlib.sha1(query.encode("utf-8")).hexdigest()[:12], 16)
+        lat, lon = (
+            46.5 + (h % 100_000) / 40_000,
+            9.6 + (h // 100_000 % 100_000) / 14_000,
+        )
+        return 200, [
+            {
+                "lat": f"{lat:.7f}",
+                "lon": f"{lon:.7f}",
+                "display_name": query,
+                "type": "house",
+                "class": "building",
+            }
+        ]
+
+    def start(self) -> "FakeNominatim":
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fake-nominatim", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeNominatim":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a fake Nominatim API for benchmarks."
+    )
+    parser.add_argument(
+        "--port", type=int, default=8765, help="Port to listen on (default: 8765)"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per request (default: 0)"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Additional random seconds per request (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with HTTP 503 (default: 0)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for jitter and errors (default: 0)"
+    )
+    args = parser.parse_args()
+    server = FakeNominatim(
+        args.port, args.latency, args.jitter, args.error_rate, args.seed
+    )
+    print(f"Fake Nominatim on {server.url} (Ctrl+C to stop)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
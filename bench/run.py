@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""Time the geocoding pipeline stage by stage on synthetic exports, offline.
+
+For every size a synthetic ``Alle Projekte`` export is generated (and kept in
+``bench/.data`` for later runs) and pushed through the same functions the CLI
+and the pages use:
+
+* ``csv_ingest``        read_project_export of the latin-1 CSV
+* ``address_build``     address series, normalization and dedupe
+* ``geocoding``         geocode_addresses against bench/fake_nominatim.py (first --geocode-limit addresses)
+* ``geocoding_cached``  the same addresses again, answered by the SQLite cache
+* ``result_assembly``   typed result columns for every distinct address, broadcast to the rows
+* ``xlsx_export``       the CLI's chunked write of export + results to .xlsx
+* ``xlsx_ingest``       reading that workbook back
+* ``kepler_payload``    the Project Map's columnar kepler.gl payload (bytes in ``bytes``)
+* ``kepler_clusters``   cluster pyramid and the aggregated map payload
+* ``snapshot_diff``     utils/changes.py's compare of the export with a later synthetic snapshot of it
+* ``cli``               utils/adress_to_coordinate.py end to end (sizes up to --cli-max-rows)
+
+The fake geocoder runs in its own process so it does not compete with the
+code under test for the GIL. Results are written as JSON (``bench/results/<timestamp>.json`` by default).
+``--compare`` checks a run against an earlier one and exits with status 1 if
+a stage got slower by more than ``--threshold``, so it can gate changes:
+
+    python bench/run.py --sizes 1000 10000 --latency 0.01 --error-rate 0.02
+    python bench/run.py --sizes 1000 10000 --compare bench/results/20250415-103100.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench.synthetic import evolve_projects, make_projects, write_export
+from utils.addresses import (
+    RESULT_COLUMNS,
+    broadcast_results,
+    build_address_series,
+    dedupe_addresses,
+    geocode_addresses,
+    result_frame,
+)
+from utils.changes import compare_files
+from utils.clusters import ClusterPyramid
+from utils.excelio import with_columns, write_chunks
+from utils.geocache import GeocodeCache
+from utils.geocoder import GeocodingEngine, NominatimBackend
+from utils.keplermap import MAX_MAP_POINTS, encode_columnar
+from utils.snapshots import ADDRESS_COLUMN, iter_project_export, read_project_export
+
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+STAGES = [
+    "csv_ingest",
+    "address_build",
+    "geocoding",
+    "geocoding_cached",
+    "result_assembly",
+    "xlsx_export",
+    "xlsx_ingest",
+    "kepler_payload",
+    "kepler_clusters",
+    "snapshot_diff",
+    "cli",
+]
+# The others produce what later stages work on
+OPTIONAL_STAGES = [
+    "geocoding_cached",
+    "xlsx_export",
+    "xlsx_ingest",
+    "kepler_payload",
+    "kepler_clusters",
+    "snapshot_diff",
+    "cli",
+]
+# Stages faster than this are never reported as regressions (timer noise)
+MIN_DELTA = 0.05
+
+
+def timed(fn: Callable[[], Any], repeat: int = 1) -> Tuple[Any, float]:
+    """``fn()``'s result and its best wall time over ``repeat`` runs."""
+    best, result = float("inf"), None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def dataset(rows: int, seed: int) -> str:
+    """Path of the synthetic export with ``rows`` rows, generated on first use."""
+    path = os.path.join(DATA_DIR, f"projects_{rows}_{seed}.csv")
+    if not os.path.exists(path):
+        write_export(make_projects(rows, seed), path)
+    return path
+
+
+def start_fake_geocoder(args) -> Tuple[subprocess.Popen, str]:
+    """Start bench/fake_nominatim.py on a free port; returns the process and its URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCH_DIR, "fake_nominatim.py"),
+            "--port",
+            str(port),
+            "--latency",
+            str(args.latency),
+            "--jitter",
+            str(args.jitter),
+            "--error-rate",
+            str(args.error_rate),
+            "--seed",
+            str(args.seed),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            requests.get(f"{url}/stats", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError("The fake geocoder did not start")
+            time.sleep(0.1)
+
+
+def fake_stats(url: str) -> Tuple[int, int]:
+    """Requests and injected errors the fake geocoder has seen so far."""
+    stats = requests.get(f"{url}/stats", timeout=5).json()
+    return stats["requests"], stats["errors"]
+
+
+def later_dataset(rows: int, seed: int) -> str:
+    """Path of a later snapshot of :func:`dataset`'s export, generated on first use."""
+    path = os.path.join(DATA_DIR, f"projects_{rows}_{seed}_later.csv")
+    if not os.path.exists(path):
+        write_export(evolve_projects(make_projects(rows, seed), seed), path)
+    return path
+
+
+def run_size(rows: int, args, fake_url: str, workdir: str) -> Dict[str, Any]:
+    stages: Dict[str, Dict[str, Any]] = {}
+    skip = set(args.skip or [])
+
+    def stage(
+        name: str, fn: Callable[[], Any], repeat: int = 1, **extra: Callable[[Any], Any]
+    ) -> Any:
+        if name in skip:
+            return None
+        result, seconds = timed(fn, repeat)
+        stages[name] = {
+            "seconds": round(seconds, 4),
+            **{k: f(result) for k, f in extra.items()},
+        }
+        sys.stderr.write(f"  {name:<17} {seconds:9.3f} s\n")
+        return result
+
+    csv_path = dataset(rows, args.seed)
+    sys.stderr.write(f"{rows} rows ({os.path.getsize(csv_path) / 1e6:.1f} MB CSV)\n")
+    df = stage("csv_ingest", lambda: read_project_export(csv_path), args.repeat)
+
+    def build():
+        addresses = build_address_series(df, [ADDRESS_COLUMN])
+        return (addresses,) + dedupe_addresses(addresses)
+
+    addresses, keys, unique, codes = stage(
+        "address_build", build, args.repeat, unique=lambda r: len(r[2])
+    )
+
+    # Only the first --geocode-limit distinct addresses go over HTTP; the fake server's
+    # latency sets the pace
+    subset = addresses[(codes >= 0) & (codes < args.geocode_limit)]
+    cache = GeocodeCache(os.path.join(workdir, f"cache_{rows}.sqlite"))
+    engine = GeocodingEngine(
+        NominatimBackend(url=fake_url, rate=0),
+        workers=args.workers,
+        cache=cache,
+        retries=args.retries,
+        backoff=args.backoff,
+    )
+    params = {"language": "de"}
+    before = fake_stats(fake_url)
+    geocoded = stage(
+        "geocoding",
+        lambda: geocode_addresses(subset, engine, params)[0],
+        addresses=lambda r: int(min(len(unique), args.geocode_limit)),
+        errors=lambda r: int(r["geo_status"].str.startswith("error", na=False).sum()),
+    )
+    g = stages["geocoding"]
+    g["addresses_per_s"] = (
+        round(g["addresses"] / g["seconds"], 1) if g["seconds"] else None
+    )
+    after = fake_stats(fake_url)
+    g["requests"], g["http_errors"] = after[0] - before[0], after[1] - before[1]
+    cached = stage(
+        "geocoding_cached",
+        lambda: geocode_addresses(subset, engine, params)[0],
+        addresses=lambda r: int(min(len(unique), args.geocode_limit)),
+    )
+    if cached is not None:
+        c = stages["geocoding_cached"]
+        c["addresses_per_s"] = (
+            round(c["addresses"] / c["seconds"], 1) if c["seconds"] else None
+        )
+    cache.close()
+
+    # Every distinct address gets one of the fake answers, as if all of them had been
+    # geocoded
+    answers = geocoded[RESULT_COLUMNS].drop_duplicates().to_dict("records") or [
+        {"geo_status": "not_found"}
+    ]
+    records = [answers[i % len(answers)] for i in range(len(unique))]
+    results = stage(
+        "result_assembly",
+        lambda: broadcast_results(codes, result_frame(records), df.index),
+        args.repeat,
+    )
+    extra = results.assign(geo_query=addresses)
+
+    xlsx_path = os.path.join(workdir, f"geocoded_{rows}.xlsx")
+    stage(
+        "xlsx_export",
+        lambda: write_chunks(
+            xlsx_path, (with_columns(c, extra) for c in iter_project_export(csv_path))
+        ),
+        mb=lambda r: round(os.path.getsize(xlsx_path) / 1e6, 2),
+    )
+    if os.path.exists(xlsx_path):
+        stage("xlsx_ingest", lambda: read_project_export(xlsx_path))
+
+    geo = df.assign(**{c: extra[c] for c in extra.columns}).dropna(
+        subset=["latitude", "longitude"]
+    )
+    stage(
+        "kepler_payload",
+        lambda: encode_columnar(geo),
+        args.repeat,
+        bytes=len,
+        points=lambda r: len(geo),
+    )
+
+    def clusters():
+        pyramid = ClusterPyramid(geo, "latitude", "longitude", ["Team", "geo_status"])
+        return encode_columnar(
+            pyramid.clusters(pyramid.zoom_for(MAX_MAP_POINTS)).drop(columns="point")
+        )
+
+    stage("kepler_clusters", clusters, args.repeat, bytes=len)
+
+    if "snapshot_diff" not in skip:
+        later_path = later_dataset(rows, args.seed)
+        stage(
+            "snapshot_diff",
+            lambda: compare_files(csv_path, later_path),
+            args.repeat,
+            changes=lambda r: len(r.changes),
+        )
+
+    if rows <= args.cli_max_rows:
+        out_path = os.path.join(workdir, f"cli_{rows}.csv")
+        command = [
+            sys.executable,
+            os.path.join(ROOT_DIR, "utils", "adress_to_coordinate.py"),
+            csv_path,
+            "--address-column",
+            ADDRESS_COLUMN,
+            "--backend-url",
+            fake_url,
+            "--rate",
+            "0",
+            "--workers",
+            str(args.workers),
+            "--retries",
+            str(args.retries),
+            "--no-cache",
+            "--no-gazetteer",
+            "--output",
+            out_path,
+        ]
+        proc = stage(
+            "cli",
+            lambda: subprocess.run(command, capture_output=True, text=True),
+            returncode=lambda p: p.returncode,
+        )
+        if proc is not None and proc.returncode != 0:
+            sys.stderr.write(proc.stderr[-2000:])
+    return {"rows": rows, "stages": stages}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Print stage times next to ``baseline`` and return the regressions."""
+    old = {
+        (r["rows"], name): s["seconds"]
+        for r in baseline["results"]
+        for name, s in r["stages"].items()
+    }
+    regressions = []
+    print(f"{'rows':>8} {'stage':<17} {'before':>9} {'now':>9} {'ratio':>7}")
+    for r in current["results"]:
+        for name, s in r["stages"].items():
+            before = old.get((r["rows"], name))
+            if before is None:
+                continue
+            ratio = s["seconds"] / before if before else float("inf")
+            slower = ratio > threshold and s["seconds"] - before > MIN_DELTA
+            print(
+                f"{r['rows']:>8} {name:<17} {before:9.3f} {s['seconds']:9.3f} {ratio:6.2f}x{'  <-- slower' if slower else ''}"
+            )
+            if slower:
+                regressions.append(
+                    f"{name} at {r['rows']} rows: {before:.3f} s -> {s['seconds']:.3f} s"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingest, geocoding, assembly, export and map payloads offline."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help=f"Rows of the synthetic exports (default: {' '.join(map(str, DEFAULT_SIZES))})",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the synthetic data (default: 0)"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.005,
+        help="Fake geocoder seconds per request (default: 0.005)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Additional random fake latency (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Share of fake HTTP 503 answers (default: 0)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Concurrent geocoding requests (default: 8)",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=3, help="Retries per failed request (default: 3)"
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=0.01,
+        help="First retry delay in seconds (default: 0.01)",
+    )
+    parser.add_argument(
+        "--geocode-limit",
+        type=int,
+        default=2000,
+        help="Distinct addresses geocoded over HTTP per size (default: 2000)",
+    )
+    parser.add_argument(
+        "--cli-max-rows",
+        type=int,
+        default=10_000,
+        help="Run the CLI end to end only for sizes up to this (default: 10000)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Best of N for the CPU-bound stages (default: 3)",
+    )
+    parser.add_argument(
+        "--skip",
+        nargs="+",
+        choices=OPTIONAL_STAGES,
+        default=None,
+        help="Stages to leave out",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Result JSON (default: bench/results/<timestamp>.json)",
+    )
+    parser.add_argument(
+        "--compare", default=None, help="Earlier result JSON to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="With --compare, fail when a stage takes more than this times as long (default: 1.25)",
+    )
+    args = parser.parse_args()
+
+    started = time.time()
+    fake, fake_url = start_fake_geocoder(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+            results = [run_size(rows, args, fake_url, workdir) for rows in args.sizes]
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "settings": {
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("output", "compare", "threshold")
+        },
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = compare(report, json.load(fh), args.threshold)
+        if regressions:
+            sys.stderr.write(
+                "Slower than the baseline:\n" + "".join(f"  {r}\n" for r in regressions)
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Time to first render of every page in a fresh process, cold and after the warm-up.
+
+Each measurement runs in its own Python process, like a restarted server:
+``cold`` renders the page straight away, so it pays for the heavy imports and
+for loading its data; ``warm`` first runs ``utils/warmup.py``'s steps, as a
+server started with the warm-up has done before its first visitor arrives.
+``rerun`` is a second render in the same process. Pages are run with
+Streamlit's ``AppTest`` on the datasets in ``data/``; the Parquet conversions
+in ``data/.cache`` are reused, as they are across server restarts.
+
+    python bench/startup.py
+    python bench/startup.py --pages Home.py "pages/2_🪟_Projectmap.py"
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench.run import RESULTS_DIR, git_commit
+
+PAGE_TIMEOUT = 300
+
+
+def default_pages():
+    return ["Home.py"] + sorted(
+        os.path.relpath(p, ROOT_DIR)
+        for p in glob.glob(os.path.join(ROOT_DIR, "pages", "*.py"))
+    )
+
+
+def measure(page: str, warm: bool) -> Dict[str, Any]:
+    """Render ``page`` twice in this process; ``warm`` runs the warm-up steps first."""
+    # Loaded before the timer: a server has Streamlit imported before any page runs
+    from streamlit.testing.v1 import AppTest
+    from utils import warmup
+
+    result: Dict[str, Any] = {}
+    if warm:
+        start = time.perf_counter()
+        warmup.warm_imports()
+        warmup.warm_data()
+        result["warmup_s"] = round(time.perf_counter() - start, 3)
+    start = time.perf_counter()
+    at = AppTest.from_file(
+        os.path.join(ROOT_DIR, page), default_timeout=PAGE_TIMEOUT
+    ).run()
+    result["first_render_s"] = round(time.perf_counter() - start, 3)
+    start = time.perf_counter()
+    at.run()
+    result["rerun_s"] = round(time.perf_counter() - start, 3)
+    result["exceptions"] = [e.message for e in at.exception]
+    return result
+
+
+def measure_in_subprocess(page: str, warm: bool) -> Dict[str, Any]:
+    # The page's own warmup.page() would start a warm-up racing the measurement
+    env = {**os.environ, "GIS_WARMUP": "0"}
+    cmd = [sys.executable, os.path.abspath(__file__), "--measure", page] + (
+        ["--warm"] if warm else []
+    )
+    try:
+        proc = subprocess.run(
+            cmd,
+            cwd=ROOT_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=PAGE_TIMEOUT * 2,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": "timeout"}
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {
+            "error": (
+                proc.stderr.strip().splitlines()[-1]
+                if proc.stderr.strip()
+                else f"exit {proc.returncode}"
+            )
+        }
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to first render of the app's pages, cold and warmed up."
+    )
+    parser.add_argument(
+        "--pages",
+        nargs="+",
+        default=None,
+        help="Page scripts relative to the repository (default: all)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Result JSON (default: bench/results/startup-<timestamp>.json)",
+    )
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.warm)))
+        return
+
+    started = time.time()
+    results = []
+    print(f"{'page':<32} {'cold':>8} {'warm':>8} {'rerun':>8} {'warm-up':>8}")
+    for page in args.pages or default_pages():
+        cold, warm = measure_in_subprocess(page, False), measure_in_subprocess(
+            page, True
+        )
+        results.append({"page": page, "cold": cold, "warm": warm})
+        cells = [
+            f"{r['first_render_s']:8.2f}" if "first_render_s" in r else f"{'error':>8}"
+            for r in (cold, warm)
+        ]
+        print(
+            f"{page[:32]:<32} {cells[0]} {cells[1]} {warm.get('rerun_s', float('nan')):8.2f} "
+            f"{warm.get('warmup_s', float('nan')):8.2f}"
+        )
+        for r in (cold, warm):
+            if r.get("error") or r.get("exceptions"):
+                sys.stderr.write(f"  {page}: {r.get('error') or r['exceptions'][0]}\n")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        "startup-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + ".json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
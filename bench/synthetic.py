@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Synthetic CRM project exports in the schema of ``data/Alle Projekte *.csv``.
+
+The files look like the real export: ``;``-separated, latin-1 encoded,
+decimal commas in ``Breite``/``Laenge``, German place names with umlauts,
+projects sharing addresses (about a third of the rows repeat an earlier
+address) and some rows without coordinates or address. Generation is seeded
+and vectorized, so 100k rows take about a second and every run of a
+benchmark sees the same data.
+
+    python bench/synthetic.py 10000 bench/.data/projects_10k.csv
+"""
+import argparse
+import base64
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.snapshots import (
+    ADDRESS_COLUMN,
+    CANONICAL_COLUMNS,
+    CHECKSUM_COLUMN,
+    ID_COLUMN,
+    LAT_COLUMN,
+    LON_COLUMN,
+    MODIFIED_COLUMN,
+)
+
+TEAMS = [
+    "12 - Geologie & Geotechnik",
+    "13 - Immissionsschutz",
+    "14 - Hydrogeologie",
+    "21 - Altlasten & Rückbau",
+    "25 - Fröhlich & Locher",
+    "31 - Umweltplanung",
+    "42 - Bauphysik & Akustik",
+    "51 - Vermessung",
+]
+TOWNS = [
+    ("1150", "Rudolfsheim-Fünfhaus", 48.19, 16.32),
+    ("4571", "Klaus", 47.81, 14.13),
+    ("5325", "Plainfeld", 47.83, 13.16),
+    ("4580", "Windischgarsten", 47.72, 14.33),
+    ("5524", "Annaberg im Lammertal", 47.52, 13.45),
+    ("5020", "Salzburg", 47.80, 13.04),
+    ("8010", "Graz", 47.07, 15.44),
+    ("6020", "Innsbruck", 47.26, 11.39),
+    ("9020", "Klagenfurt", 46.62, 14.31),
+    ("4020", "Linz", 48.31, 14.29),
+    ("3100", "St. Pölten", 48.20, 15.62),
+    ("6900", "Bregenz", 47.50, 9.75),
+    ("7000", "Eisenstadt", 47.85, 16.52),
+    ("8700", "Leoben", 47.38, 15.09),
+    ("5700", "Zell am See", 47.32, 12.80),
+    ("9500", "Villach", 46.61, 13.85),
+]
+STREETS = [
+    "Hauptstraße",
+    "Lehenauweg",
+    "Weiglgasse",
+    "Bahnhofstraße",
+    "Kirchengasse",
+    "Mühlweg",
+    "Schloßberg",
+    "Gärtnergasse",
+    "Lindenallee",
+    "Försterweg",
+    "Römerstraße",
+    "Brückenstraße",
+    "Am Steinbühel",
+    "Gewerbepark",
+    "Dorfplatz",
+    "Industriezeile",
+    "Seeuferstraße",
+    "Höhenweg",
+    "Wiesengrund",
+    "Sägewerkstraße",
+]
+WORDS = [
+    "Kaverne",
+    "Steinschlichtung",
+    "Baugrunderkundung",
+    "Hangsicherung",
+    "Brunnen",
+    "Deponie",
+    "Kläranlage",
+    "Wohnanlage",
+    "Lärmmessung",
+    "Geruchsgutachten",
+    "Altlastenerkundung",
+    "Tiefgarage",
+    "Brücke",
+    "Tunnel",
+    "Rückhaltebecken",
+    "Bohrkernaufnahme",
+    "Schallschutz",
+    "Wärmeversorgung",
+    "Umfahrung",
+    "Parkplatz Phase 2",
+]
+# Share of rows reusing an earlier row's address, and of rows without coordinates /
+# address
+DUPLICATE_SHARE = 0.35
+NO_COORDINATES_SHARE = 0.18
+NO_ADDRESS_SHARE = 0.1
+# Between two snapshots (evolve_projects): shares of deleted and added rows, and of rows
+# moved, re-teamed or edited
+DELETED_SHARE = 0.02
+ADDED_SHARE = 0.03
+CHANGED_SHARE = 0.01
+
+
+def _decimal_comma(values: np.ndarray) -> pd.Series:
+    return pd.Series(
+        np.char.replace(np.char.mod("%.10f", values), ".", ","), dtype="object"
+    )
+
+
+def make_projects(rows: int, seed: int = 0) -> pd.DataFrame:
+    """``rows`` synthetic projects with the export's columns, coordinates as decimal-comma text."""
+    rng = np.random.default_rng(seed)
+    town = rng.integers(0, len(TOWNS), rows)
+    street = rng.integers(0, len(STREETS), rows)
+    number = rng.integers(1, 250, rows)
+    # A share of the rows repeats the address (and position) of an earlier row
+    source = np.arange(rows)
+    repeat = rng.random(rows) < DUPLICATE_SHARE
+    repeat[0] = False
+    source[repeat] = (rng.random(int(repeat.sum())) * np.flatnonzero(repeat)).astype(
+        "int64"
+    )
+    town, street, number = town[source], street[source], number[source]
+
+    plz = np.array([t[0] for t in TOWNS], dtype=object)[town]
+    place = np.array([t[1] for t in TOWNS], dtype=object)[town]
+    lat = np.array([t[2] for t in TOWNS])[town] + rng.normal(0, 0.05, rows)[source]
+    lon = np.array([t[3] for t in TOWNS])[town] + rng.normal(0, 0.07, rows)[source]
+    address = (
+        pd.Series(np.array(STREETS, dtype=object)[street])
+        + " "
+        + pd.Series(number).astype(str)
+        + ", "
+        + pd.Series(plz)
+        + " "
+        + pd.Series(place)
+        + ", Österreich"
+    )
+    address[rng.random(rows) < NO_ADDRESS_SHARE] = None
+    breite, laenge = _decimal_comma(lat), _decimal_comma(lon)
+    missing = rng.random(rows) < NO_COORDINATES_SHARE
+    breite[missing] = None
+    laenge[missing] = None
+
+    ids = rng.integers(0, 256, (rows, 16), dtype=np.uint8)
+    checksums = rng.integers(0, 256, (rows, 64), dtype=np.uint8)
+    modified = pd.Timestamp("2025-04-15 10:31") - pd.to_timedelta(
+        rng.integers(0, 3 * 365 * 24 * 60, rows), unit="min"
+    )
+    name = (
+        pd.Series(np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), rows)])
+        + " "
+        + pd.Series(place)
+        + " "
+        + pd.Series(rng.integers(1, 99, rows)).astype(str)
+    )
+    df = pd.DataFrame(
+        {
+            ID_COLUMN: [str(uuid.UUID(bytes=b.tobytes(), version=4)) for b in ids],
+            CHECKSUM_COLUMN: [
+                base64.b64encode(b.tobytes()).decode("ascii") for b in checksums
+            ],
+            MODIFIED_COLUMN: modified.strftime("%d.%m.%Y %H:%M"),
+            "Projektbezeichnung": name,
+            "Team": np.array(TEAMS, dtype=object)[rng.integers(0, len(TEAMS), rows)],
+            LAT_COLUMN: breite,
+            LON_COLUMN: laenge,
+            ADDRESS_COLUMN: address,
+        }
+    )
+    return df[CANONICAL_COLUMNS]
+
+
+def evolve_projects(df: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """A later snapshot of ``df``: some projects deleted, added, moved, re-teamed or otherwise edited."""
+    rng = np.random.default_rng(seed + 1)
+    df = df[rng.random(len(df)) >= DELETED_SHARE].reset_index(drop=True)
+    moved, reteamed = (rng.random(len(df)) < CHANGED_SHARE for _ in range(2))
+    lat = pd.to_numeric(df[LAT_COLUMN].str.replace(",", "."), errors="coerce")
+    df.loc[moved & lat.notna(), LAT_COLUMN] = _decimal_comma(
+        (lat[moved & lat.notna()] + 0.01).to_numpy()
+    ).to_numpy()
+    df.loc[reteamed, "Team"] = np.array(TEAMS, dtype=object)[
+        rng.integers(0, len(TEAMS), int(reteamed.sum()))
+    ]
+    # The CRM recomputes a row's checksum whenever the row is edited
+    edited = moved | reteamed | (rng.random(len(df)) < CHANGED_SHARE)
+    df.loc[edited, CHECKSUM_COLUMN] = df.loc[edited, CHECKSUM_COLUMN].str[::-1]
+    added = make_projects(int(len(df) * ADDED_SHARE), seed + 1)
+    return pd.concat([df, added], ignore_index=True)
+
+
+def write_export(df: pd.DataFrame, path: str) -> str:
+    """Write ``df`` like the CRM does (``;``, latin-1); returns ``path``."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df.to_csv(path, sep=";", index=False, encoding="latin-1")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic 'Alle Projekte' CSV export."
+    )
+    parser.add_argument("rows", type=int, help="Number of projects")
+    parser.add_argument("output", help="Output .csv path")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+    write_export(make_projects(args.rows, args.seed), args.output)
+    print(f"Wrote {args.rows} projects to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
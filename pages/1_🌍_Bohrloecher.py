@@ -1,43 +1,98 @@
+import math
+import os
+
+import folium
 import streamlit as st
 import leafmap.foliumap as leafmap
-import pandas as pd
+from streamlit_folium import st_folium
+
+from utils import datastore, warmup
+from utils.clusters import load_pyramid, view_bounds
+from utils.sideserver import reachable_server
+from utils.tiles import GeoJSONTiles
+
+render_start = warmup.page()
 
+st.set_page_config(layout="wide")
 st.title("Bohrlöcher")
-df = pd.read_csv('data/230710_GeoDatenbank_Lage.csv', sep=';')
-df['lat'] = df['lat'].str.replace(',', '.').astype(float)
-df['lon'] = df['lon'].str.replace(',', '.').astype(float)
+# Parsed once into Parquet (decimal commas, Ja/Nein flags); reruns read the cached frame
+df = datastore.load("boreholes")
 
-projekt_options = ["All"] + list(df['Projektname'].unique())
+projekt_options = ["All"] + list(df["Projektname"].unique())
 selected_projekt = st.selectbox("Select Projektname", projekt_options)
 
-if selected_projekt == "All":
-    filtered_df = df
-else:
-    filtered_df = df[df['Projektname'] == selected_projekt]
-
+# Only the clusters/points of the current zoom level and viewport are sent to the
+# browser; the aggregation itself is cached per dataset version and project filter
+where = None if selected_projekt == "All" else ("Projektname", selected_projekt)
+# With vector tiles the map fetches its tiles itself and panning needs no rerun
+server = reachable_server()
+use_tiles = (
+    server is not None
+    and st.sidebar.radio("Map data", ["Viewport clusters", "Vector tiles"])
+    == "Vector tiles"
+)
+pyramid = load_pyramid("boreholes", "lat", "lon", ["Projektname"], where=where)
+view = st.session_state.get("bohrloecher_map")
+zoom = (view or {}).get("zoom") or 4
+features = pyramid.features(
+    zoom, view_bounds(view), columns=["Projektname", "Standort", "Projektnummer"]
+)
 
-st.set_page_config(layout="wide")
+layer = folium.FeatureGroup(name="Bohrlöcher")
+for f in features.itertuples(index=False):
+    if f.count == 1:
+        folium.Marker(
+            [f.lat, f.lon], tooltip=f"{f.Projektnummer} {f.Projektname} – {f.Standort}"
+        ).add_to(layer)
+    else:
+        folium.CircleMarker(
+            [f.lat, f.lon],
+            radius=8 + 3 * math.log2(f.count),
+            color="#1f77b4",
+            fill=True,
+            fill_opacity=0.6,
+            tooltip=f"{f.count} Bohrlöcher: {f.Projektname_breakdown}",
+        ).add_to(layer)
 
 
 st.sidebar.title("About")
 
-logo = r'C:\Users\a.geiger\Documents\GitHub\streamlit_gis\gis.png'
+logo = os.path.join(datastore.ROOT_DIR, "gis.png")
 st.sidebar.image(logo)
 
 m = leafmap.Map(center=[54, 15], zoom=4)
-#cities = pd.read_csv('data/230710_GeoDatenbank_Lage.csv', sep=';')
-        #regions = "https://raw.githubusercontent.com/giswqs/leafmap/master/examples/data/us_regions.geojson"
-
-        #m.add_geojson(regions, layer_name="US Regions")
-m.add_points_from_xy(filtered_df, x="lon", y="lat")
-        #m.add_points_from_xy(
-           # cities,
-           # x="lat",
-           # y="lon",
-           # color_column="Projektnummer",
-           # icon_names=["gear", "map", "leaf", "globe"],
-           # spin=True,
-           # add_legend=True,)
-
-m.to_streamlit(height=700)
+# cities = pd.read_csv('data/230710_GeoDatenbank_Lage.csv', sep=';')
+# regions = "https://raw.githubusercontent.com/giswqs/leafmap/master/examples/data/us_regions.geojson"
+
+# m.add_geojson(regions, layer_name="US Regions")
+# m.add_points_from_xy(
+# cities,
+# x="lat",
+# y="lon",
+# color_column="Projektnummer",
+# icon_names=["gear", "map", "leaf", "globe"],
+# spin=True,
+# add_legend=True,)
+
+if use_tiles:
+    m.add_child(GeoJSONTiles("boreholes", where, port=server.port))
+    st_folium(
+        m,
+        key="bohrloecher_tiles",
+        height=700,
+        use_container_width=True,
+        returned_objects=[],
+    )
+    st.caption(f"{len(pyramid)} boreholes")
+else:
+    st_folium(
+        m,
+        key="bohrloecher_map",
+        height=700,
+        use_container_width=True,
+        feature_group_to_add=layer,
+        returned_objects=["bounds", "zoom"],
+    )
+    st.caption(f"{len(pyramid)} boreholes, {len(features)} markers in view")
 
+warmup.rendered("Bohrloecher", render_start)
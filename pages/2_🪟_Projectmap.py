@@ -1,42 +1,96 @@
 import streamlit as st
-import pandas as pd
-import keplergl
-from keplergl import KeplerGl
 import streamlit.components.v1 as components
 
+from utils import datastore, warmup
+from utils.changes import overlay_frame
+from utils.clusters import load_pyramid
+from utils.keplermap import MAX_MAP_POINTS, kepler_html, point_frame
+from utils.sideserver import reachable_server
+
+render_start = warmup.page()
+
 st.set_page_config(layout="wide")
 st.title("Project Map")
 
-# Read the geocoded Excel file
+# Read the geocoded Excel file (converted once to Parquet, cached per file version)
 try:
-    df = pd.read_excel('data/geocoded_results.xlsx')
+    df = datastore.load("geocoded")
 except FileNotFoundError:
-    st.error("Geocoded results file not found. Please run the geocoding in the Project Dataframe page first.")
-    st.stop()
+    st.error(
+        "Geocoded results file not found. Please run the geocoding in the Project Dataframe page first."
+    )
+    warmup.stop("Projectmap", render_start)
 
-# Handle coordinate columns
-lat_col = 'latitude' if 'latitude' in df.columns else 'lat'
-lon_col = 'longitude' if 'longitude' in df.columns else 'lon'
+# Numeric coordinates; rows without them are dropped
+df, lat_col, lon_col = point_frame(df)
 
-# Ensure coordinates are float
-df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
-df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
+st.write("This is a kepler.gl map with data input in streamlit")
 
-# Drop rows with missing coordinates
-df = df.dropna(subset=[lat_col, lon_col])
+# kepler.gl 0.3 cannot load remote tiles; the Leaflet view fetches the same projects as
+# GeoJSON tiles
+server = reachable_server()
+renderer = (
+    st.radio("Renderer", ["kepler.gl", "Leaflet (vector tiles)"], horizontal=True)
+    if server
+    else "kepler.gl"
+)
+if renderer != "kepler.gl":
+    # leafmap takes seconds to import, so only this view loads it
+    import leafmap.foliumap as leafmap
+    from streamlit_folium import st_folium
+    from utils.tiles import GeoJSONTiles
 
-st.write("This is a kepler.gl map with data input in streamlit")
+    m = leafmap.Map(center=[47.5, 13.5], zoom=7)
+    m.add_child(GeoJSONTiles("geocoded", port=server.port))
+    st_folium(
+        m,
+        key="projectmap_tiles",
+        height=800,
+        use_container_width=True,
+        returned_objects=[],
+    )
+    warmup.stop("Projectmap", render_start)
+
+# kepler.gl cannot report its viewport back, so large datasets are aggregated for a
+# chosen detail level instead; clusters keep the count and dominant team/status of their
+# projects
+aggregate = st.toggle("Aggregate points", value=len(df) > MAX_MAP_POINTS)
+if aggregate:
+    pyramid = load_pyramid("geocoded", lat_col, lon_col, ["Team", "geo_status"])
+    detail = st.slider(
+        "Detail level (zoom)", 0, pyramid.max_zoom, pyramid.zoom_for(MAX_MAP_POINTS)
+    )
+    map_df = pyramid.clusters(detail).drop(columns="point")
+    st.caption(f"{len(df)} projects in {len(map_df)} clusters")
+    data_key = f"{datastore.dataset_version('geocoded')}-z{detail}"
+else:
+    map_df = df
+    data_key = f"{datastore.dataset_version('geocoded')}-all"
+
+datasets, keys = {"Status": map_df}, {"Status": data_key}
+# Change set between two export snapshots, published from the Snapshots page or
+# utils/changes.py --overlay
+try:
+    changes = datastore.load("changes")
+except FileNotFoundError:
+    changes = None
+if changes is not None and st.toggle(
+    "Show snapshot changes",
+    value=True,
+    help=f"{len(changes)} new, deleted, moved or changed projects",
+):
+    datasets["Changes"] = overlay_frame(changes)
+    keys["Changes"] = datastore.dataset_version("changes")
 
 # Toggle fullscreen button
 if st.button("Toggle Fullscreen Map"):
-    current_height = st.session_state.get('map_height', 800)
-    st.session_state['map_height'] = 1200 if current_height == 800 else 800
+    current_height = st.session_state.get("map_height", 800)
+    st.session_state["map_height"] = 1200 if current_height == 800 else 800
     st.rerun()
 
-map_height = st.session_state.get('map_height', 1200)
-map_1 = KeplerGl(height=map_height)
-map_1.add_data(
-    data=df, name="Status"
-)  # Alternative: KeplerGl(height=400, data={"name": df})
+map_height = st.session_state.get("map_height", 1200)
+# The page (data encoded column-wise + config) is memoized per dataset version and
+# detail level, so a height toggle or rerun does not serialize the data again
+components.html(kepler_html(datasets, keys=keys), height=map_height)
 
-components.html(map_1._repr_html_(), height=map_height)
+warmup.rendered("Projectmap", render_start)
@@ -1,15 +1,149 @@
+from datetime import date, datetime, time, timedelta
+
+import altair as alt
 import streamlit as st
 import pandas as pd
 
+from utils import warmup
+from utils.downsample import DEFAULT_MAX_POINTS, lttb_frame, rolling_stats
+from utils.messtation import DEFAULT_CHANNELS, Messtation, parse_channels, to_wide
+
+render_start = warmup.page()
+
+# Seconds before a rerun downloads the unsettled end of the range again
+RECENT_TTL = 300
+
 st.title("Messtation Data")
 
-# URL for the measurement station data
-url = "http://176.66.66.28/cgi-bin/download.cgi?loginstring=admin&user_pw=1AQuality&dec=COMMA&header_name&nohtml&status&avg3=12327,12333,12111,12213,12189,12117,12339,12153,12195,12171&tstart=2025-09-29,00:00:00&tend=2025-09-30,00:00:00"
+
+@st.cache_resource
+def get_station() -> Messtation:
+    # One store per server process; measurements are downloaded once and then served
+    # locally
+    return Messtation()
+
+
+station = get_station()
+
+c1, c2 = st.columns(2)
+start_day = c1.date_input("From", value=date.today() - timedelta(days=1))
+end_day = c2.date_input("To (inclusive)", value=date.today())
+channels = st.multiselect("Channels (avg3)", DEFAULT_CHANNELS, default=DEFAULT_CHANNELS)
+extra = st.text_input("Further channel ids", placeholder="e.g. 12345,12346")
+offline = st.checkbox("Only stored data (no download)")
 
 try:
-    # Read the CSV data from the URL with appropriate encoding
-    df = pd.read_csv(url, encoding='latin1')
-    st.write("Data from Messtation:")
-    st.dataframe(df)
-except Exception as e:
-    st.error(f"Failed to load data: {e}")
+    channels = channels + [c for c in parse_channels(extra) if c not in channels]
+except ValueError:
+    st.error("Channel ids must be numbers separated by commas.")
+    warmup.stop("Messtation", render_start)
+if not channels or end_day < start_day:
+    st.info("Select at least one channel and a valid date range.")
+    warmup.stop("Messtation", render_start)
+
+start = datetime.combine(start_day, time.min)
+end = datetime.combine(end_day + timedelta(days=1), time.min)
+
+if not offline:
+    # Stored days cost no request; the still-changing last minutes are downloaded again
+    # only every RECENT_TTL seconds per range or on request, not on every rerun
+    refreshed = st.session_state.setdefault("messtation_refreshed", {})
+    key = (tuple(channels), start, end)
+    recent = (
+        st.button("🔄 Refresh latest data")
+        or datetime.now().timestamp() - refreshed.get(key, 0) > RECENT_TTL
+    )
+    bar = st.progress(0.0, text="Checking local store…")
+    try:
+        made, errors = station.update(
+            channels,
+            start,
+            end,
+            recent=recent,
+            progress=lambda done, total: bar.progress(
+                done / total, text=f"{done}/{total} downloads"
+            ),
+        )
+    except Exception as e:
+        st.error(f"Failed to load data: {e}")
+        made, errors = 0, []
+    else:
+        if recent and not errors:
+            refreshed[key] = datetime.now().timestamp()
+    bar.empty()
+    if errors:
+        st.warning(
+            f"{len(errors)} of {made} downloads failed; showing stored data.\n\n"
+            + "\n".join(errors[:5])
+        )
+
+# The chart gets about the same number of points per channel whatever the range:
+# raw data for short ranges, rollups merged to a coarser width for long ones
+max_points = st.sidebar.slider(
+    "Points per channel", 500, 5000, DEFAULT_MAX_POINTS, step=500
+)
+mode = st.sidebar.radio("Chart", ["Mean with min/max band", "LTTB"])
+window = st.sidebar.selectbox("Rolling mean", ["off", "1h", "6h", "1d", "7d"])
+
+if mode == "LTTB":
+    # LTTB picks shape-preserving points from a finer series
+    series, width = station.store.series(channels, start, end, max_points * 8)
+    wide = lttb_frame(
+        series.pivot_table(index="ts", columns="channel", values="mean"), max_points
+    )
+else:
+    series, width = station.store.series(channels, start, end, max_points)
+    wide = series.pivot_table(index="ts", columns="channel", values="mean")
+if window != "off":
+    wide = rolling_stats(wide, window)["mean"]
+
+if wide.empty:
+    st.info("No measurements stored for this range.")
+    warmup.stop("Messtation", render_start)
+
+if width is None:
+    resolution = "raw measurements"
+elif width % 86400 == 0:
+    resolution = f"{width // 86400} d buckets"
+elif width % 3600 == 0:
+    resolution = f"{width // 3600} h buckets"
+else:
+    resolution = f"{width // 60} min buckets"
+st.write("Data from Messtation:")
+st.caption(f"{resolution}, {int(wide.count().max())} points per channel")
+
+lines = wide.reset_index().melt("ts", var_name="channel", value_name="value").dropna()
+chart = alt.Chart(lines).mark_line().encode(x="ts:T", y="value:Q", color="channel:N")
+if mode != "LTTB" and window == "off" and width is not None:
+    band = (
+        alt.Chart(series)
+        .mark_area(opacity=0.2)
+        .encode(x="ts:T", y="min:Q", y2="max:Q", color="channel:N")
+    )
+    chart = band + chart
+st.altair_chart(chart, width="stretch")
+st.dataframe(wide)
+
+
+def raw_csv() -> str:
+    # Built only when the raw download is requested
+    return to_wide(station.store.query(channels, start, end)).to_csv(
+        sep=";", decimal=","
+    )
+
+
+c1, c2 = st.columns(2)
+c1.download_button(
+    "📥 Download chart data (CSV)",
+    data=wide.to_csv(sep=";", decimal=","),
+    file_name="messtation_downsampled.csv",
+    mime="text/csv",
+)
+c2.download_button(
+    "📥 Download raw measurements (CSV)",
+    data=raw_csv,
+    file_name="messtation.csv",
+    mime="text/csv",
+)
+
+warmup.rendered("Messtation", render_start)
@@ -1,130 +1,230 @@
 #!/usr/bin/env python3
 # streamlit_app.py
-import io
+import os
 import time
-import pandas as pd
 import streamlit as st
 
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+from utils import warmup
+from utils.excelio import TABLE_FORMATS, read_excel, read_table, sheet_names
+from utils.geocoder import BACKENDS, NominatimBackend, load_gazetteer
+from utils.jobs import get_runner, job_owner, job_panel, job_result
+from utils.reverse import DEFAULT_GRID_M, detect_coordinate_columns
+from utils.snapshots import ADDRESS_COLUMN
 
-st.set_page_config(page_title="Excel Address Geocoder", page_icon="📍", layout="centered")
+render_start = warmup.page()
+
+
+@st.cache_resource
+def get_gazetteer():
+    return load_gazetteer()
+
+
+st.set_page_config(
+    page_title="Excel Address Geocoder", page_icon="📍", layout="centered"
+)
 
 st.title("📍 Excel Address Geocoder")
-st.write("Upload an Excel file, select the address column, and download the file with latitude/longitude. Uses OpenStreetMap Nominatim (fair-use limits).")
+st.write(
+    "Upload an Excel file, select the address column, and download the file with latitude/longitude. Uses OpenStreetMap Nominatim (fair-use limits) unless another backend is selected."
+)
 
 with st.expander("ℹ️ How it works / Notes", expanded=False):
-    st.markdown("""
+    st.markdown(
+        """
 - Expected: one column with full address (e.g., *address*, *adresse*, *full_address*).
 - For high volumes, consider a paid geocoding provider. Please set a meaningful **User-Agent**.
-- Respect Nominatim's usage policy: add a small delay between requests.
-    """)
+- Respect Nominatim's usage policy: add a small delay between requests. Our own Nominatim instance or a commercial backend can be selected in the sidebar and allows a shorter pause and more concurrent requests.
+- *Coordinates → addresses* fills in addresses from latitude/longitude columns (e.g. *Breite*/*Laenge*). Points are snapped to a grid and each grid cell is looked up only once, so clustered boreholes cost a single request.
+    """
+    )
 
 st.sidebar.header("Settings")
-user_agent = st.sidebar.text_input("User-Agent (required)", value="excel-geocoder-streamlit")
-pause = st.sidebar.number_input("Pause between lookups (seconds)", min_value=0.5, max_value=10.0, value=1.0, step=0.5)
+user_agent = st.sidebar.text_input(
+    "User-Agent (required)", value="excel-geocoder-streamlit"
+)
 country_bias = st.sidebar.text_input("Country bias (ISO code, optional)", value="")
 language = st.sidebar.text_input("Language (ISO code)", value="en")
+backend = st.sidebar.selectbox(
+    "Geocoding backend", sorted(BACKENDS), index=sorted(BACKENDS).index("nominatim")
+)
+backend_url = st.sidebar.text_input(
+    "Backend URL (optional, e.g. own Nominatim)", value=""
+)
+# The public Nominatim allows one request per second; shorter pauses only for our own
+# instance or a paid backend
+backend_cls = BACKENDS[backend]
+public = (
+    issubclass(backend_cls, NominatimBackend)
+    and backend_cls.public_rate is not None
+    and not (backend_url.strip() or os.environ.get("GEOCODER_URL"))
+)
+min_pause = 1.0 / backend_cls.public_rate if public else 0.05
+pause = st.sidebar.number_input(
+    "Pause between lookups (seconds)",
+    min_value=min_pause,
+    max_value=10.0,
+    value=max(1.0, min_pause),
+    step=0.05,
+    help="At least 1 s for the public Nominatim (usage policy)" if public else None,
+)
+api_key = st.sidebar.text_input(
+    "API key (commercial backends)", value="", type="password"
+)
+workers = st.sidebar.number_input(
+    "Concurrent requests", min_value=1, max_value=32, value=4, step=1
+)
+gazetteer = get_gazetteer()
+use_gazetteer = st.sidebar.checkbox(
+    "Check offline gazetteer first",
+    value=gazetteer is not None,
+    disabled=gazetteer is None,
+    help="Answers addresses we already know from our project history without a network request.",
+)
+offline = st.sidebar.checkbox(
+    "Offline only (gazetteer)", value=False, disabled=gazetteer is None
+)
 
 uploaded = st.file_uploader("Upload Excel (.xlsx)", type=["xlsx"])
 
 if uploaded is not None:
     try:
-        # Read all sheets, but default to the first one
-        xls = pd.ExcelFile(uploaded)
-        sheet_name = st.selectbox("Select sheet", xls.sheet_names, index=0)
-        df = pd.read_excel(uploaded, sheet_name=sheet_name)
+        # List all sheets, but default to the first one; only the preview rows are
+        # loaded here
+        sheet_name = st.selectbox("Select sheet", sheet_names(uploaded), index=0)
+        df = read_excel(uploaded, sheet_name, nrows=10)
     except Exception as e:
         st.error(f"Failed to read Excel: {e}")
-        st.stop()
+        warmup.stop("Convert", render_start)
 
     if df.empty:
         st.warning("The selected sheet is empty.")
-        st.stop()
+        warmup.stop("Convert", render_start)
 
     st.subheader("Preview")
-    st.dataframe(df.head(10))
+    st.dataframe(df)
+
+    mode = st.radio(
+        "Mode", ["Addresses → coordinates", "Coordinates → addresses"], horizontal=True
+    )
+    reverse = mode == "Coordinates → addresses"
+    columns = list(df.columns)
 
     # Guess common address columns
-    candidates = [c for c in df.columns if str(c).lower() in {"address", "adresse", "full_address", "location"}]
+    candidates = [
+        c
+        for c in df.columns
+        if str(c).lower() in {"address", "adresse", "full_address", "location"}
+    ]
+    if ADDRESS_COLUMN in columns:
+        candidates.append(ADDRESS_COLUMN)
     default_index = df.columns.get_indexer(candidates[:1]).tolist()
     default_index = default_index[0] if default_index else 0
 
-    addr_col = st.selectbox("Select the address column", options=list(df.columns), index=default_index)
+    if reverse:
+        lat_guess, lon_guess = detect_coordinate_columns(columns)
+        col1, col2 = st.columns(2)
+        lat_col = col1.selectbox(
+            "Latitude column",
+            columns,
+            index=columns.index(lat_guess) if lat_guess else 0,
+        )
+        lon_col = col2.selectbox(
+            "Longitude column",
+            columns,
+            index=columns.index(lon_guess) if lon_guess else 0,
+        )
+        grid_m = st.number_input(
+            "Grid size (m)",
+            min_value=1.0,
+            max_value=5000.0,
+            value=DEFAULT_GRID_M,
+            step=5.0,
+            help="Points in the same grid cell share one lookup.",
+        )
+        fill_options = ["(only add rev_* columns)"] + columns
+        fill_col = st.selectbox(
+            "Fill addresses into",
+            fill_options,
+            index=default_index + 1 if candidates else 0,
+        )
+        overwrite = st.checkbox(
+            "Replace existing addresses",
+            value=False,
+            help="Otherwise only empty cells are filled.",
+        )
+    else:
+        addr_col = st.selectbox(
+            "Select the address column", options=columns, index=default_index
+        )
+    result_format = st.selectbox(
+        "Result format",
+        list(TABLE_FORMATS),
+        index=0,
+        help="CSV and Parquet are faster to write and smaller for very large sheets.",
+    )
 
-    do_geocode = st.button("🚀 Geocode addresses")
+    do_geocode = st.button(
+        "🚀 Look up addresses" if reverse else "🚀 Geocode addresses"
+    )
 
     if do_geocode:
         if not user_agent.strip():
             st.error("Please set a User-Agent in the sidebar.")
-            st.stop()
-
-        geolocator = Nominatim(user_agent=user_agent.strip(), timeout=10)
-        geocode = RateLimiter(geolocator.geocode, min_delay_seconds=float(pause), swallow_exceptions=True)
-
-        out = df.copy()
-        out["latitude"] = None
-        out["longitude"] = None
-        out["geo_status"] = None
-        out["geo_display_name"] = None
-        out["geo_precision_hint"] = None
-        out["geo_source"] = "nominatim"
-        out["geo_query"] = out[addr_col].astype(str)
-
-        progress = st.progress(0)
-        status_text = st.empty()
+            warmup.stop("Convert", render_start)
 
         params_base = {"language": language.strip() or "en"}
         if country_bias.strip():
             params_base["country_codes"] = country_bias.strip()
 
-        total = len(out)
-        ok_count = 0
-        nf_count = 0
-        err_count = 0
-
-        for i, (idx, row) in enumerate(out.iterrows(), start=1):
-            addr = row[addr_col]
-            if pd.isna(addr) or not str(addr).strip():
-                out.at[idx, "geo_status"] = "no_address"
-                nf_count += 1
-            else:
-                try:
-                    loc = geocode(str(addr).strip(), **params_base)
-                    if loc is None:
-                        out.at[idx, "geo_status"] = "not_found"
-                        nf_count += 1
-                    else:
-                        out.at[idx, "latitude"] = loc.latitude
-                        out.at[idx, "longitude"] = loc.longitude
-                        raw = getattr(loc, "raw", {})
-                        out.at[idx, "geo_precision_hint"] = raw.get("type") or raw.get("class")
-                        out.at[idx, "geo_display_name"] = loc.address
-                        out.at[idx, "geo_status"] = "ok"
-                        ok_count += 1
-                except Exception as e:
-                    out.at[idx, "geo_status"] = f"error: {e}"
-                    err_count += 1
-
-            progress.progress(min(i / total, 1.0))
-            status_text.text(f"Geocoded {i}/{total} • ok={ok_count} • not_found={nf_count} • errors={err_count}")
-
-        st.success(f"Done: ok={ok_count}, not_found={nf_count}, errors={err_count}")
+        # Runs as a background job: reruns, other widgets or a browser refresh do not
+        # interrupt it
+        settings = {
+            "sheet": sheet_name,
+            "params": params_base,
+            "columns": "full",
+            "format": result_format,
+            "backend": backend,
+            "url": backend_url.strip() or None,
+            "user_agent": user_agent.strip(),
+            "rate": 1.0 / float(pause),
+            "workers": int(workers),
+            "use_gazetteer": use_gazetteer,
+            "offline": offline,
+        }
+        if reverse:
+            settings.update(
+                mode="reverse",
+                lat_col=lat_col,
+                lon_col=lon_col,
+                grid_m=float(grid_m),
+                fill_col=fill_col if fill_col in columns else None,
+                overwrite=overwrite,
+                offline=False,
+            )
+        else:
+            settings["address_col"] = addr_col
+        st.session_state["convert_job"] = get_runner().submit(
+            "convert",
+            uploaded.name,
+            uploaded,
+            settings,
+            credentials={"api_key": api_key.strip() or None},
+            owner=job_owner(),
+        )
 
-        st.subheader("Result preview")
-        st.dataframe(out.head(20))
-
-        # Prepare Excel for download
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            out.to_excel(writer, index=False, sheet_name=sheet_name)
-        buffer.seek(0)
-
-        st.download_button(
-            label="📥 Download geocoded Excel",
-            data=buffer,
-            file_name="geocoded_addresses.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    job_id = st.session_state.get("convert_job")
+    job = get_runner().store.get(job_id) if job_id else None
+    if job and job["status"] == "done":
+        st.success(
+            f"Done: ok={job['ok']}, not_found={job['not_found']}, errors={job['errors']}"
         )
+        st.caption(job["message"])
+        st.subheader("Result preview")
+        st.dataframe(read_table(job_result(job), nrows=20))
+
+st.subheader("Geocoding jobs")
+job_panel("convert", key="convert")
 
 st.caption("Built with Streamlit, pandas, geopy, and OpenStreetMap Nominatim.")
+
+warmup.rendered("Convert", render_start)
@@ -0,0 +1,97 @@
+import streamlit as st
+import leafmap.foliumap as leafmap
+import pandas as pd
+
+from utils import datastore, warmup
+from utils.spatial import TEST_COLUMNS, load_index, projects_with_boreholes
+
+render_start = warmup.page()
+
+st.set_page_config(layout="wide")
+st.title("Umkreissuche")
+st.write("Which boreholes and field tests lie within a given distance of a project?")
+
+boreholes = datastore.load("boreholes")
+index = load_index("boreholes")
+try:
+    projects = datastore.load("projects").dropna(subset=["Breite", "Laenge"])
+except FileNotFoundError:
+    projects = pd.DataFrame(
+        columns=["Projekt", "Projektbezeichnung", "Breite", "Laenge"]
+    )
+
+tests = [c for c in TEST_COLUMNS if c in boreholes.columns]
+selected_tests = st.sidebar.multiselect(
+    "Only boreholes with", tests, help="Keep boreholes with any of these tests"
+)
+radius_km = st.sidebar.slider(
+    "Radius (km)", min_value=0.5, max_value=100.0, value=5.0, step=0.5
+)
+
+
+def with_tests(df: pd.DataFrame) -> pd.DataFrame:
+    if not selected_tests:
+        return df
+    return df[df[selected_tests].fillna(False).any(axis=1)]
+
+
+tab_single, tab_all = st.tabs(["Single location", "All projects"])
+
+with tab_single:
+    source = st.radio("Location", ["Project", "Coordinates"], horizontal=True)
+    if source == "Project" and len(projects):
+        name = st.selectbox(
+            "Project", sorted(projects["Projektbezeichnung"].dropna().unique())
+        )
+        row = projects[projects["Projektbezeichnung"] == name].iloc[0]
+        lat, lon = float(row["Breite"]), float(row["Laenge"])
+    else:
+        c1, c2 = st.columns(2)
+        lat = c1.number_input("Latitude", value=47.8, format="%.5f")
+        lon = c2.number_input("Longitude", value=13.04, format="%.5f")
+
+    pos, dist = index.radius(lat, lon, radius_km)
+    found = with_tests(boreholes.iloc[pos].assign(distance_km=dist.round(3)))
+    if found.empty:
+        nearest_pos, nearest_dist = index.nearest(lat, lon, 3)
+        st.info(f"No boreholes within {radius_km} km. Nearest ones:")
+        found = with_tests(
+            boreholes.iloc[nearest_pos].assign(distance_km=nearest_dist.round(3))
+        )
+    st.write(f"{len(found)} boreholes")
+    st.dataframe(found, hide_index=True)
+
+    m = leafmap.Map(center=[lat, lon], zoom=11)
+    m.add_marker(location=[lat, lon], tooltip="Query location")
+    if not found.empty:
+        m.add_points_from_xy(found, x="lon", y="lat")
+    m.to_streamlit(height=500)
+
+with tab_all:
+    if projects.empty:
+        st.info("No project export with coordinates in data/ (Alle Projekte *.csv).")
+        warmup.stop("Umkreissuche", render_start)
+    pairs = projects_with_boreholes(projects, boreholes, radius_km, index=index)
+    if selected_tests:
+        flags = pairs[[f"bohr_{c}" for c in selected_tests]].fillna(False)
+        pairs = pairs[flags.any(axis=1)]
+    summary = (
+        pairs.groupby(["Projekt", "Projektbezeichnung"], sort=False)
+        .agg(
+            boreholes=("bohr_Projektnummer", "count"), nearest_km=("distance_km", "min")
+        )
+        .reset_index()
+        .sort_values("nearest_km")
+    )
+    st.write(
+        f"{len(summary)} of {len(projects)} projects have boreholes within {radius_km} km"
+    )
+    st.dataframe(summary, hide_index=True)
+    st.download_button(
+        "📥 Download project/borehole pairs (CSV)",
+        data=pairs.to_csv(index=False, sep=";", decimal=","),
+        file_name="projekte_bohrungen.csv",
+        mime="text/csv",
+    )
+
+warmup.rendered("Umkreissuche", render_start)
@@ -0,0 +1,186 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import runpy
+import time
+
+import pandas as pd
+import streamlit as st
+
+from utils import warmup
+from utils.jobs import get_runner, job_owner, metrics_path
+
+render_start = warmup.page()
+
+PAGES_DIR = os.path.dirname(os.path.abspath(__file__))
+SORT_KEYS = {"Cumulative time": "cumulative", "Own time": "tottime", "Calls": "ncalls"}
+
+st.set_page_config(layout="wide")
+st.title("Diagnostics")
+st.write(
+    "Where a geocoding run spends its time: stages, request latency, rate-limit waits, retries and the cache. "
+    "Jobs from the Convert page record their metrics automatically; for the command line tool pass "
+    "`--metrics-out metrics.json` and upload the file here."
+)
+
+
+def histogram_frame(histogram: dict) -> pd.DataFrame:
+    """Non-empty buckets of a metrics histogram, labelled by their upper bound in milliseconds."""
+    rows = [
+        ("> last" if le is None else f"≤ {le * 1000:g} ms", n)
+        for le, n in histogram.get("buckets", [])
+        if n
+    ]
+    return pd.DataFrame(rows, columns=["bucket", "count"])
+
+
+def show_metrics(data: dict) -> None:
+    # altair takes seconds to import and is only needed once there is something to chart
+    import altair as alt
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Elapsed", f"{data['elapsed_s']:.1f} s")
+    ratio = data.get("cache_hit_ratio")
+    c2.metric("Cache hit ratio", "–" if ratio is None else f"{ratio:.0%}")
+    wait = data["histograms"].get("rate_limit_wait_s", {})
+    c3.metric("Rate-limit wait", f"{wait.get('sum', 0):.1f} s")
+    rss = data.get("peak_rss_mb")
+    c4.metric("Peak memory", "–" if rss is None else f"{rss:.0f} MB")
+
+    if data["stages"]:
+        st.subheader("Stages")
+        stages = (
+            pd.DataFrame.from_dict(data["stages"], orient="index")
+            .rename_axis("stage")
+            .reset_index()
+        )
+        st.altair_chart(
+            alt.Chart(stages)
+            .mark_bar()
+            .encode(
+                x=alt.X("seconds:Q", title="Seconds"),
+                y=alt.Y("stage:N", sort="-x", title=None),
+                tooltip=list(stages.columns),
+            ),
+            width="stretch",
+        )
+        st.dataframe(stages, hide_index=True)
+
+    if data["histograms"]:
+        st.subheader("Latencies and waits")
+        summary = pd.DataFrame(
+            {
+                name: {k: v for k, v in h.items() if k != "buckets"}
+                for name, h in data["histograms"].items()
+            }
+        ).T
+        st.dataframe(
+            summary,
+            column_config={
+                c: st.column_config.NumberColumn(format="%.4f")
+                for c in summary.columns
+                if c != "count"
+            },
+        )
+        for name, histogram in data["histograms"].items():
+            buckets = histogram_frame(histogram)
+            if buckets.empty:
+                continue
+            st.caption(name)
+            st.altair_chart(
+                alt.Chart(buckets)
+                .mark_bar()
+                .encode(
+                    x=alt.X("bucket:N", sort=None, title=None),
+                    y=alt.Y("count:Q", title="Count"),
+                ),
+                width="stretch",
+            )
+
+    c1, c2 = st.columns(2)
+    c1.write("**Counters**")
+    c1.json(data["counters"])
+    c2.write("**Gauges**")
+    c2.json(data["gauges"])
+
+
+source = st.radio(
+    "Metrics", ["Recent job", "Upload", "Server startup"], horizontal=True
+)
+data = None
+if source == "Recent job":
+    jobs = [
+        job
+        for job in get_runner().store.recent(owner=job_owner())
+        if os.path.exists(metrics_path(job["id"]))
+    ]
+    if jobs:
+        labels = {
+            job[
+                "id"
+            ]: f"{job['label']} · {time.strftime('%Y-%m-%d %H:%M', time.localtime(job['created']))} · "
+            f"{job['status']}"
+            for job in jobs
+        }
+        job_id = st.selectbox("Job", list(labels), format_func=labels.get)
+        with open(metrics_path(job_id), encoding="utf-8") as fh:
+            data = json.load(fh)
+    else:
+        st.info("No job has recorded metrics yet.")
+elif source == "Server startup":
+    st.caption(
+        "Warm-up steps and first page renders of this server process. Start the app with "
+        "`python utils/warmup.py` to also measure the time from server start to the first rendered page."
+    )
+    data = warmup.STARTUP.to_dict()
+else:
+    uploaded = st.file_uploader("Metrics JSON (`--metrics-out`)", type=["json"])
+    if uploaded is not None:
+        try:
+            data = json.load(uploaded)
+        except ValueError as e:
+            st.error(f"Not a metrics file: {e}")
+
+if data:
+    show_metrics(data)
+
+st.divider()
+st.subheader("Profile a page")
+if st.toggle(
+    "Profile with cProfile",
+    help="Runs the selected page here under the profiler and lists its hot spots",
+):
+    scripts = sorted(
+        f
+        for f in os.listdir(PAGES_DIR)
+        if f.endswith(".py")
+        and f != os.path.basename(__file__)
+        and not f.startswith("_")
+    )
+    script = st.selectbox("Page", scripts)
+    c1, c2 = st.columns(2)
+    sort_by = c1.selectbox("Sort by", list(SORT_KEYS))
+    top = c2.number_input("Functions", min_value=10, max_value=200, value=30, step=10)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    # The page may call st.stop(), which raises past ``except Exception``; the report is
+    # shown regardless
+    try:
+        with st.expander(f"Output of {script}"):
+            profiler.enable()
+            try:
+                runpy.run_path(os.path.join(PAGES_DIR, script), run_name="__main__")
+            except Exception as e:
+                st.exception(e)
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(
+            SORT_KEYS[sort_by]
+        ).print_stats(int(top))
+        st.write(f"{script} ran in {time.perf_counter() - start:.2f} s")
+        st.code(out.getvalue(), language=None)
+
+warmup.rendered("Diagnostics", render_start)
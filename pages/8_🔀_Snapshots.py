@@ -0,0 +1,257 @@
+import glob
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import folium
+import pandas as pd
+import streamlit as st
+from streamlit_folium import st_folium
+
+from utils import datastore, warmup
+from utils.changes import (
+    CHANGE_KINDS,
+    CHANGES_PATH,
+    DEFAULT_MOVE_KM,
+    compare_snapshots,
+    overlay_frame,
+    read_snapshot,
+    write_changes,
+)
+
+render_start = warmup.page()
+
+UPLOAD = "Upload…"
+COLORS = {
+    "new": "#2ca02c",
+    "deleted": "#d62728",
+    "moved": "#ff7f0e",
+    "team": "#9467bd",
+    "changed": "#1f77b4",
+}
+# Points drawn on the map; the table and the download always hold every change
+MAX_MARKERS = 20_000
+
+st.set_page_config(layout="wide")
+st.title("Snapshots")
+st.write(
+    "What changed between two project exports: new and deleted projects, projects that moved or changed team, "
+    "and otherwise edited rows. Compare two exports of the same kind (two CSV dumps or two workbooks), "
+    "as they identify projects differently."
+)
+
+
+@st.cache_data(show_spinner="Reading snapshot…", max_entries=6)
+def load_snapshot(path: str, version: str) -> pd.DataFrame:
+    # ``version`` only keys the cache, so a replaced file is read again
+    return read_snapshot(path)
+
+
+@st.cache_data(show_spinner="Reading snapshot…", max_entries=6)
+def load_uploaded_snapshot(digest: str, suffix: str, _data: bytes) -> pd.DataFrame:
+    # The readers want a path; the copy is removed as soon as the compact snapshot is
+    # built
+    with tempfile.TemporaryDirectory(prefix="snapshot-") as directory:
+        path = os.path.join(directory, f"upload{suffix}")
+        with open(path, "wb") as fh:
+            fh.write(_data)
+        return read_snapshot(path)
+
+
+def file_version(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def project_exports() -> list:
+    """Project exports in data/, oldest first."""
+    patterns = [datastore.DATASETS[name][0] for name in ("projects", "projects_full")]
+    paths = {
+        p
+        for pattern in patterns
+        for p in glob.glob(os.path.join(datastore.DATA_DIR, pattern))
+    }
+    return sorted(paths, key=os.path.getmtime)
+
+
+def pick_snapshot(
+    label: str, key: str, options: list, default: int
+) -> Optional[pd.DataFrame]:
+    """Compact snapshot of an export in data/ or of an uploaded one (None until there is a readable one)."""
+    choice = st.selectbox(
+        label,
+        options + [UPLOAD],
+        index=default,
+        key=key,
+        format_func=lambda p: p if p == UPLOAD else os.path.basename(p),
+    )
+    try:
+        if choice != UPLOAD:
+            return load_snapshot(choice, file_version(choice))
+        uploaded = st.file_uploader(
+            f"{label} (.csv or .xlsx)", type=["csv", "xlsx"], key=f"{key}_upload"
+        )
+        if uploaded is None:
+            return None
+        data = uploaded.getvalue()
+        return load_uploaded_snapshot(
+            hashlib.sha1(data).hexdigest(),
+            os.path.splitext(uploaded.name)[1].lower(),
+            data,
+        )
+    except (KeyError, ValueError) as e:
+        st.error(str(e))
+        return None
+
+
+exports = project_exports()
+# By default the newest export against the one before it of the same kind
+same_kind = (
+    [p for p in exports if os.path.splitext(p)[1] == os.path.splitext(exports[-1])[1]]
+    if exports
+    else []
+)
+current_default = len(exports) - 1 if exports else 0
+previous_default = (
+    exports.index(same_kind[-2]) if len(same_kind) > 1 else current_default
+)
+
+c1, c2 = st.columns(2)
+with c1:
+    previous = pick_snapshot(
+        "Previous snapshot", "snapshot_previous", exports, previous_default
+    )
+with c2:
+    current = pick_snapshot(
+        "Current snapshot", "snapshot_current", exports, current_default
+    )
+move_km = st.sidebar.number_input(
+    "Moved beyond (km)",
+    min_value=0.0,
+    value=DEFAULT_MOVE_KM,
+    step=0.05,
+    format="%.2f",
+    help="Projects whose coordinates moved further than this count as moved",
+)
+
+if previous is None or current is None:
+    st.info("Choose or upload two readable snapshots.")
+    warmup.stop("Snapshots", render_start)
+
+try:
+    result = compare_snapshots(previous, current, move_km)
+except ValueError as e:
+    st.error(str(e))
+    warmup.stop("Snapshots", render_start)
+
+counts = result.counts()
+for col, (kind, n) in zip(st.columns(len(counts)), counts.items()):
+    col.metric(kind.capitalize(), f"{n:,}")
+
+if result.changes.empty:
+    st.success("No changes between the two snapshots.")
+    warmup.stop("Snapshots", render_start)
+
+kinds = st.multiselect("Show", CHANGE_KINDS, default=CHANGE_KINDS)
+changes = result.changes[result.changes["change"].isin(kinds)]
+st.dataframe(
+    changes,
+    hide_index=True,
+    column_config={"moved_km": st.column_config.NumberColumn(format="%.3f")},
+)
+
+located = overlay_frame(changes)
+if located.empty:
+    st.caption("None of these changes has coordinates.")
+else:
+    # One GeoJSON layer per geometry type: a folium element per marker would render a
+    # template each
+    shown = changes.loc[located.index[:MAX_MARKERS]]
+    labels = shown["label"].fillna("").to_numpy()
+    points = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {
+                "change": kind,
+                "id": pid,
+                "label": label,
+                "color": COLORS[kind],
+            },
+        }
+        for lat, lon, kind, pid, label in zip(
+            shown["lat"], shown["lon"], shown["change"], shown["id"], labels
+        )
+    ]
+    moved = shown[shown["change"] == "moved"]
+    moves = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[lon0, lat0], [lon, lat]],
+            },
+            "properties": {},
+        }
+        for lat0, lon0, lat, lon in zip(
+            moved["lat_previous"], moved["lon_previous"], moved["lat"], moved["lon"]
+        )
+    ]
+    m = folium.Map(
+        location=[located["lat"].mean(), located["lon"].mean()], zoom_start=7
+    )
+    if moves:
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": moves},
+            name="Moves",
+            style_function=lambda f: {
+                "color": COLORS["moved"],
+                "weight": 2,
+                "dashArray": "4",
+            },
+        ).add_to(m)
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": points},
+        name="Changes",
+        marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=0.8),
+        style_function=lambda f: {
+            "color": f["properties"]["color"],
+            "fillColor": f["properties"]["color"],
+        },
+        tooltip=folium.GeoJsonTooltip(["change", "id", "label"]),
+    ).add_to(m)
+    st_folium(
+        m,
+        key="snapshots_map",
+        height=600,
+        use_container_width=True,
+        returned_objects=[],
+    )
+    if len(located) > MAX_MARKERS:
+        st.caption(
+            f"The map shows the first {MAX_MARKERS:,} of {len(located):,} located changes."
+        )
+
+c1, c2 = st.columns(2)
+c1.download_button(
+    "📥 Download changes (CSV)",
+    data=changes.to_csv(index=False, sep=";", decimal=","),
+    file_name="project_changes.csv",
+    mime="text/csv",
+)
+if c2.button(
+    "🪟 Show on Project Map",
+    help="Publishes the full change set as the Project Map's changes overlay",
+):
+    write_changes(result.changes)
+    st.success(f"Published {len(result.changes):,} changes to the Project Map.")
+if os.path.exists(CHANGES_PATH):
+    published = pd.Timestamp(
+        os.path.getmtime(CHANGES_PATH), unit="s", tz="UTC"
+    ).tz_convert(None)
+    st.caption(
+        f"The Project Map's changes overlay was published {published:%Y-%m-%d %H:%M} (UTC)."
+    )
+
+warmup.rendered("Snapshots", render_start)
@@ -0,0 +1,41 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The app is run from the repository root (streamlit run Home.py); tests import its
+# modules the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geopy.location import Location  # noqa: E402
+
+from utils.geocoder import Backend, GeocoderHTTPError  # noqa: E402
+
+
+class FlakyBackend(Backend):
+    """Answers every query after failing its first ``failures`` attempts with ``status``."""
+
+    name = "flaky"
+
+    def __init__(self, failures=0, status=503):
+        super().__init__(rate=0)
+        self.failures = failures
+        self.status = status
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def geocode(self, query, **params):
+        with self._lock:
+            self.calls[query] = self.calls.get(query, 0) + 1
+            attempt = self.calls[query]
+        if attempt <= self.failures:
+            raise GeocoderHTTPError(self.status)
+        if "none" in query:
+            return None
+        return Location(query, (47.8, 13.04), {"type": "house"})
+
+
+@pytest.fixture
+def flaky_backend():
+    return FlakyBackend
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from utils.addresses import build_address_series, geocode_addresses, normalize_addresses
+from utils.geocoder import GeocodingEngine
+
+
+def test_build_address_series_skips_empty_parts():
+    df = pd.DataFrame(
+        {
+            "Strasse": ["Hauptstraße 1", " ", None],
+            "PLZ": ["5020", "1010", None],
+            "Ort": ["Salzburg", "Wien", None],
+        }
+    )
+    out = build_address_series(df, ["Strasse", "PLZ", "Ort"])
+    assert out.tolist()[:2] == ["Hauptstraße 1, 5020, Salzburg", "1010, Wien"]
+    assert pd.isna(out.iloc[2])
+
+
+def test_normalize_addresses():
+    out = normalize_addresses(
+        pd.Series(
+            ["  Hauptstraße 1 ,5020   Salzburg ", "HAUPTSTRASSE 1, 5020 SALZBURG", ""]
+        )
+    )
+    # casefold() also folds ß, so both spellings share one key
+    assert out.iloc[0] == out.iloc[1] == "hauptstrasse 1, 5020 salzburg"
+    assert pd.isna(out.iloc[2])
+
+
+def test_geocode_addresses_once_per_distinct_address(flaky_backend):
+    backend = flaky_backend()
+    addresses = pd.Series(
+        ["Domplatz 1, Salzburg", "domplatz 1,  Salzburg", None, "Ring 2, Wien"],
+        index=[10, 11, 12, 13],
+    )
+    out, summary = geocode_addresses(addresses, GeocodingEngine(backend, workers=2))
+    assert backend.calls == {"Domplatz 1, Salzburg": 1, "Ring 2, Wien": 1}
+    assert out.index.tolist() == [10, 11, 12, 13]
+    assert out["geo_status"].tolist() == ["ok", "ok", "no_address", "ok"]
+    assert out["geo_display_name"].tolist()[:2] == ["Domplatz 1, Salzburg"] * 2
+    assert summary.startswith("Unique addresses: 2 / 4 rows")
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from utils.changes import compare_files, compare_snapshots, read_snapshot
+
+COLUMNS = [
+    "Projekt",
+    "Zeilenprüfsumme",
+    "Geändert am",
+    "Projektbezeichnung",
+    "Team",
+    "Breite",
+    "Laenge",
+]
+
+
+def write_export(path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(
+        path, sep=";", decimal=",", index=False, encoding="latin-1"
+    )
+    return str(path)
+
+
+@pytest.fixture
+def exports(tmp_path):
+    previous = write_export(
+        tmp_path / "previous.csv",
+        [
+            ["a", "c1", "01.01.2025", "Brücke", "T1", 47.80, 13.04],
+            ["b", "c2", "01.01.2025", "Deponie", "T1", 48.20, 16.37],
+            ["c", "c3", "01.01.2025", "Tunnel", "T2", 47.26, 11.39],
+            ["d", "c4", "01.01.2025", "Kaverne", "T2", None, None],
+            ["e", "c5", "01.01.2025", "Straße", "T3", 46.62, 14.31],
+        ],
+    )
+    current = write_export(
+        tmp_path / "current.csv",
+        [
+            ["a", "c1", "01.01.2025", "Brücke", "T1", 47.80, 13.04],
+            ["b", "c2", "01.01.2025", "Deponie", "T1", 48.30, 16.37],
+            ["c", "c3", "01.01.2025", "Tunnel", "T9", 47.26, 11.39],
+            ["d", "c4*", "02.01.2025", "Kaverne Süd", "T2", None, None],
+            ["f", "c6", "01.01.2025", "Schule", "T3", 47.07, 15.44],
+        ],
+    )
+    return previous, current
+
+
+def test_read_snapshot(exports):
+    snapshot = read_snapshot(exports[0])
+    assert snapshot["id"].tolist() == ["a", "b", "c", "d", "e"]
+    assert snapshot["label"].tolist()[1] == "Deponie"
+    assert snapshot["lat"].tolist()[0] == pytest.approx(47.80)
+    assert snapshot.attrs["id_column"] == "Projekt"
+
+
+def test_compare_snapshots(exports):
+    result = compare_files(*exports)
+    kinds = dict(zip(result.changes["id"], result.changes["change"].astype(str)))
+    assert kinds == {
+        "b": "moved",
+        "c": "team",
+        "d": "changed",
+        "f": "new",
+        "e": "deleted",
+    }
+    assert result.unchanged == 1
+    moved = result.changes.set_index("id").loc["b"]
+    assert moved["moved_km"] == pytest.approx(11.1, abs=0.1)
+    assert moved["lat_previous"] == pytest.approx(48.20)
+    assert result.changes.set_index("id").loc["c", "team_previous"] == "T2"
+
+
+def test_compare_snapshots_move_threshold(exports):
+    previous, current = (read_snapshot(p) for p in exports)
+    result = compare_snapshots(previous, current, move_km=20)
+    assert "moved" not in set(result.changes["change"].astype(str))
+    assert result.unchanged == 2
+
+
+def test_compare_snapshots_of_different_kinds(exports):
+    previous = read_snapshot(exports[0])
+    current = previous.copy()
+    current.attrs["id_column"] = "Nummer"
+    with pytest.raises(ValueError):
+        compare_snapshots(previous, current)
@@ -0,0 +1,68 @@
+import json
+
+import pandas as pd
+import pytest
+
+from utils.addresses import geocode_addresses
+from utils.checkpoint import CheckpointJournal, CheckpointMismatch
+from utils.geocoder import GeocodingEngine
+
+ADDRESSES = [f"Hauptstraße {i}, 5020 Salzburg" for i in range(40)]
+
+
+def test_journal_load_skips_torn_line(tmp_path):
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    with CheckpointJournal(path, {"country_codes": "at"}).open() as journal:
+        journal.append(
+            "a", {"geo_status": "ok", "latitude": 47.8, "longitude": float("nan")}
+        )
+        journal.append("b", {"geo_status": "not_found"})
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"key": "c", "res')
+    entries = CheckpointJournal(path, {"country_codes": "at", "viewbox": None}).load()
+    assert entries == {
+        "a": {"geo_status": "ok", "latitude": 47.8},
+        "b": {"geo_status": "not_found"},
+    }
+    with pytest.raises(CheckpointMismatch):
+        CheckpointJournal(path, {"country_codes": "de"}).load()
+
+
+def test_journal_resume_appends_and_restart_truncates(tmp_path):
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    with CheckpointJournal(path).open() as journal:
+        journal.append("a", {"geo_status": "ok"})
+    with CheckpointJournal(path).open(resume=True) as journal:
+        journal.append("b", {"geo_status": "ok"})
+    assert set(CheckpointJournal(path).load()) == {"a", "b"}
+    with open(path, encoding="utf-8") as fh:
+        assert sum("params" in json.loads(line) for line in fh) == 1
+    with CheckpointJournal(path).open() as journal:
+        journal.append("c", {"geo_status": "ok"})
+    assert set(CheckpointJournal(path).load()) == {"c"}
+
+
+def test_resume_geocodes_only_missing_addresses(tmp_path, flaky_backend):
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    # An interrupted first run that got through the first 15 addresses
+    with CheckpointJournal(path).open() as journal:
+        geocode_addresses(
+            pd.Series(ADDRESSES[:15]),
+            GeocodingEngine(flaky_backend()),
+            on_result=journal.append,
+        )
+
+    backend = flaky_backend()
+    journal = CheckpointJournal(path)
+    known = journal.load()
+    with journal.open(resume=True):
+        out, summary = geocode_addresses(
+            pd.Series(ADDRESSES + ADDRESSES[:5]),
+            GeocodingEngine(backend),
+            known=known,
+            on_result=journal.append,
+        )
+    assert sorted(backend.calls) == sorted(ADDRESSES[15:])
+    assert "15 reused" in summary
+    assert out["geo_status"].eq("ok").all()
+    assert len(CheckpointJournal(path).load()) == len(ADDRESSES)
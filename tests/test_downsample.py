@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from utils.downsample import bucket_stats, lttb
+
+
+def test_lttb_keeps_endpoints_and_count():
+    x = np.arange(10_000, dtype="float64")
+    y = np.sin(x / 100)
+    idx = lttb(x, y, 500)
+    assert len(idx) == 500
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_lttb_picks_spikes():
+    x = np.arange(1000, dtype="float64")
+    y = np.zeros(1000)
+    y[[250, 600]] = [10.0, -10.0]
+    idx = lttb(x, y, 20)
+    assert {250, 600} <= set(idx)
+
+
+def test_lttb_skips_nan_and_short_input():
+    y = np.array([1.0, np.nan, 3.0, 4.0])
+    np.testing.assert_array_equal(lttb(np.arange(4), y, 10), [0, 2, 3])
+    np.testing.assert_array_equal(lttb(np.arange(4), y, 2), [0, 2, 3])
+
+
+def test_bucket_stats_matches_groupby():
+    rng = np.random.default_rng(0)
+    ts = np.sort(rng.integers(0, 100_000, 20_000))
+    values = rng.normal(size=len(ts))
+    values[::13] = np.nan
+    stats = bucket_stats(ts, values, 900)
+
+    frame = pd.DataFrame({"bucket": ts // 900 * 900, "v": values}).dropna()
+    expected = (
+        frame.groupby("bucket")["v"]
+        .agg(["count", "sum", "min", "max", "mean"])
+        .reset_index()
+    )
+    pd.testing.assert_frame_equal(stats, expected, check_dtype=False)
+
+
+def test_bucket_stats_empty():
+    stats = bucket_stats(np.array([0, 1]), np.array([np.nan, np.nan]), 60)
+    assert stats.empty
+    assert list(stats.columns) == ["bucket", "count", "sum", "min", "max", "mean"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.excelio import TableWriter, iter_excel, read_header, read_table, write_chunks
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {
+            "Adresse": ["Hauptstraße 1", "Domplatz 2", None, "Ring 4", "Gasse 5"],
+            "Breite": [47.8, np.nan, 48.2, 46.6, 47.1],
+            "Anzahl": [1.0, 2.0, 3.0, np.nan, 5.0],
+            "geo_status": ["ok", "not_found", "ok", "error: HTTP 503", "ok"],
+        }
+    )
+
+
+def chunks(df, size=2):
+    return [df.iloc[i : i + size] for i in range(0, len(df), size)]
+
+
+@pytest.mark.parametrize("ext", ["xlsx", "csv", "parquet"])
+def test_round_trip(tmp_path, frame, ext):
+    path = str(tmp_path / f"result.{ext}")
+    assert write_chunks(path, chunks(frame)) == len(frame)
+    back = read_table(path)
+    pd.testing.assert_frame_equal(back, frame, check_dtype=False)
+    assert list(read_table(path, columns=["Breite", "missing"]).columns) == ["Breite"]
+    pd.testing.assert_frame_equal(
+        read_table(path, nrows=2), frame.iloc[:2], check_dtype=False
+    )
+
+
+def test_excel_chunks(tmp_path, frame):
+    path = str(tmp_path / "result.xlsx")
+    write_chunks(path, [frame], sheet_name="Ergebnis")
+    assert read_header(path, "Ergebnis") == list(frame.columns)
+    parts = list(iter_excel(path, "Ergebnis", chunk_rows=2))
+    assert [len(p) for p in parts] == [2, 2, 1]
+    assert parts[-1].index.tolist() == [4]
+
+
+def test_writer_rejects_other_columns(tmp_path, frame):
+    path = tmp_path / "result.csv"
+    with pytest.raises(ValueError):
+        with TableWriter(str(path)) as writer:
+            writer.write(frame)
+            writer.write(frame.rename(columns={"Breite": "lat"}))
+    # An aborted write leaves neither a result nor its temporary file behind
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parquet_rejects_type_change(tmp_path, frame):
+    with pytest.raises(ValueError):
+        write_chunks(
+            str(tmp_path / "result.parquet"),
+            [frame.iloc[:2], frame.iloc[2:].assign(Breite="Nord")],
+        )
@@ -0,0 +1,45 @@
+import pytest
+
+from bench.fake_nominatim import FakeNominatim
+from utils.geocoder import GeocodingEngine, NominatimBackend
+
+ADDRESSES = [f"Hauptstraße {i}, 5020 Salzburg" for i in range(40)]
+
+
+@pytest.fixture
+def fake():
+    with FakeNominatim(error_rate=0.3, seed=1) as server:
+        yield server
+
+
+def engine(url, retries=5, workers=4):
+    # rate=0 switches the token bucket off; the fake answers as fast as it can
+    return GeocodingEngine(
+        NominatimBackend(url=url, rate=0),
+        workers=workers,
+        retries=retries,
+        backoff=0.001,
+    )
+
+
+def test_engine_retries_errors(fake):
+    results = engine(fake.url, retries=10).geocode_many(ADDRESSES + ["none of these"])
+    assert fake.errors > 0
+    assert fake.requests == len(ADDRESSES) + 1 + fake.errors
+    assert [r["geo_status"] for r in results] == ["ok"] * len(ADDRESSES) + ["not_found"]
+    assert all(r["geo_display_name"] == a for r, a in zip(results, ADDRESSES))
+
+
+def test_engine_gives_up_after_retries(fake):
+    fake.error_rate = 1.0
+    result = engine(fake.url, retries=2, workers=1).geocode_one("Hauptstraße 1")
+    assert result["geo_status"].startswith("error: HTTP 503")
+    assert fake.requests == 3
+
+
+def test_answers_are_stable(fake):
+    fake.error_rate = 0.0
+    first = engine(fake.url).geocode_one("Domplatz 1, Salzburg")
+    again = engine(fake.url).geocode_one("Domplatz 1, Salzburg")
+    assert first == again
+    assert 46.5 <= first["latitude"] <= 49.0
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from utils.geocache import GeocodeCache
+from utils.geocoder import GeocodingEngine, TokenBucket
+
+
+def test_engine_retries_transient_errors(flaky_backend):
+    backend = flaky_backend(failures=2)
+    engine = GeocodingEngine(backend, workers=4, retries=3, backoff=0.001)
+    queries = [f"Hauptstraße {i}, Salzburg" for i in range(20)] + ["none such"]
+    results = engine.geocode_many(queries)
+    assert [r["geo_status"] for r in results] == ["ok"] * 20 + ["not_found"]
+    assert [r["geo_display_name"] for r in results[:20]] == queries[:20]
+    assert set(backend.calls.values()) == {3}
+
+
+def test_engine_gives_up_after_retries(flaky_backend):
+    backend = flaky_backend(failures=10)
+    result = GeocodingEngine(backend, workers=1, retries=2, backoff=0.001).geocode_one(
+        "Ring 1"
+    )
+    assert result["geo_status"] == "error: HTTP 503"
+    assert backend.calls == {"Ring 1": 3}
+
+
+def test_engine_does_not_retry_client_errors(flaky_backend):
+    backend = flaky_backend(failures=10, status=400)
+    result = GeocodingEngine(backend, workers=1, retries=3, backoff=0.001).geocode_one(
+        "Ring 1"
+    )
+    assert result["geo_status"] == "error: HTTP 400"
+    assert backend.calls == {"Ring 1": 1}
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(12):
+        bucket.acquire()
+    # Two tokens are there at once, the other ten take 1/50 s each
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.08)
+
+
+def test_cache_is_kept_apart_per_backend(tmp_path, flaky_backend):
+    cache = GeocodeCache(str(tmp_path / "cache.sqlite"))
+    first, second = flaky_backend(), flaky_backend()
+    second.url = "http://localhost:8080"
+    for backend in (first, first, second):
+        GeocodingEngine(backend, workers=1, cache=cache).geocode_one("Ring 1")
+    assert first.calls == second.calls == {"Ring 1": 1}
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
@@ -0,0 +1,17 @@
+from utils import jobs
+
+
+def test_runner_interrupts_only_jobs_of_earlier_processes(tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite"))
+    old = store.create("convert", "old.xlsx", {})
+    store.update(old, status="running", process="1-earlier")
+    queued = store.create("convert", "queued.xlsx", {})
+    running = store.create("convert", "running.xlsx", {})
+    store.update(running, status="running")
+    monkeypatch.setattr(jobs, "JobStore", lambda: store)
+
+    # A second runner in the same process, e.g. after st.cache_resource was cleared
+    jobs.JobRunner(workers=1).pool.shutdown()
+    assert store.get(old)["status"] == "interrupted"
+    assert store.get(queued)["status"] == "queued"
+    assert store.get(running)["status"] == "running"
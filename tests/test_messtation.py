@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.messtation import (
+    SETTLE,
+    Messtation,
+    StationStore,
+    parse_download,
+    plan_requests,
+)
+
+
+class FakeClient:
+    """Stands in for download.cgi: one value per channel every 10 minutes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, channels, start, end):
+        self.calls.append((channels, start, end))
+        ts = pd.date_range(start, end, freq="10min", inclusive="left")
+        return pd.DataFrame(
+            {
+                "ts": np.repeat(ts, len(channels)),
+                "channel": np.tile(channels, len(ts)),
+                "value": 1.5,
+                "status": pd.array(["0"] * len(ts) * len(channels), dtype="string"),
+            }
+        )
+
+
+def test_parse_download():
+    text = (
+        "Datum Zeit;Kanal 1 [µg/m³];Status;Kanal 2 [°C];Status\r\n"
+        "29.09.2025 06:00:00;12,5;0;7,25;1\r\n"
+        "29.09.2025 06:10:00;;0;7,5;0\r\n"
+    )
+    df = parse_download(text, [1, 2])
+    assert df["channel"].tolist() == [1, 1, 2, 2]
+    assert df["ts"].tolist()[1] == pd.Timestamp("2025-09-29 06:10")
+    np.testing.assert_array_equal(df["value"], [12.5, np.nan, 7.25, 7.5])
+    assert df["status"].tolist() == ["0", "0", "1", "0"]
+
+
+def test_plan_requests_splits_days_and_shares_requests():
+    day = datetime(2025, 9, 29)
+    missing = {
+        1: [(day + timedelta(hours=6), day + timedelta(days=2))],
+        2: [(day + timedelta(days=1), day + timedelta(days=2))],
+    }
+    assert plan_requests(missing) == [
+        ((1,), day + timedelta(hours=6), day + timedelta(days=1)),
+        ((1, 2), day + timedelta(days=1), day + timedelta(days=2)),
+    ]
+
+
+def test_update_downloads_only_missing_windows(tmp_path):
+    client = FakeClient()
+    station = Messtation(StationStore(str(tmp_path / "store.sqlite")), client)
+    start = datetime(2025, 9, 1)
+    made, errors = station.update([1, 2], start, start + timedelta(days=3))
+    assert (made, errors) == (3, [])
+    assert station.update([1, 2], start, start + timedelta(days=3)) == (0, [])
+
+    # A longer range and a new channel only fetch what the store lacks
+    client.calls.clear()
+    station.update([1, 2, 3], start + timedelta(days=1), start + timedelta(days=4))
+    assert sorted(client.calls) == [
+        ((1, 2, 3), start + timedelta(days=3), start + timedelta(days=4)),
+        ((3,), start + timedelta(days=1), start + timedelta(days=2)),
+        ((3,), start + timedelta(days=2), start + timedelta(days=3)),
+    ]
+    df = station.get([1, 3], start, start + timedelta(days=4), refresh=False)
+    assert len(df) == 4 * 144 + 3 * 144
+    station.store.close()
+
+
+def test_update_stops_at_now_and_skips_the_unsettled_tail(tmp_path):
+    client = FakeClient()
+    station = Messtation(StationStore(str(tmp_path / "store.sqlite")), client)
+    start = datetime.now() - timedelta(days=1)
+    end = datetime.now() + timedelta(days=1)
+    made, errors = station.update([1], start, end, recent=False)
+    assert made >= 1 and errors == []
+    assert max(e for _, _, e in client.calls) <= datetime.now() - SETTLE
+    assert station.update([1], start, end, recent=False) == (0, [])
+
+    # The default also downloads the last SETTLE, but never past now
+    client.calls.clear()
+    made, _ = station.update([1], start, end)
+    assert made >= 1
+    assert max(e for _, _, e in client.calls) <= datetime.now()
+    station.store.close()
@@ -0,0 +1,50 @@
+import pytest
+
+from utils import sideserver
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = object()
+    monkeypatch.setattr(sideserver, "side_server", lambda: server)
+    monkeypatch.delenv("TILE_SERVER_URL", raising=False)
+    monkeypatch.setattr(sideserver, "DEFAULT_HOST", "127.0.0.1")
+    return server
+
+
+@pytest.mark.parametrize("host", ["localhost", "127.0.0.1", "::1"])
+def test_reachable_from_this_machine(monkeypatch, server, host):
+    monkeypatch.setattr(sideserver, "_page_host", lambda: host)
+    assert sideserver.reachable_server() is server
+
+
+def test_not_reachable_from_other_machines_on_loopback(monkeypatch, server):
+    monkeypatch.setattr(sideserver, "_page_host", lambda: "gis.example.org")
+    assert sideserver.reachable_server() is None
+    monkeypatch.setattr(sideserver, "DEFAULT_HOST", "0.0.0.0")
+    assert sideserver.reachable_server() is server
+    monkeypatch.setattr(sideserver, "DEFAULT_HOST", "127.0.0.1")
+    monkeypatch.setenv("TILE_SERVER_URL", "https://gis.example.org/side")
+    assert sideserver.reachable_server() is server
+
+
+def test_disabled_server_is_never_reachable(monkeypatch):
+    monkeypatch.setattr(sideserver, "side_server", lambda: None)
+    monkeypatch.setenv("TILE_SERVER_URL", "https://gis.example.org/side")
+    assert sideserver.reachable_server() is None
+
+
+def test_download_falls_back_to_streamlit_for_remote_browsers(
+    monkeypatch, server, tmp_path
+):
+    path = tmp_path / "results.xlsx"
+    path.write_bytes(b"xlsx")
+    calls = []
+    monkeypatch.setattr(sideserver, "_page_host", lambda: "gis.example.org")
+    monkeypatch.setattr(
+        sideserver.st, "download_button", lambda *a, **kw: calls.append(kw)
+    )
+    monkeypatch.setattr(sideserver.st, "link_button", lambda *a, **kw: 1 / 0)
+    sideserver.download_button("Download", str(path), "results.xlsx", "application/x")
+    assert calls[0]["file_name"] == "results.xlsx"
+    assert calls[0]["data"]() == b"xlsx"
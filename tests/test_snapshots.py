@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from utils.snapshots import (
+    CHECKSUM_COLUMN,
+    MODIFIED_COLUMN,
+    align_previous,
+    diff_exports,
+)
+
+
+def export(rows):
+    return pd.DataFrame(rows, columns=["Projekt", "Projektbezeichnung", "Team"])
+
+
+def test_diff_exports_without_checksum():
+    previous = export(
+        [["a", "Brücke", "T1"], ["b", "Deponie", "T1"], ["c", "Tunnel", "T2"]]
+    )
+    new = export(
+        [["a", "Brücke", "T1"], ["c", "Tunnel Ost", "T2"], ["d", "Kaverne", "T3"]]
+    )
+    diff = diff_exports(new, previous)
+    assert diff.status.tolist() == ["unchanged", "changed", "new"]
+    assert diff.deleted["Projekt"].tolist() == ["b"]
+    assert diff.counts() == {"new": 1, "changed": 1, "unchanged": 1, "deleted": 1}
+
+
+def test_diff_exports_uses_checksum_and_modified():
+    previous = export([["a", "Brücke", "T1"], ["b", "Deponie", "T1"]])
+    previous[CHECKSUM_COLUMN] = ["x", "y"]
+    previous[MODIFIED_COLUMN] = ["01.01.2025 10:00", "01.01.2025 10:00"]
+    new = previous.copy()
+    # Only the checksum and the timestamp count, so a geocoding column or an edited
+    # label alone does not
+    new.loc[0, "Projektbezeichnung"] = "Brücke Nord"
+    new.loc[1, MODIFIED_COLUMN] = "02.01.2025 10:00"
+    assert diff_exports(new, previous).status.tolist() == ["unchanged", "changed"]
+
+
+def test_diff_exports_pairs_repeated_ids_in_order():
+    previous = export([["a", "eins", "T1"], ["a", "zwei", "T1"], ["b", "drei", "T1"]])
+    new = export([["a", "eins", "T1"], ["a", "zwei*", "T1"], ["a", "vier", "T1"]])
+    diff = diff_exports(new, previous)
+    assert diff.status.tolist() == ["unchanged", "changed", "new"]
+    assert diff.deleted["Projekt"].tolist() == ["b"]
+
+
+def test_diff_exports_excludes_columns():
+    previous = export([["a", "Brücke", "T1"]]).assign(lat=[47.0])
+    new = export([["a", "Brücke", "T1"]]).assign(lat=[48.0])
+    assert diff_exports(new, previous).status.tolist() == ["changed"]
+    assert diff_exports(new, previous, exclude=["lat"]).status.tolist() == ["unchanged"]
+
+
+def test_diff_exports_needs_id_column():
+    with pytest.raises(KeyError):
+        diff_exports(pd.DataFrame({"x": [1]}), pd.DataFrame({"x": [1]}))
+
+
+def test_align_previous():
+    previous = export([["b", "Deponie", "T1"], ["a", "Brücke", "T2"]])
+    new = export([["a", "Brücke", "T1"], ["c", "Tunnel", "T2"]])
+    aligned = align_previous(new, previous, ["Team"])
+    assert aligned["Team"].tolist()[0] == "T2"
+    assert pd.isna(aligned["Team"].tolist()[1])
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from utils.spatial import SpatialIndex, haversine_km
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(46.3, 49.0, 5000)
+    lon = rng.uniform(9.5, 17.2, 5000)
+    lat[::97] = np.nan
+    return lat, lon
+
+
+def brute_radius(lat, lon, qlat, qlon, km):
+    dist = haversine_km(qlat, qlon, lat, lon)
+    return set(np.flatnonzero(dist <= km))
+
+
+@pytest.mark.parametrize("km", [0.5, 5, 40])
+def test_radius_matches_brute_force(points, km):
+    index = SpatialIndex(*points)
+    for qlat, qlon in [(47.8, 13.04), (48.2, 16.37), (46.3, 9.5)]:
+        pos, dist = index.radius(qlat, qlon, km)
+        assert set(pos) == brute_radius(*points, qlat, qlon, km)
+        assert np.all(np.diff(dist) >= 0)
+        np.testing.assert_allclose(
+            dist, haversine_km(qlat, qlon, points[0][pos], points[1][pos])
+        )
+
+
+def test_radius_across_antimeridian():
+    index = SpatialIndex([0.0, 0.0, 0.0], [179.99, -179.99, 170.0])
+    pos, _ = index.radius(0.0, 180.0, 5)
+    assert set(pos) == {0, 1}
+
+
+@pytest.mark.parametrize("k", [1, 7, 50])
+def test_nearest_matches_brute_force(points, k):
+    index = SpatialIndex(*points)
+    pos, dist = index.nearest(47.5, 12.0, k)
+    expected = np.sort(haversine_km(47.5, 12.0, *points)[~np.isnan(points[0])])[:k]
+    np.testing.assert_allclose(dist, expected)
+    assert len(set(pos)) == k
+
+
+def test_nearest_more_than_indexed():
+    index = SpatialIndex([47.0, np.nan], [13.0, 13.0])
+    pos, _ = index.nearest(0.0, 0.0, 5)
+    assert list(pos) == [0]
+
+
+def test_join_matches_brute_force(points):
+    rng = np.random.default_rng(1)
+    qlat = rng.uniform(46.3, 49.0, 300)
+    qlon = rng.uniform(9.5, 17.2, 300)
+    qlat[5] = np.nan
+    index = SpatialIndex(*points)
+    pairs = index.join(qlat, qlon, 3)
+    expected = {
+        (q, p)
+        for q in range(len(qlat))
+        for p in brute_radius(*points, qlat[q], qlon[q], 3)
+    }
+    assert set(zip(pairs["left"], pairs["right"])) == expected
+    assert len(pairs) == len(expected)
+    np.testing.assert_allclose(
+        pairs["distance_km"],
+        haversine_km(
+            qlat[pairs["left"]],
+            qlon[pairs["left"]],
+            points[0][pairs["right"]],
+            points[1][pairs["right"]],
+        ),
+    )
+
+
+def test_join_without_points():
+    pairs = SpatialIndex([], []).join([47.0], [13.0], 1)
+    assert pairs.empty
+    assert list(pairs.columns) == ["left", "right", "distance_km"]
@@ -0,0 +1,239 @@
+"""Columnar address preparation: build, normalize and deduplicate geocoding queries."""
+
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+
+if TYPE_CHECKING:
+    from utils.geocoder import GeocodingEngine
+
+RESULT_COLUMNS = [
+    "geo_status",
+    "latitude",
+    "longitude",
+    "geo_precision_hint",
+    "geo_display_name",
+    "geo_source",
+]
+# Few distinct statuses, sources and OSM types repeat over many rows, so they are
+# categoricals
+RESULT_DTYPES = {
+    "geo_status": "category",
+    "latitude": "float64",
+    "longitude": "float64",
+    "geo_precision_hint": "category",
+    "geo_display_name": "string",
+    "geo_source": "category",
+}
+# Seconds between progress callbacks (the last one, done == total, is always delivered)
+PROGRESS_INTERVAL = 0.5
+
+
+def detect_address_column(
+    df: pd.DataFrame, explicit_col: Optional[str] = None
+) -> Optional[str]:
+    if explicit_col:
+        for c in df.columns:
+            if str(c).lower() == explicit_col.lower():
+                return c
+        return None
+    # try common names
+    candidates = ["address", "adresse", "full_address", "location"]
+    for cand in candidates:
+        for c in df.columns:
+            if str(c).lower() == cand:
+                return c
+    return None
+
+
+def clean_addresses(series: pd.Series) -> pd.Series:
+    """Strip whitespace and turn empty strings into <NA>."""
+    cleaned = series.astype("string").str.strip()
+    return cleaned.mask(cleaned == "")
+
+
+def build_address_series(df: pd.DataFrame, cols: List[str]) -> pd.Series:
+    """Join ``cols`` with ", " per row, skipping empty parts, one column at a time."""
+    out = pd.Series(pd.NA, index=df.index, dtype="string")
+    for c in cols:
+        part = clean_addresses(df[c])
+        out = (out + ", " + part).fillna(out).fillna(part)
+    return out
+
+
+def normalize_addresses(series: pd.Series) -> pd.Series:
+    """Vectorized twin of ``utils.geocache.normalize_address``."""
+    s = clean_addresses(series)
+    s = s.str.normalize("NFKC").str.casefold()
+    s = s.str.replace(r"\s*,\s*", ", ", regex=True)
+    s = s.str.replace(r"\s+", " ", regex=True)
+    return s.str.strip(" ,").mask(lambda x: x == "")
+
+
+def dedupe_addresses(
+    address_series: pd.Series,
+) -> Tuple[pd.Series, pd.Series, np.ndarray]:
+    """Return ``(keys, unique, codes)``.
+
+    ``keys`` is aligned to ``address_series`` and holds each row's normalized
+    address (<NA> for rows without one); ``unique`` maps every distinct key to
+    the first raw query string seen for it; ``codes`` is each row's position in
+    ``unique`` (-1 without an address).
+    """
+    queries = clean_addresses(address_series)
+    keys = normalize_addresses(queries)
+    codes, uniques = pd.factorize(keys)
+    # Codes are numbered in order of first appearance, so the first row of each is its
+    # first occurrence
+    _, first = np.unique(codes[codes >= 0], return_index=True)
+    unique = pd.Series(
+        queries[codes >= 0].to_numpy()[first],
+        index=pd.Index(uniques, dtype=keys.dtype),
+        dtype="string",
+    )
+    return keys, unique, codes
+
+
+def result_frame(
+    records: Sequence[Dict[str, Any]],
+    index=None,
+    dtypes: Dict[str, str] = RESULT_DTYPES,
+) -> pd.DataFrame:
+    """The ``dtypes`` columns (default ``RESULT_COLUMNS``) of result dicts as one typed array per column."""
+    columns = {}
+    for col, dtype in dtypes.items():
+        values = pd.Series([r.get(col) for r in records], dtype="object")
+        if dtype == "float64":
+            columns[col] = (
+                pd.to_numeric(values, errors="coerce").astype("float64").to_numpy()
+            )
+        else:
+            columns[col] = values.astype("string").astype(dtype).array
+    return pd.DataFrame(columns, index=index)
+
+
+def result_dtypes(
+    df: pd.DataFrame, dtypes: Dict[str, str] = RESULT_DTYPES
+) -> pd.DataFrame:
+    """Cast the result columns of ``df`` (e.g. read back from a file) to ``dtypes``."""
+    casts = {}
+    for col, dtype in dtypes.items():
+        if col in df.columns:
+            if dtype == "float64":
+                casts[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+            else:
+                casts[col] = df[col].astype("string").astype(dtype)
+    return df.assign(**casts)
+
+
+def broadcast_results(
+    codes: np.ndarray,
+    results: pd.DataFrame,
+    index: pd.Index,
+    missing: Optional[Dict[str, Any]] = None,
+    dtypes: Dict[str, str] = RESULT_DTYPES,
+) -> pd.DataFrame:
+    """Row ``codes[i]`` of ``results`` for every row in one positional take;
+    rows with code -1 get ``missing`` (default ``geo_status == "no_address"``)."""
+    missing = missing or {"geo_status": "no_address"}
+    table = result_dtypes(
+        pd.concat(
+            [results.reset_index(drop=True), result_frame([missing], dtypes=dtypes)],
+            ignore_index=True,
+        ),
+        dtypes,
+    )
+    return table.take(np.where(codes < 0, len(results), codes)).set_axis(index)
+
+
+def dedupe_summary(keys: pd.Series, unique: pd.Series) -> str:
+    total = len(keys)
+    ratio = (len(unique) / total * 100) if total else 0.0
+    return f"Unique addresses: {len(unique)} / {total} rows ({ratio:.1f}%)"
+
+
+def known_results(
+    df: pd.DataFrame, keys: pd.Series, statuses=("ok",)
+) -> Dict[str, Dict[str, Any]]:
+    """Collect per-key results from a frame that already carries ``RESULT_COLUMNS``
+    (e.g. a previous ``_geocoded.xlsx``), keeping only rows whose status is in ``statuses``.
+    """
+    if "geo_status" not in df.columns:
+        return {}
+    cols = [c for c in RESULT_COLUMNS if c in df.columns]
+    mask = df["geo_status"].isin(statuses) & keys.notna()
+    prev = df.loc[mask, cols].groupby(keys[mask], sort=False).first()
+    return {
+        k: {c: v for c, v in row.items() if pd.notna(v)}
+        for k, row in prev.to_dict("index").items()
+    }
+
+
+def throttled(
+    progress: Optional[Callable[[int, int], None]], interval: float = PROGRESS_INTERVAL
+) -> Optional[Callable[[int, int], None]]:
+    """``progress(done, total)`` limited to one call per ``interval`` seconds plus the final one."""
+    if progress is None:
+        return None
+    last = [float("-inf")]
+
+    def wrapper(done: int, total: int) -> None:
+        now = time.monotonic()
+        if done == total or now - last[0] >= interval:
+            last[0] = now
+            progress(done, total)
+
+    return wrapper
+
+
+def geocode_addresses(
+    address_series: pd.Series,
+    engine: "GeocodingEngine",
+    params: Optional[Dict[str, Any]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    known: Optional[Dict[str, Dict[str, Any]]] = None,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    progress_interval: float = PROGRESS_INTERVAL,
+) -> Tuple[pd.DataFrame, str]:
+    """Geocode each distinct address once and fan the results out to all rows.
+
+    Addresses whose normalized key is in ``known`` reuse that result instead of
+    being geocoded; ``on_result(key, result)`` is called for every new answer
+    and ``progress(done, total)`` at most every ``progress_interval`` seconds.
+    Returns a frame with ``RESULT_COLUMNS`` (typed as ``RESULT_DTYPES``) aligned
+    to ``address_series`` and a one-line dedupe summary.
+    """
+    recorder = metrics.current()
+    with recorder.stage("dedupe", rows=len(address_series)):
+        keys, unique, codes = dedupe_addresses(address_series)
+        known = known or {}
+        reused = unique.index.isin(list(known))
+        pending = unique[~reused]
+    callback = (
+        (lambda i, result: on_result(pending.index[i], result)) if on_result else None
+    )
+    with recorder.stage("geocoding", rows=len(pending)):
+        records = engine.geocode_many(
+            pending.tolist(),
+            params,
+            throttled(progress, progress_interval),
+            on_result=callback,
+        )
+    with recorder.stage("assembly", rows=len(address_series)):
+        # One result per distinct address, in the order of ``unique``
+        ordered: List[Dict[str, Any]] = [{}] * len(unique)
+        for pos, key in zip(np.flatnonzero(reused), unique.index[reused]):
+            ordered[pos] = known[key]
+        for pos, record in zip(np.flatnonzero(~reused), records):
+            ordered[pos] = record
+        out = broadcast_results(codes, result_frame(ordered), address_series.index)
+    recorder.gauge("unique_addresses", len(unique))
+    recorder.gauge("reused_addresses", int(reused.sum()))
+    summary = dedupe_summary(keys, unique)
+    if reused.any():
+        summary += f", {int(reused.sum())} reused from earlier results"
+    return out, summary
@@ -1,98 +1,533 @@
 #!/usr/bin/env python3
 import argparse
+import os
 import sys
 import time
-from typing import List, Optional
+from typing import Any, List, Tuple
 
 import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 try:
-    from geopy.geocoders import Nominatim
-    from geopy.extra.rate_limiter import RateLimiter
+    import geopy  # noqa: F401
 except ImportError:
     sys.stderr.write("Error: geopy is not installed. Install with: pip install geopy\n")
     sys.exit(1)
 
+from utils.addresses import (
+    RESULT_COLUMNS,
+    build_address_series,
+    detect_address_column,
+    geocode_addresses,
+    known_results,
+    normalize_addresses,
+    result_dtypes,
+)
+from utils.checkpoint import CheckpointJournal, CheckpointMismatch
+from utils.excelio import iter_frame, read_table, with_columns, write_chunks
+from utils.geocache import DEFAULT_CACHE_PATH, DEFAULT_TTL_DAYS, GeocodeCache
+from utils.gazetteer import DEFAULT_GAZETTEER_PATH, DEFAULT_MIN_SCORE
+from utils.geocoder import BACKENDS, GeocodingEngine, load_gazetteer, make_engine
+from utils.metrics import Metrics, current, recording
+from utils.reverse import (
+    DEFAULT_GRID_M,
+    DEFAULT_ZOOM,
+    cell_queries,
+    detect_coordinate_columns,
+    fill_addresses,
+    reverse_geocode_points,
+)
+from utils.snapshots import (
+    ADDRESS_COLUMN,
+    align_previous,
+    diff_exports,
+    export_columns,
+    id_column,
+    iter_project_export,
+    output_path_for,
+    parse_decimal_comma,
+    read_project_export,
+)
 
-def build_address_from_columns(row: pd.Series, cols: List[str]) -> Optional[str]:
-    parts = []
-    for c in cols:
-        if c in row and pd.notna(row[c]) and str(row[c]).strip():
-            parts.append(str(row[c]).strip())
-    if not parts:
-        return None
-    return ", ".join(parts)
+# Columns of an earlier result that --retry-errors reuses
+RESULT_INPUT_COLUMNS = RESULT_COLUMNS + ["geo_query"]
 
 
-def detect_address_column(df: pd.DataFrame, explicit_col: Optional[str]) -> Optional[str]:
-    if explicit_col:
-        for c in df.columns:
-            if c.lower() == explicit_col.lower():
-                return c
-        return None
-    # try common names
-    candidates = ["address", "adresse", "full_address", "location"]
-    for cand in candidates:
-        for c in df.columns:
-            if c.lower() == cand:
-                return c
-    return None
+def load_previous_results(
+    df: pd.DataFrame, output_path: str, input_path: str
+) -> List[pd.DataFrame]:
+    previous = []
+    if "geo_status" in df.columns:
+        previous.append(df)
+    if os.path.exists(output_path) and os.path.abspath(output_path) != os.path.abspath(
+        input_path
+    ):
+        try:
+            previous.append(read_table(output_path, columns=RESULT_INPUT_COLUMNS))
+        except Exception as e:
+            sys.stderr.write(
+                f"Warning: could not read previous output {output_path} ({e}).\n"
+            )
+    return previous
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Geocode addresses in an Excel file (Nominatim / OSM).")
-    parser.add_argument("input", help="Input Excel file path (.xlsx)")
-    parser.add_argument("--sheet", default=None, help="Worksheet name to read (default: first sheet)")
-    parser.add_argument("--output", default=None, help="Output Excel file path (default: input file name with _geocoded.xlsx)")
-    parser.add_argument("--address-column", dest="address_column", default=None,
-                        help="Name of a single address column (case-insensitive)")
-    parser.add_argument("--address-columns", dest="address_columns", nargs="+", default=None,
-                        help="Multiple columns to concatenate into an address (order matters)")
-    parser.add_argument("--user-agent", default="excel-geocoder-script",
-                        help="User-Agent for Nominatim (please set to your app or email/URL)")
-    parser.add_argument("--pause", type=float, default=1.0,
-                        help="Seconds to wait between queries to respect rate limits (default: 1.0)")
-    parser.add_argument("--country-bias", default=None,
-                        help="Optional ISO country code to bias results (e.g., 'DE', 'AT')")
-    parser.add_argument("--city-bias", default=None,
-                        help="Optional city name to bias results using viewbox around that city (requires OSM lookup)")
-    parser.add_argument("--language", default="en", help="Preferred language for results (default: en)")
-    args = parser.parse_args()
+def build_engine(args):
+    """Geocoding engine and cache (None with --no-cache/--offline) for the command line options."""
+    cache = None
+    if not args.no_cache and not args.offline:
+        cache = GeocodeCache(args.cache, ttl_days=args.cache_ttl_days)
+    local = None
+    if not args.no_gazetteer and not args.reverse:
+        try:
+            local = load_gazetteer(args.gazetteer, args.gazetteer_min_score)
+        except Exception as e:
+            sys.stderr.write(
+                f"Warning: could not load gazetteer {args.gazetteer} ({e}). Continuing without it.\n"
+            )
+    if args.offline:
+        if local is None:
+            sys.stderr.write(
+                f"--offline needs a gazetteer; build one with utils/gazetteer.py (looked for {args.gazetteer})\n"
+            )
+            sys.exit(1)
+        return GeocodingEngine(local, workers=1, cache=None), cache
+    rate = (
+        args.rate
+        if args.rate is not None
+        else (1.0 / args.pause if args.pause > 0 else 0)
+    )
+    try:
+        engine = make_engine(
+            args.backend,
+            workers=args.workers,
+            cache=cache,
+            retries=args.retries,
+            local=local,
+            url=args.backend_url,
+            api_key=args.api_key,
+            user_agent=args.user_agent,
+            rate=rate,
+            burst=args.burst,
+        )
+    except ValueError as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    return engine, cache
+
+
+def load_known(journal: CheckpointJournal, args) -> dict:
+    """Results from the checkpoint journal that --resume/--retry-errors may reuse."""
+    known = {}
+    if args.resume or args.retry_errors:
+        try:
+            known = journal.load()
+        except CheckpointMismatch as e:
+            sys.stderr.write(f"{e}\n")
+            sys.exit(1)
+    if args.retry_errors:
+        return {k: r for k, r in known.items() if r.get("geo_status") == "ok"}
+    return {
+        k: r
+        for k, r in known.items()
+        if not str(r.get("geo_status", "error")).startswith("error")
+    }
+
 
-    # Read Excel
+def print_status_counts(status: pd.Series, unit: str = "rows") -> None:
+    if status.eq("ok").any():
+        print(
+            f"Geocoded successfully: {int(status.eq('ok').sum())} / {len(status)} {unit}."
+        )
+    if status.eq("not_found").any():
+        print(f"Not found: {int(status.eq('not_found').sum())} {unit}.")
+    if status.str.startswith("error").any():
+        print(f"Errors: {int(status.str.startswith('error').sum())} {unit}.")
+
+
+def input_header(args) -> Tuple[List, Any]:
+    """Column names of the input sheet and the sheet to read; exits if it cannot be read or is empty."""
+    sheet = args.sheet if args.sheet is not None else 0
     try:
-        df = pd.read_excel(args.input, sheet_name=args.sheet)
+        header = export_columns(args.input, sheet_name=sheet)
     except Exception as e:
-        sys.stderr.write(f"Failed to read Excel: {e}\n")
+        sys.stderr.write(f"Failed to read input: {e}\n")
         sys.exit(1)
 
-    if df.empty:
+    if not header:
         sys.stderr.write("Input sheet is empty.\n")
         sys.exit(1)
+    return header, sheet
+
+
+def reverse_main(args) -> None:
+    """--reverse: fill in addresses for rows with coordinates, one lookup per grid cell."""
+    if args.previous or args.offline:
+        sys.stderr.write("--reverse cannot be combined with --previous or --offline\n")
+        sys.exit(1)
+    header, sheet = input_header(args)
+    if args.grid_meters <= 0:
+        sys.stderr.write("--grid-meters must be positive\n")
+        sys.exit(1)
+    lat_col, lon_col = detect_coordinate_columns(
+        header, args.lat_column, args.lon_column
+    )
+    if lat_col is None or lon_col is None:
+        sys.stderr.write(
+            "Could not find coordinate columns. Provide --lat-column and --lon-column.\n"
+        )
+        sys.stderr.write(f"Available columns: {header}\n")
+        sys.exit(1)
+    fill_col = (
+        args.fill_column
+        if args.fill_column is not None
+        else (ADDRESS_COLUMN if ADDRESS_COLUMN in header else "")
+    )
+    try:
+        with current().stage("read_input"):
+            df = read_project_export(
+                args.input, sheet_name=sheet, columns=[lat_col, lon_col, fill_col]
+            )
+    except Exception as e:
+        sys.stderr.write(f"Failed to read input: {e}\n")
+        sys.exit(1)
+    current().gauge("rows", len(df))
+
+    engine, cache = build_engine(args)
+    params = {"language": args.language, "zoom": args.zoom}
+    output_path = args.output or output_path_for(args.input)
+    # The grid is part of the header, so a journal is never resumed with other cells
+    journal = CheckpointJournal(
+        args.checkpoint or output_path + ".checkpoint.jsonl",
+        {**params, "grid_m": args.grid_meters},
+    )
+    known = load_known(journal, args)
+    if args.retry_errors and cache is not None:
+        _, queries = cell_queries(
+            parse_decimal_comma(df[lat_col]),
+            parse_decimal_comma(df[lon_col]),
+            args.grid_meters,
+        )
+        for query in set(queries) - set(known):
+            cache.delete(query, params, engine.backend.cache_source())
+    if known:
+        sys.stderr.write(
+            f"Reusing {len(known)} resolved grid cells from earlier results\n"
+        )
+
+    def progress(done, total):
+        sys.stderr.write(f"\rReverse geocoded {done}/{total} grid cells")
+        sys.stderr.flush()
+
+    with journal.open(resume=args.resume or args.retry_errors):
+        results, summary = reverse_geocode_points(
+            df[lat_col],
+            df[lon_col],
+            engine,
+            params,
+            args.grid_meters,
+            progress,
+            known=known,
+            on_result=journal.append,
+        )
+    sys.stderr.write("\n")
+
+    extra = results
+    if fill_col:
+        addresses = fill_addresses(
+            df[fill_col] if fill_col in df.columns else None,
+            results,
+            args.overwrite_addresses,
+        )
+        extra = results.assign(**{fill_col: addresses})
+    try:
+        with current().stage("write_output", rows=len(extra)):
+            write_chunks(
+                output_path,
+                (
+                    with_columns(chunk, extra)
+                    for chunk in iter_project_export(args.input, sheet_name=sheet)
+                ),
+            )
+    except Exception as e:
+        sys.stderr.write(f"Failed to write output: {e}\n")
+        sys.exit(1)
+
+    print(f"Done. Wrote {output_path} (checkpoint: {journal.path})")
+    print(summary)
+    print_status_counts(results["rev_status"])
+    if results["rev_status"].eq("no_coordinates").any():
+        print(
+            f"Without coordinates: {int(results['rev_status'].eq('no_coordinates').sum())} rows."
+        )
+    if fill_col:
+        print(
+            f"Addresses in {fill_col!r}: {int(extra[fill_col].notna().sum())} / {len(extra)} rows."
+        )
+    if cache is not None:
+        print(cache.summary())
+        cache.close()
 
-    # Determine how to build the address string
-    address_series = None
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Geocode addresses in an Excel file (Nominatim / OSM or a compatible provider)."
+    )
+    parser.add_argument(
+        "input",
+        help="Input Excel file path (.xlsx) or ;-separated project export (.csv)",
+    )
+    parser.add_argument(
+        "--sheet", default=None, help="Worksheet name to read (default: first sheet)"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Output file path; .xlsx, .csv or .parquet (default: input file name with _geocoded.xlsx)",
+    )
+    parser.add_argument(
+        "--previous",
+        default=None,
+        help="Previous _geocoded.xlsx of the same export: only new or changed projects (by Projekt UUID, "
+        "Zeilenprüfsumme and Geändert am) are geocoded, all others keep their coordinates",
+    )
+    parser.add_argument(
+        "--address-column",
+        dest="address_column",
+        default=None,
+        help="Name of a single address column (case-insensitive)",
+    )
+    parser.add_argument(
+        "--address-columns",
+        dest="address_columns",
+        nargs="+",
+        default=None,
+        help="Multiple columns to concatenate into an address (order matters)",
+    )
+    parser.add_argument(
+        "--user-agent",
+        default="excel-geocoder-script",
+        help="User-Agent for Nominatim (please set to your app or email/URL)",
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=1.0,
+        help="Seconds to wait between queries to respect rate limits (default: 1.0)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        default=None,
+        help="Geocoding backend (default: $GEOCODER_BACKEND or nominatim)",
+    )
+    parser.add_argument(
+        "--backend-url",
+        default=None,
+        help="Base URL of the backend, e.g. our own Nominatim instance (default: $GEOCODER_URL or the public service)",
+    )
+    parser.add_argument(
+        "--api-key",
+        default=None,
+        help="API key for commercial backends (default: $GEOCODER_API_KEY)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Maximum requests per second; overrides --pause (capped at 1 for the public Nominatim)",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="Requests that may be sent back-to-back before --rate applies (default: 1)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Concurrent geocoding requests (default: 4)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries on HTTP 429/5xx and connection errors (default: 3)",
+    )
+    parser.add_argument(
+        "--country-bias",
+        default=None,
+        help="Optional ISO country code to bias results (e.g., 'DE', 'AT')",
+    )
+    parser.add_argument(
+        "--city-bias",
+        default=None,
+        help="Optional city name to bias results using viewbox around that city (requires OSM lookup)",
+    )
+    parser.add_argument(
+        "--language", default="en", help="Preferred language for results (default: en)"
+    )
+    parser.add_argument(
+        "--cache",
+        default=DEFAULT_CACHE_PATH,
+        help=f"SQLite geocode cache shared with the Streamlit pages (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help=f"Re-query cached addresses older than this many days (default: {DEFAULT_TTL_DAYS})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query the geocoder, bypassing the cache",
+    )
+    parser.add_argument(
+        "--gazetteer",
+        default=DEFAULT_GAZETTEER_PATH,
+        help=f"Offline gazetteer checked before the remote geocoder, if the file exists (default: {DEFAULT_GAZETTEER_PATH}; "
+        "build it with utils/gazetteer.py)",
+    )
+    parser.add_argument(
+        "--gazetteer-min-score",
+        type=float,
+        default=DEFAULT_MIN_SCORE,
+        help=f"Gazetteer matches below this score go to the remote geocoder (default: {DEFAULT_MIN_SCORE})",
+    )
+    parser.add_argument(
+        "--no-gazetteer", action="store_true", help="Do not use the offline gazetteer"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use only the offline gazetteer; addresses without a confident match are reported as not_found",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Checkpoint journal written while geocoding (default: <output>.checkpoint.jsonl)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: skip addresses already resolved in the checkpoint journal",
+    )
+    parser.add_argument(
+        "--retry-errors",
+        action="store_true",
+        help="Only re-run rows whose geo_status is not_found or error, taking all other results "
+        "from the input (if it is a geocoded file), the existing output file and the checkpoint",
+    )
+    parser.add_argument(
+        "--reverse",
+        action="store_true",
+        help="Reverse geocode: look up addresses for the coordinate columns instead of coordinates for addresses",
+    )
+    parser.add_argument(
+        "--lat-column",
+        default=None,
+        help="Latitude column for --reverse (default: Breite, latitude or lat)",
+    )
+    parser.add_argument(
+        "--lon-column",
+        default=None,
+        help="Longitude column for --reverse (default: Laenge, longitude or lon)",
+    )
+    parser.add_argument(
+        "--grid-meters",
+        type=float,
+        default=DEFAULT_GRID_M,
+        help=f"--reverse snaps points to cells of this size and looks up each cell once (default: {DEFAULT_GRID_M:g})",
+    )
+    parser.add_argument(
+        "--zoom",
+        type=int,
+        default=DEFAULT_ZOOM,
+        help=f"Nominatim detail level of reverse results, 18 = building (default: {DEFAULT_ZOOM})",
+    )
+    parser.add_argument(
+        "--fill-column",
+        default=None,
+        help=f"Column whose empty cells --reverse fills with the found address (default: {ADDRESS_COLUMN!r} "
+        "if present; an empty string writes only the rev_* columns)",
+    )
+    parser.add_argument(
+        "--overwrite-addresses",
+        action="store_true",
+        help="With --reverse, replace every address in --fill-column that a lookup found, not only empty ones",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        default=None,
+        help="Write timings, request latencies, rate-limit waits, cache hits and peak memory as JSON here",
+    )
+    args = parser.parse_args()
+
+    run_metrics = Metrics("reverse" if args.reverse else "geocode")
+    try:
+        with recording(run_metrics):
+            (reverse_main if args.reverse else geocode_main)(args)
+    finally:
+        if args.metrics_out:
+            run_metrics.write(args.metrics_out)
+            sys.stderr.write(
+                f"{run_metrics.summary()}\nWrote metrics to {args.metrics_out}\n"
+            )
+
+
+def geocode_main(args) -> None:
+    header, sheet = input_header(args)
+
+    # Determine which columns make up the address string
     used_columns = None
 
     if args.address_columns:
-        missing = [c for c in args.address_columns if c not in df.columns]
+        missing = [c for c in args.address_columns if c not in header]
         if missing:
             sys.stderr.write(f"Missing address columns: {missing}\n")
             sys.exit(1)
         used_columns = args.address_columns
-        address_series = df.apply(lambda r: build_address_from_columns(r, used_columns), axis=1)
     else:
-        detected = detect_address_column(df, args.address_column)
+        detected = detect_address_column(
+            pd.DataFrame(columns=header), args.address_column
+        )
         if not detected:
-            sys.stderr.write("Could not find an address column. Provide --address-column or --address-columns.\n")
-            sys.stderr.write(f"Available columns: {list(df.columns)}\n")
+            sys.stderr.write(
+                "Could not find an address column. Provide --address-column or --address-columns.\n"
+            )
+            sys.stderr.write(f"Available columns: {header}\n")
             sys.exit(1)
         used_columns = [detected]
-        address_series = df[detected]
 
-    # Prepare geocoder
-    geolocator = Nominatim(user_agent=args.user_agent, timeout=10)
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=args.pause, swallow_exceptions=False)
+    # Read Excel / CSV export: every column when diffing against --previous, otherwise
+    # only the address and earlier result columns; the output streams the remaining
+    # columns from the input
+    try:
+        columns = (
+            None
+            if args.previous
+            else used_columns
+            + [c for c in RESULT_INPUT_COLUMNS if c not in used_columns]
+        )
+        with current().stage("read_input"):
+            df = read_project_export(args.input, sheet_name=sheet, columns=columns)
+    except Exception as e:
+        sys.stderr.write(f"Failed to read input: {e}\n")
+        sys.exit(1)
+    current().gauge("rows", len(df))
+
+    if df.empty:
+        sys.stderr.write("Input sheet is empty.\n")
+        sys.exit(1)
+
+    if args.address_columns:
+        address_series = build_address_series(df, used_columns)
+    else:
+        address_series = df[used_columns[0]]
+
+    engine, cache = build_engine(args)
 
     # Optional: bias by country or city
     # For country bias, we'll pass 'country_codes' parameter.
@@ -103,86 +538,128 @@ def main():
 
     if args.city_bias:
         try:
-            city_loc = geolocator.geocode(args.city_bias, language=args.language)
+            city_loc = engine.geocode(args.city_bias, language=args.language)
             if city_loc and hasattr(city_loc, "raw") and "boundingbox" in city_loc.raw:
-                bbox = city_loc.raw["boundingbox"]  # [south, north, west, east] as strings
+                bbox = city_loc.raw[
+                    "boundingbox"
+                ]  # [south, north, west, east] as strings
                 south, north, west, east = map(float, bbox)
                 viewbox = f"{west},{south},{east},{north}"  # 'west,south,east,north'
                 bounded = 1  # hint to prefer results within the viewbox
         except Exception as e:
-            sys.stderr.write(f"Warning: could not compute city bias viewbox ({e}). Continuing without it.\n")
-
-    # Geocode rows
-    lats = []
-    lons = []
-    precisions = []
-    sources = []
-    display_names = []
-    statuses = []
-
-    total = len(address_series)
-    for idx, addr in enumerate(address_series):
-        if pd.isna(addr) or not str(addr).strip():
-            lats.append(None); lons.append(None); precisions.append(None); sources.append(None); display_names.append(None); statuses.append("no_address")
-            continue
-        query = str(addr).strip()
+            sys.stderr.write(
+                f"Warning: could not compute city bias viewbox ({e}). Continuing without it.\n"
+            )
+
+    # Geocode each distinct address once
+    params = {"language": args.language}
+    if args.country_bias:
+        params["country_codes"] = args.country_bias
+    if viewbox:
+        params["viewbox"] = viewbox
+        params["bounded"] = bounded
+
+    output_path = args.output or output_path_for(args.input)
+    journal = CheckpointJournal(
+        args.checkpoint or output_path + ".checkpoint.jsonl", params
+    )
+    known = load_known(journal, args)
+    if args.retry_errors:
+        for previous in load_previous_results(df, output_path, args.input):
+            prev_keys = normalize_addresses(
+                previous["geo_query"]
+                if "geo_query" in previous.columns
+                else address_series
+            )
+            known.update(known_results(previous, prev_keys))
+        if cache is not None:
+            # Negative answers are cached too; drop them so the retry really asks the
+            # backend again
+            for key in set(normalize_addresses(address_series).dropna()) - set(known):
+                cache.delete(key, params, engine.backend.cache_source())
+    if known:
+        sys.stderr.write(
+            f"Reusing {len(known)} resolved addresses from earlier results\n"
+        )
+
+    # Incremental mode: carry unchanged projects over from the previous result
+    carried = None
+    to_geocode = pd.Series(True, index=df.index)
+    if args.previous:
         try:
-            params = {"language": args.language}
-            if args.country_bias:
-                params["country_codes"] = args.country_bias
-            if viewbox:
-                params["viewbox"] = viewbox
-                params["bounded"] = bounded
-
-            loc = geocode(query, **params)
-            if loc is None:
-                lats.append(None); lons.append(None); precisions.append(None); sources.append("nominatim"); display_names.append(None); statuses.append("not_found")
-            else:
-                lats.append(loc.latitude); lons.append(loc.longitude)
-                # Extract a rough precision from OSM "type" and "class"
-                raw = getattr(loc, "raw", {})
-                precisions.append(raw.get("type") or raw.get("class"))
-                sources.append("nominatim")
-                display_names.append(loc.address)
-                statuses.append("ok")
+            previous = read_project_export(args.previous)
+            diff = diff_exports(df, previous)
         except Exception as e:
-            lats.append(None); lons.append(None); precisions.append(None); sources.append("nominatim"); display_names.append(None); statuses.append(f"error: {e}")
+            sys.stderr.write(
+                f"Failed to compare with previous result {args.previous}: {e}\n"
+            )
+            sys.exit(1)
+        carried = align_previous(df, previous, RESULT_COLUMNS)
+        # Unchanged projects that have no usable earlier answer are geocoded again as
+        # well
+        to_geocode = (
+            diff.status.ne("unchanged")
+            | carried["geo_status"].isna()
+            | carried["geo_status"]
+            .astype("string")
+            .str.startswith("error")
+            .fillna(False)
+        )
+        print(diff.summary())
+        if len(diff.deleted):
+            key = id_column(previous)
+            names = diff.deleted.get("Projektbezeichnung", diff.deleted[key])
+            for project_id, name in list(zip(diff.deleted[key], names))[:20]:
+                print(f"  deleted: {project_id} {name}")
+            if len(diff.deleted) > 20:
+                print(f"  ... and {len(diff.deleted) - 20} more")
 
-        # Optional progress to stderr
-        sys.stderr.write(f"\rGeocoded {idx+1}/{total}")
+    def progress(done, total):
+        sys.stderr.write(f"\rGeocoded {done}/{total} unique addresses")
         sys.stderr.flush()
-        # RateLimiter already enforces min delay; no manual sleep needed
 
+    # The backend's token bucket enforces the request rate across all workers;
+    # every answer is journaled immediately so an interrupted run can --resume
+    with journal.open(resume=args.resume or args.retry_errors):
+        results, dedupe_info = geocode_addresses(
+            address_series[to_geocode],
+            engine,
+            params,
+            progress,
+            known=known,
+            on_result=journal.append,
+        )
     sys.stderr.write("\n")
+    if carried is not None:
+        # Carried-over and fresh rows are combined in one step and typed like fresh
+        # results
+        results = result_dtypes(
+            pd.concat(
+                [carried.loc[~to_geocode, RESULT_COLUMNS], results[RESULT_COLUMNS]]
+            ).loc[df.index]
+        )
 
-    # Append results
-    out = df.copy()
-    out["geo_status"] = statuses
-    out["latitude"] = lats
-    out["longitude"] = lons
-    out["geo_precision_hint"] = precisions
-    out["geo_display_name"] = display_names
-    out["geo_source"] = sources
-    out["geo_query"] = address_series
-
-    # Save
-    output_path = args.output or args.input.replace(".xlsx", "_geocoded.xlsx")
+    # Append results chunk by chunk while writing
+    extra = results.assign(geo_query=address_series)
+    chunks = (
+        iter_frame(df)
+        if args.previous
+        else iter_project_export(args.input, sheet_name=sheet)
+    )
     try:
-        out.to_excel(output_path, index=False)
+        with current().stage("write_output", rows=len(extra)):
+            write_chunks(output_path, (with_columns(chunk, extra) for chunk in chunks))
     except Exception as e:
-        sys.stderr.write(f"Failed to write output Excel: {e}\n")
+        sys.stderr.write(f"Failed to write output: {e}\n")
         sys.exit(1)
 
-    print(f"Done. Wrote {output_path}")
-    if out["geo_status"].eq("ok").any():
-        ok_count = int(out["geo_status"].eq("ok").sum())
-        print(f"Geocoded successfully: {ok_count} / {len(out)} rows.")
-    if out["geo_status"].eq("not_found").any():
-        nf_count = int(out["geo_status"].eq("not_found").sum())
-        print(f"Not found: {nf_count} rows.")
-    if out["geo_status"].str.startswith("error").any():
-        err_count = int(out["geo_status"].str.startswith("error").sum())
-        print(f"Errors: {err_count} rows.")
+    print(f"Done. Wrote {output_path} (checkpoint: {journal.path})")
+    print(dedupe_info)
+    print_status_counts(extra["geo_status"])
+    if cache is not None:
+        print(cache.summary())
+        cache.close()
+
 
 if __name__ == "__main__":
     main()
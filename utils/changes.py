@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Change feed between two project export snapshots: new, deleted, moved, re-teamed and otherwise changed projects.
+
+Rows are matched like :func:`utils.snapshots.diff_exports` does for the
+incremental geocoding (the same :func:`~utils.snapshots.row_keys`,
+:func:`~utils.snapshots.version_columns` and :func:`~utils.snapshots.match_rows`),
+but on a compact frame: each export is read in chunks and only the project id,
+row key, content hash, label, team and coordinates stay in memory. On top of
+new/changed/deleted the change feed tells moves (vectorized haversine) and
+team changes apart, so 100k-row exports compare in about a second plus
+reading time.
+
+The change set has one row per changed project, positioned where it is now
+(where it was, for deleted ones). Saved with ``--overlay`` it becomes the
+``changes`` dataset that the Project Map shows on top of its points.
+
+    python utils/changes.py "data/Alle Projekte 15_04_2025 14-34-31.csv" "data/Alle Projekte 13_08_2025.csv"
+    python utils/changes.py old.xlsx new.xlsx --move-km 0.5 --output changes.xlsx --overlay
+"""
+import argparse
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.datastore import DATA_DIR
+from utils.excelio import iter_frame, table_format, write_chunks
+from utils.snapshots import (
+    ID_COLUMN,
+    ID_FALLBACKS,
+    LAT_COLUMN,
+    LON_COLUMN,
+    content_hashes,
+    export_columns,
+    iter_project_export,
+    match_rows,
+    row_keys,
+    version_columns,
+)
+from utils.spatial import haversine_km
+
+# Projects whose coordinates moved further than this count as moved
+DEFAULT_MOVE_KM = 0.1
+# Where --overlay and the Snapshots page publish the change set (the "changes" dataset)
+CHANGES_PATH = os.path.join(DATA_DIR, "project_changes.parquet")
+LABEL_COLUMNS = ["Projektbezeichnung", "Name", "Titel"]
+TEAM_COLUMN = "Team"
+# In order of precedence: a new project that also has a team is "new", a moved one with
+# a new team "moved"
+CHANGE_KINDS = ["new", "deleted", "moved", "team", "changed"]
+CHANGE_COLUMNS = [
+    "id",
+    "label",
+    "change",
+    "team",
+    "team_previous",
+    "lat",
+    "lon",
+    "lat_previous",
+    "lon_previous",
+    "moved_km",
+]
+
+
+def read_snapshot(path: str, sheet_name=0) -> pd.DataFrame:
+    """Compact form of the export at ``path``: ``id``, ``key``, ``content``, ``label``, ``team``, ``lat``, ``lon``."""
+    header = export_columns(path, sheet_name)
+    key = next((c for c in [ID_COLUMN] + ID_FALLBACKS if c in header), None)
+    if key is None:
+        raise KeyError(
+            f"{os.path.basename(path)} has no project id column ({[ID_COLUMN] + ID_FALLBACKS})"
+        )
+    label = next((c for c in LABEL_COLUMNS if c in header), None)
+    coordinates = (
+        (LAT_COLUMN, LON_COLUMN)
+        if LAT_COLUMN in header and LON_COLUMN in header
+        else None
+    )
+    content = version_columns(pd.DataFrame(columns=header))
+    # Without the CRM's checksum every column goes into the content hash, so all of them
+    # have to be read
+    columns = (
+        [key, label, TEAM_COLUMN, *content, *(coordinates or ())]
+        if len(content) < len(header)
+        else None
+    )
+
+    parts = []
+    for chunk in iter_project_export(path, sheet_name, columns=columns):
+        parts.append(
+            pd.DataFrame(
+                {
+                    "id": chunk[key].astype("string"),
+                    "content": content_hashes(chunk, content),
+                    "label": chunk[label].astype("string") if label else pd.NA,
+                    "team": (
+                        chunk[TEAM_COLUMN].astype("string")
+                        if TEAM_COLUMN in chunk.columns
+                        else pd.NA
+                    ),
+                    "lat": chunk[coordinates[0]] if coordinates else np.nan,
+                    "lon": chunk[coordinates[1]] if coordinates else np.nan,
+                }
+            )
+        )
+    df = pd.concat(parts, ignore_index=True)
+    df.insert(1, "key", row_keys(df["id"]))
+    df.attrs["id_column"] = key
+    return df
+
+
+class ChangeSet(NamedTuple):
+    # One row per changed project, CHANGE_COLUMNS
+    changes: pd.DataFrame
+    unchanged: int
+
+    def counts(self) -> dict:
+        counts = self.changes["change"].value_counts()
+        return {kind: int(counts.get(kind, 0)) for kind in CHANGE_KINDS} | {
+            "unchanged": self.unchanged
+        }
+
+    def summary(self) -> str:
+        c = self.counts()
+        return (
+            f"New: {c['new']}, deleted: {c['deleted']}, moved: {c['moved']}, team changed: {c['team']}, "
+            f"otherwise changed: {c['changed']}, unchanged: {c['unchanged']}"
+        )
+
+
+def compare_snapshots(
+    previous: pd.DataFrame, current: pd.DataFrame, move_km: float = DEFAULT_MOVE_KM
+) -> ChangeSet:
+    """Changes from ``previous`` to ``current`` (both from :func:`read_snapshot`)."""
+    if previous.attrs.get("id_column") != current.attrs.get("id_column"):
+        raise ValueError(
+            f"The snapshots identify projects differently ({previous.attrs.get('id_column')!r} and "
+            f"{current.attrs.get('id_column')!r}); compare two exports of the same kind"
+        )
+    pos = match_rows(previous["key"].to_numpy(), current["key"].to_numpy())
+    found = pos >= 0
+    matched = np.where(found, pos, 0)
+
+    prev_lat = np.where(found, previous["lat"].to_numpy("float64")[matched], np.nan)
+    prev_lon = np.where(found, previous["lon"].to_numpy("float64")[matched], np.nan)
+    moved_km = haversine_km(prev_lat, prev_lon, current["lat"], current["lon"])
+    prev_team = (
+        previous["team"].astype("string").to_numpy(dtype=object, na_value="")[matched]
+    )
+    team = current["team"].astype("string").to_numpy(dtype=object, na_value="")
+    content_changed = (
+        current["content"].to_numpy() != previous["content"].to_numpy()[matched]
+    )
+    kind = np.select(
+        [~found, moved_km > move_km, team != prev_team, content_changed],
+        ["new", "moved", "team", "changed"],
+        "",
+    )
+
+    rows = np.flatnonzero(kind != "")
+    taken = np.flatnonzero(found)
+    changed = pd.DataFrame(
+        {
+            "id": current["id"].to_numpy()[rows],
+            "label": current["label"].to_numpy()[rows],
+            "change": kind[rows],
+            "team": current["team"].to_numpy()[rows],
+            "team_previous": np.where(found[rows], prev_team[rows], None),
+            "lat": current["lat"].to_numpy("float64")[rows],
+            "lon": current["lon"].to_numpy("float64")[rows],
+            "lat_previous": prev_lat[rows],
+            "lon_previous": prev_lon[rows],
+            "moved_km": np.round(moved_km[rows], 3),
+        }
+    )
+    gone = np.ones(len(previous), dtype=bool)
+    gone[pos[taken]] = False
+    deleted = previous[gone]
+    deleted = pd.DataFrame(
+        {
+            "id": deleted["id"].to_numpy(),
+            "label": deleted["label"].to_numpy(),
+            "change": "deleted",
+            "team": None,
+            "team_previous": deleted["team"].to_numpy(),
+            "lat": deleted["lat"].to_numpy("float64"),
+            "lon": deleted["lon"].to_numpy("float64"),
+            "lat_previous": deleted["lat"].to_numpy("float64"),
+            "lon_previous": deleted["lon"].to_numpy("float64"),
+            "moved_km": np.nan,
+        }
+    )
+    changes = pd.concat([changed, deleted], ignore_index=True)
+    changes = changes.astype(
+        {
+            "id": "string",
+            "label": "string",
+            "team": "string",
+            "team_previous": "string",
+            "change": pd.CategoricalDtype(CHANGE_KINDS),
+        }
+    )
+    return ChangeSet(changes[CHANGE_COLUMNS], int((found & (kind == "")).sum()))
+
+
+def compare_files(
+    previous_path: str,
+    current_path: str,
+    move_km: float = DEFAULT_MOVE_KM,
+    sheet_name=0,
+) -> ChangeSet:
+    return compare_snapshots(
+        read_snapshot(previous_path, sheet_name),
+        read_snapshot(current_path, sheet_name),
+        move_km,
+    )
+
+
+def overlay_frame(changes: pd.DataFrame) -> pd.DataFrame:
+    """The located rows of a change set, with one coordinate pair so map libraries pick it up as points."""
+    return changes.drop(columns=["lat_previous", "lon_previous"]).dropna(
+        subset=["lat", "lon"]
+    )
+
+
+def write_changes(changes: pd.DataFrame, path: str = CHANGES_PATH) -> int:
+    """Write a change set (format by extension); to :data:`CHANGES_PATH` it becomes the map overlay."""
+    return write_chunks(path, iter_frame(changes), sheet_name="Changes")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List what changed between two project export snapshots."
+    )
+    parser.add_argument("previous", help="Older export (.csv or .xlsx)")
+    parser.add_argument("current", help="Newer export (.csv or .xlsx)")
+    parser.add_argument(
+        "--sheet",
+        default=None,
+        help="Worksheet name of Excel exports (default: first sheet)",
+    )
+    parser.add_argument(
+        "--move-km",
+        type=float,
+        default=DEFAULT_MOVE_KM,
+        help=f"Distance beyond which a project counts as moved (default: {DEFAULT_MOVE_KM})",
+    )
+    parser.add_argument(
+        "--output", default=None, help="Write the change set to .csv, .xlsx or .parquet"
+    )
+    parser.add_argument(
+        "--overlay",
+        action="store_true",
+        help="Also publish the change set as the Project Map overlay",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.output:
+            table_format(args.output)
+        result = compare_files(
+            args.previous,
+            args.current,
+            args.move_km,
+            args.sheet if args.sheet is not None else 0,
+        )
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+
+    print(result.summary())
+    if args.output:
+        write_changes(result.changes, args.output)
+        print(f"Wrote {len(result.changes)} changes to {args.output}")
+    if args.overlay:
+        write_changes(result.changes)
+        print(f"Published the change set as the Project Map overlay ({CHANGES_PATH})")
+    if result.changes.empty:
+        print("No changes.")
+    elif not args.output and not args.overlay:
+        with pd.option_context("display.max_rows", 50, "display.width", 200):
+            print(
+                result.changes.drop(columns=["lat_previous", "lon_previous"]).to_string(
+                    index=False
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Append-only JSONL journal of geocoding results so long batches can be resumed."""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+FSYNC_EVERY = 50
+
+
+class CheckpointMismatch(Exception):
+    pass
+
+
+class CheckpointJournal:
+    """One JSON object per line: a header with the query parameters, then
+    ``{"key": <normalized address>, "result": {...}}`` per geocoded address.
+
+    A torn last line (process killed mid-write) is ignored on load.
+    """
+
+    def __init__(self, path: str, params: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.params = {k: v for k, v in (params or {}).items() if v not in (None, "")}
+        self._fh = None
+        self._pending = 0
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        entries: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "params" in entry:
+                    if entry["params"] != self.params:
+                        raise CheckpointMismatch(
+                            f"Checkpoint {self.path} was written with different query parameters "
+                            f"({entry['params']} != {self.params})"
+                        )
+                    continue
+                entries[entry["key"]] = entry["result"]
+        return entries
+
+    def open(self, resume: bool = False) -> "CheckpointJournal":
+        append = resume and os.path.exists(self.path)
+        self._fh = open(self.path, "a" if append else "w", encoding="utf-8")
+        if not append:
+            self._write({"params": self.params})
+        return self
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        self._fh.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+
+    def append(self, key: str, result: Dict[str, Any]) -> None:
+        # NaN is not valid JSON; unresolved fields are simply left out
+        self._write(
+            {
+                "key": key,
+                "result": {k: v for k, v in result.items() if v is not None and v == v},
+            }
+        )
+        self._pending += 1
+        if self._pending >= FSYNC_EVERY:
+            os.fsync(self._fh.fileno())
+            self._pending = 0
+
+    def close(self) -> None:
+        if self._fh is not None:
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "CheckpointJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
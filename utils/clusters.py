@@ -0,0 +1,253 @@
+"""Multi-zoom point aggregation for the map pages.
+
+Points are binned on a Web Mercator grid whose cells are ``radius_px`` screen
+pixels wide at each zoom level. The finest level is binned from the points
+directly; every coarser level merges four child cells into their parent, so
+building all levels costs about as much as one groupby. A page then asks for
+the clusters of one zoom level inside its viewport and sends only those to the
+browser instead of every row.
+"""
+
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import datastore
+
+TILE_SIZE = 256
+DEFAULT_RADIUS_PX = 60
+DEFAULT_MAX_ZOOM = 16
+MAX_LATITUDE = 85.05112878
+# Bounds as (south, west, north, east)
+WORLD = (-90.0, -180.0, 90.0, 180.0)
+
+
+def mercator_xy(lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+    """Normalized Web Mercator coordinates in [0, 1)."""
+    lat = np.clip(np.asarray(lat, dtype="float64"), -MAX_LATITUDE, MAX_LATITUDE)
+    lon = np.asarray(lon, dtype="float64")
+    x = (lon + 180.0) / 360.0
+    sin = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+def _breakdown(counts: pd.DataFrame, top: int = 3) -> pd.Series:
+    """``"a: 5, b: 2"`` per row for the ``top`` largest columns."""
+    values = counts.to_numpy()
+    order = np.argsort(-values, axis=1, kind="stable")[:, :top]
+    names = counts.columns.to_numpy()
+    parts = []
+    for row, idx in zip(values, order):
+        parts.append(", ".join(f"{names[i]}: {row[i]}" for i in idx if row[i] > 0))
+    return pd.Series(parts, index=counts.index)
+
+
+class ClusterPyramid:
+    """Grid clusters of ``df``'s points for zoom levels ``0..max_zoom``.
+
+    ``categories`` are columns (e.g. ``Team``, ``geo_status``) whose value
+    counts are kept per cluster.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        lat_col: str,
+        lon_col: str,
+        categories: Sequence[str] = (),
+        radius_px: int = DEFAULT_RADIUS_PX,
+        max_zoom: int = DEFAULT_MAX_ZOOM,
+    ):
+        lat = df[lat_col].to_numpy(dtype="float64", na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        self.points = df[valid].reset_index(drop=True)
+        self.lat_col, self.lon_col = lat_col, lon_col
+        self.categories = [c for c in categories if c in df.columns]
+        self.radius_px = radius_px
+        self.max_zoom = max_zoom
+        self.levels: Dict[int, pd.DataFrame] = {}
+        # category -> {count column in the level frames: category value}
+        self.count_columns: Dict[str, Dict[str, str]] = {}
+
+        lat, lon = lat[valid], lon[valid]
+        x, y = mercator_xy(lat, lon)
+        # 2**z * k cells per axis at zoom z, so parent(cell) = cell // 2 is exact at
+        # every level
+        self.cells_per_tile = max(1, TILE_SIZE // radius_px)
+        cells = 2**max_zoom * self.cells_per_tile
+        level = pd.DataFrame(
+            {
+                "cx": np.floor(x * cells).astype("int64"),
+                "cy": np.floor(y * cells).astype("int64"),
+                "sum_lat": lat,
+                "sum_lon": lon,
+                "count": np.ones(len(lat), dtype="int64"),
+                "point": np.arange(len(lat)),
+            }
+        )
+        # Per-category counts are one-hot columns, so every level is a single groupby
+        for i, col in enumerate(self.categories):
+            codes, values = pd.factorize(
+                self.points[col].astype("string").fillna("(leer)"), sort=True
+            )
+            names = [f"_c{i}_{j}" for j in range(len(values))]
+            self.count_columns[col] = dict(zip(names, values))
+            onehot = np.zeros((len(codes), len(values)), dtype="int32")
+            onehot[np.arange(len(codes)), codes] = 1
+            level = pd.concat([level, pd.DataFrame(onehot, columns=names)], axis=1)
+
+        sums = {c: "sum" for c in level.columns if c not in ("cx", "cy", "point")}
+        for z in range(max_zoom, -1, -1):
+            level = (
+                level.groupby(["cx", "cy"], sort=True)
+                .agg({**sums, "point": "min"})
+                .reset_index()
+            )
+            self.levels[z] = level
+            level = level.assign(cx=level["cx"] // 2, cy=level["cy"] // 2)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def clusters(
+        self, zoom: float, bounds: Tuple[float, float, float, float] = WORLD
+    ) -> pd.DataFrame:
+        """Clusters of one zoom level whose centre lies inside ``bounds`` (south, west, north, east).
+
+        Columns: ``lat``, ``lon``, ``count``, ``point`` (a row of :attr:`points`,
+        meaningful where ``count == 1``) and per category the dominant value plus
+        a ``<category>_breakdown`` text.
+        """
+        z = int(min(max(round(zoom), 0), self.max_zoom))
+        level = self.levels[z]
+        lat = level["sum_lat"] / level["count"]
+        lon = level["sum_lon"] / level["count"]
+        south, west, north, east = bounds
+        inside = (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lon >= west) & (lon <= east)
+        else:
+            inside &= (lon >= west) | (lon <= east)
+        return self._select(level, inside)
+
+    def tile(self, z: int, x: int, y: int) -> pd.DataFrame:
+        """Clusters of map tile ``z/x/y`` (``z <= max_zoom``); every cluster belongs to exactly one tile."""
+        k = self.cells_per_tile
+        level = self.levels[z]
+        # Levels are sorted by (cx, cy), so the tile's columns are one contiguous slice
+        lo, hi = np.searchsorted(level["cx"].to_numpy(), [x * k, (x + 1) * k])
+        level = level.iloc[lo:hi]
+        return self._select(level, (level["cy"] // k).eq(y))
+
+    def _select(self, level: pd.DataFrame, inside: pd.Series) -> pd.DataFrame:
+        lat = level["sum_lat"] / level["count"]
+        lon = level["sum_lon"] / level["count"]
+        out = pd.DataFrame(
+            {
+                "lat": lat[inside],
+                "lon": lon[inside],
+                "count": level["count"][inside],
+                "point": level["point"][inside],
+            }
+        )
+        for col, names in self.count_columns.items():
+            counts = level.loc[inside, list(names)].rename(columns=names)
+            out[col] = (
+                counts.idxmax(axis=1) if len(counts) else pd.Series(dtype="string")
+            )
+            out[f"{col}_breakdown"] = _breakdown(counts)
+        return out.reset_index(drop=True)
+
+    def features(
+        self,
+        zoom: float,
+        bounds: Tuple[float, float, float, float] = WORLD,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """Like :meth:`clusters`, but single-point clusters carry the point's own ``columns``."""
+        return self.with_columns(self.clusters(zoom, bounds), columns)
+
+    def with_columns(
+        self, out: pd.DataFrame, columns: Optional[Sequence[str]]
+    ) -> pd.DataFrame:
+        """Add the point's own ``columns`` to the single-point rows of ``out``.
+
+        Category columns are already there, with the dominant value of every cluster (a single point's own one).
+        """
+        single = out["count"].eq(1).to_numpy()
+        for col in columns or []:
+            if col in out.columns:
+                continue
+            values = pd.Series(pd.NA, index=out.index, dtype="object")
+            values[single] = self.points[col].to_numpy()[
+                out.loc[single, "point"].to_numpy()
+            ]
+            out[col] = values
+        return out
+
+    def zoom_for(self, max_features: int) -> int:
+        """The most detailed zoom level with at most ``max_features`` clusters in total."""
+        for z in range(self.max_zoom, -1, -1):
+            if len(self.levels[z]) <= max_features:
+                return z
+        return 0
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _pyramid(
+    name: str,
+    version: str,
+    lat_col: str,
+    lon_col: str,
+    categories: Tuple[str, ...],
+    where: Optional[Tuple[str, str]],
+) -> ClusterPyramid:
+    df = datastore.load(name)
+    if where is not None:
+        df = df[df[where[0]] == where[1]]
+    return ClusterPyramid(df, lat_col, lon_col, categories)
+
+
+def load_pyramid(
+    name: str,
+    lat_col: str,
+    lon_col: str,
+    categories: Sequence[str] = (),
+    where: Optional[Tuple[str, str]] = None,
+) -> ClusterPyramid:
+    """Cluster pyramid of dataset ``name`` (optionally only rows with ``where = (column, value)``),
+    shared across sessions and rebuilt only when the dataset version changes."""
+    return _pyramid(
+        name,
+        datastore.dataset_version(name),
+        lat_col,
+        lon_col,
+        tuple(categories),
+        where,
+    )
+
+
+def view_bounds(
+    view: Optional[dict], pad: float = 0.25
+) -> Tuple[float, float, float, float]:
+    """``(south, west, north, east)`` from a ``st_folium`` return value, padded by ``pad`` of its size
+    so small pans do not leave the edges empty; the whole world before the first map interaction.
+    """
+    bounds = (view or {}).get("bounds") or {}
+    sw, ne = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    if sw.get("lat") is None or ne.get("lat") is None:
+        return WORLD
+    dlat = (ne["lat"] - sw["lat"]) * pad
+    dlon = (ne["lng"] - sw["lng"]) * pad
+    if ne["lng"] - sw["lng"] + 2 * dlon >= 360:
+        return max(sw["lat"] - dlat, -90.0), -180.0, min(ne["lat"] + dlat, 90.0), 180.0
+    # Leaflet reports unwrapped longitudes past +-180 when the map is panned around the
+    # globe
+    west = (sw["lng"] - dlon + 180) % 360 - 180
+    east = (ne["lng"] + dlon + 180) % 360 - 180
+    return max(sw["lat"] - dlat, -90.0), west, min(ne["lat"] + dlat, 90.0), east
@@ -0,0 +1,187 @@
+"""Shared data access for the pages: CSV/XLSX sources converted once into typed Parquet.
+
+Each dataset is re-converted only when its source file changes (checked by
+mtime/size first, then by content hash). The content hash doubles as the
+dataset *version* that downstream caches (indexes, map payloads) key on.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from utils import excelio
+from utils.reproject import reproject_frame
+from utils.snapshots import parse_decimal_comma, read_csv_export, read_project_export
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+# Bump when a reader changes so existing Parquet files are rebuilt
+INGEST_VERSION = 3
+
+
+def _string_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Excel object columns mix numbers and text, which Parquet cannot store
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def read_boreholes(path: str) -> pd.DataFrame:
+    df = read_csv_export(path, dtype=str)
+    df["lat"] = parse_decimal_comma(df["lat"])
+    df["lon"] = parse_decimal_comma(df["lon"])
+    df["EPSG"] = pd.to_numeric(df["EPSG"], errors="coerce").astype("Int64")
+    # GK/UTM rows become WGS84 here, once per dataset version
+    df = reproject_frame(df)
+    # Ja/Nein test flags become booleans (<NA> where empty)
+    for col in df.columns:
+        values = set(df[col].dropna().unique())
+        if values and values <= {"Ja", "Nein"}:
+            df[col] = df[col].map({"Ja": True, "Nein": False}).astype("boolean")
+    return df
+
+
+def read_geocoded(path: str) -> pd.DataFrame:
+    df = excelio.read_excel(path)
+    for col in ("latitude", "longitude", "lat", "lon"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return _string_columns(df)
+
+
+def read_export(path: str) -> pd.DataFrame:
+    return _string_columns(read_project_export(path))
+
+
+def read_changes(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+# name -> (source path or glob; the newest match wins, reader)
+DATASETS: Dict[str, Tuple[str, Callable[[str], pd.DataFrame]]] = {
+    "boreholes": ("230710_GeoDatenbank_Lage.csv", read_boreholes),
+    "projects": ("Alle Projekte *.csv", read_export),
+    "projects_full": ("*alle_projekte*.xlsx", read_export),
+    "geocoded": ("geocoded_results.xlsx", read_geocoded),
+    # Change set between two export snapshots, written by utils/changes.py
+    "changes": ("project_changes.parquet", read_changes),
+}
+
+
+def register_dataset(
+    name: str, source: str, reader: Callable[[str], pd.DataFrame]
+) -> None:
+    DATASETS[name] = (source, reader)
+
+
+def source_path(name: str) -> str:
+    pattern, _ = DATASETS[name]
+    matches = glob.glob(os.path.join(DATA_DIR, pattern))
+    if not matches:
+        raise FileNotFoundError(
+            f"No source file for dataset {name!r} ({os.path.join(DATA_DIR, pattern)})"
+        )
+    return max(matches, key=os.path.getmtime)
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Sessions and the warm-up thread ask for the same dataset at once; one of them converts
+# it
+_conversion_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+_conversion_locks_lock = threading.Lock()
+
+
+def ensure_parquet(name: str) -> Tuple[str, str]:
+    """Convert dataset ``name`` to Parquet if needed; return ``(parquet path, version)``."""
+    with _conversion_locks_lock:
+        lock = _conversion_locks[name]
+    with lock:
+        return _ensure_parquet(name)
+
+
+def _ensure_parquet(name: str) -> Tuple[str, str]:
+    source = source_path(name)
+    stat = os.stat(source)
+    manifest_path = os.path.join(CACHE_DIR, f"{name}.json")
+    parquet_path = os.path.join(CACHE_DIR, f"{name}.parquet")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    fresh = (
+        os.path.exists(parquet_path)
+        and manifest.get("ingest") == INGEST_VERSION
+        and manifest.get("source") == source
+    )
+    if (
+        fresh
+        and manifest.get("mtime_ns") == stat.st_mtime_ns
+        and manifest.get("size") == stat.st_size
+    ):
+        return parquet_path, manifest["version"]
+
+    digest = file_hash(source)
+    version = f"{digest[:16]}-{INGEST_VERSION}"
+    if not (fresh and manifest.get("version") == version):
+        _, reader = DATASETS[name]
+        table = pa.Table.from_pandas(reader(source), preserve_index=False)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{parquet_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, parquet_path)
+    manifest = {
+        "source": source,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "version": version,
+        "ingest": INGEST_VERSION,
+    }
+    tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp_path, manifest_path)
+    return parquet_path, version
+
+
+def dataset_version(name: str) -> str:
+    return ensure_parquet(name)[1]
+
+
+def read_dataset(name: str) -> pd.DataFrame:
+    """Uncached read, for the CLI tools."""
+    return pq.read_table(ensure_parquet(name)[0]).to_pandas()
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def arrow_table(name: str, version: str) -> pa.Table:
+    """Shared, immutable Arrow table of one dataset version."""
+    return pq.read_table(os.path.join(CACHE_DIR, f"{name}.parquet"))
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _frame(name: str, version: str) -> pd.DataFrame:
+    return arrow_table(name, version).to_pandas()
+
+
+def load(name: str) -> pd.DataFrame:
+    """The dataset as a DataFrame the caller may modify; cached per version."""
+    _, version = ensure_parquet(name)
+    return _frame(name, version)
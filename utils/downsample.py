@@ -0,0 +1,165 @@
+"""Downsampling for long time series: LTTB, min/max/mean buckets and rolling statistics.
+
+Everything works on sorted timestamps and float values. Bucket statistics use
+``np.minimum.reduceat`` and friends, so the cost is linear in the number of
+input points and independent of how many buckets are requested.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Rollup levels kept next to the raw measurements, finest first
+ROLLUPS: Dict[str, int] = {"1min": 60, "15min": 900, "1h": 3600, "1d": 86400}
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of ``n`` points chosen by Largest-Triangle-Three-Buckets (NaN values are skipped).
+
+    The first and last points are always kept; from every bucket in between the
+    point spanning the largest triangle with the previously chosen point and
+    the mean of the next bucket is taken.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = np.flatnonzero(~np.isnan(y))
+    if n >= len(valid) or n < 3:
+        return valid
+    x, y = x[valid], y[valid]
+    # Bucket boundaries for the points between the first and the last one
+    edges = np.linspace(1, len(x) - 1, n - 1).astype("int64")
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    mean_x = np.add.reduceat(x, starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+    # The bucket after the last one is the final point itself
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    chosen = np.empty(n, dtype="int64")
+    chosen[0], chosen[-1] = 0, len(x) - 1
+    a = 0
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        # Twice the triangle area against every candidate in the bucket at once
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (next_y[i] - y[a])
+        )
+        a = s + int(np.argmax(area))
+        chosen[i + 1] = a
+    return valid[chosen]
+
+
+def lttb_frame(df: pd.DataFrame, n: int = DEFAULT_MAX_POINTS) -> pd.DataFrame:
+    """Per column LTTB of a time-indexed frame; columns keep their own selected timestamps."""
+    x = df.index.to_numpy(dtype="datetime64[ns]").astype("int64").astype("float64")
+    parts = [
+        df[col].iloc[lttb(x, df[col].to_numpy(dtype="float64", na_value=np.nan), n)]
+        for col in df.columns
+    ]
+    return pd.concat(parts, axis=1) if parts else df
+
+
+def bucket_stats(ts: np.ndarray, values: np.ndarray, width: int) -> pd.DataFrame:
+    """``count``, ``sum``, ``min``, ``max`` and ``mean`` of ``values`` per ``width``-second bucket.
+
+    ``ts`` are epoch seconds sorted ascending; NaN values are ignored.
+    """
+    ts = np.asarray(ts, dtype="int64")
+    values = np.asarray(values, dtype="float64")
+    keep = ~np.isnan(values)
+    ts, values = ts[keep], values[keep]
+    buckets = ts // width * width
+    if len(buckets) == 0:
+        return pd.DataFrame(
+            {
+                "bucket": np.empty(0, "int64"),
+                "count": np.empty(0, "int64"),
+                "sum": np.empty(0),
+                "min": np.empty(0),
+                "max": np.empty(0),
+                "mean": np.empty(0),
+            }
+        )
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    sums = np.add.reduceat(values, starts)
+    return pd.DataFrame(
+        {
+            "bucket": buckets[starts],
+            "count": counts,
+            "sum": sums,
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+            "mean": sums / counts,
+        }
+    )
+
+
+def merge_buckets(df: pd.DataFrame, width: int) -> pd.DataFrame:
+    """Combine long-format buckets (``ts, channel, count, mean, min, max``) into coarser ``width``-second ones."""
+    seconds = df["ts"].to_numpy(dtype="datetime64[s]").astype("int64")
+    merged = (
+        df.assign(bucket=seconds // width * width, sum=df["mean"] * df["count"])
+        .groupby(["channel", "bucket"], sort=True)
+        .agg(
+            count=("count", "sum"),
+            sum=("sum", "sum"),
+            min=("min", "min"),
+            max=("max", "max"),
+        )
+        .reset_index()
+    )
+    merged["mean"] = merged["sum"] / merged["count"]
+    merged["ts"] = pd.to_datetime(merged["bucket"], unit="s")
+    return merged[["ts", "channel", "count", "mean", "min", "max"]]
+
+
+def width_for(span_seconds: float, max_points: int = DEFAULT_MAX_POINTS) -> int:
+    """Bucket width (seconds) giving between about ``max_points / 2`` and ``max_points`` buckets over
+    ``span_seconds``: a multiple of the coarsest rollup that is not wider than needed.
+    """
+    target = span_seconds / max_points
+    base = max(
+        [w for w in ROLLUPS.values() if w <= target], default=min(ROLLUPS.values())
+    )
+    return max(base, int(np.ceil(target / base)) * base)
+
+
+def resample_minmax(
+    df: pd.DataFrame, max_points: int = DEFAULT_MAX_POINTS, width: Optional[int] = None
+) -> pd.DataFrame:
+    """Min/max/mean of every column of a time-indexed frame in buckets of ``width`` seconds
+    (by default the coarsest needed to stay under ``max_points``). Columns are a ``(stat, column)`` MultiIndex.
+    """
+    if df.empty:
+        return df
+    seconds = df.index.to_numpy(dtype="datetime64[s]").astype("int64")
+    width = width or width_for(seconds[-1] - seconds[0], max_points)
+    frames = {}
+    for col in df.columns:
+        stats = bucket_stats(
+            seconds, df[col].to_numpy(dtype="float64", na_value=np.nan), width
+        )
+        frames[col] = stats.set_index(pd.to_datetime(stats["bucket"], unit="s"))[
+            ["mean", "min", "max"]
+        ]
+    out = pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+    out.index.name = df.index.name
+    return out
+
+
+def rolling_stats(df: pd.DataFrame, window: str) -> pd.DataFrame:
+    """Time-based rolling ``mean``, ``std``, ``min`` and ``max`` (e.g. ``window="1h"``) per column,
+    as a ``(stat, column)`` MultiIndex frame."""
+    rolling = df.rolling(window, min_periods=1)
+    return pd.concat(
+        {
+            "mean": rolling.mean(),
+            "std": rolling.std(),
+            "min": rolling.min(),
+            "max": rolling.max(),
+        },
+        axis=1,
+    )
@@ -0,0 +1,354 @@
+"""Chunked reading and writing of large sheets with bounded memory.
+
+``pd.read_excel`` collects every cell of a sheet before the frame exists and
+``to_excel`` keeps the whole workbook in memory until it is saved, on top of
+the ``df.copy()`` that usually precedes it. Here sheets are read through
+openpyxl's read-only mode in chunks of ``CHUNK_ROWS`` rows (optionally only
+some columns), and results are appended chunk by chunk through write-only mode
+or as CSV/Parquet, so memory is bounded by the chunk, not the sheet.
+"""
+
+import contextlib
+import os
+import threading
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+CHUNK_ROWS = 10_000
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Result formats -> download MIME type
+TABLE_FORMATS = {
+    "xlsx": XLSX_MIME,
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Text cells pd.read_excel treats as missing by default
+NA_STRINGS = frozenset(
+    [
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    ]
+)
+
+Sheet = Union[int, str]
+
+
+def table_format(path: str) -> str:
+    """``xlsx``, ``csv`` or ``parquet`` by file extension."""
+    ext = os.path.splitext(str(path))[1].lower().lstrip(".")
+    if ext not in TABLE_FORMATS:
+        raise ValueError(
+            f"Unsupported file type {ext!r}; use one of {sorted(TABLE_FORMATS)}"
+        )
+    return ext
+
+
+def _workbook(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def _worksheet(wb, sheet: Sheet):
+    return wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+
+
+def _header(row: Sequence) -> List:
+    # Same names as pandas for empty and repeated header cells
+    row = list(row)
+    while row and row[-1] is None:
+        row.pop()
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def sheet_names(source) -> List[str]:
+    wb = _workbook(source)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def read_header(source, sheet: Sheet = 0) -> List:
+    """Column names of a worksheet, reading only its first row."""
+    wb = _workbook(source)
+    try:
+        return _header(next(_worksheet(wb, sheet).iter_rows(values_only=True), ()))
+    finally:
+        wb.close()
+
+
+def iter_excel(
+    source,
+    sheet: Sheet = 0,
+    columns: Optional[Sequence] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Yield a worksheet as frames of up to ``chunk_rows`` rows.
+
+    The index continues across chunks (0, 1, ... over the whole sheet); blank
+    rows and :data:`NA_STRINGS` are treated like ``pd.read_excel`` does.
+    ``columns`` restricts the frames to those columns; names missing from the
+    sheet are ignored. At least one (possibly empty) frame is always yielded.
+    """
+    wb = _workbook(source)
+    try:
+        rows = _worksheet(wb, sheet).iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        picks = (
+            list(range(len(header)))
+            if columns is None
+            else [header.index(c) for c in columns if c in header]
+        )
+        names = [header[i] for i in picks]
+        width = len(header)
+        buffer, start = [], 0
+        for row in rows:
+            # Blank rows are judged on the whole row, so every column subset yields the
+            # same rows
+            if all(v is None for v in row):
+                continue
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            buffer.append(
+                [
+                    None if type(row[i]) is str and row[i] in NA_STRINGS else row[i]
+                    for i in picks
+                ]
+            )
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(
+                    buffer,
+                    columns=names,
+                    index=pd.RangeIndex(start, start + len(buffer)),
+                )
+                start += len(buffer)
+                buffer = []
+        if buffer or start == 0:
+            yield pd.DataFrame(
+                buffer, columns=names, index=pd.RangeIndex(start, start + len(buffer))
+            )
+    finally:
+        wb.close()
+
+
+def read_excel(
+    source,
+    sheet: Sheet = 0,
+    columns: Optional[Sequence] = None,
+    nrows: Optional[int] = None,
+) -> pd.DataFrame:
+    """A worksheet (or its first ``nrows`` rows, or only ``columns``) as one frame."""
+    if nrows is not None:
+        with contextlib.closing(
+            iter_excel(source, sheet, columns, chunk_rows=max(nrows, 1))
+        ) as chunks:
+            return next(chunks).iloc[:nrows]
+    # A column that is empty in the first chunk would otherwise stay object after the
+    # concat
+    return pd.concat(list(iter_excel(source, sheet, columns))).infer_objects()
+
+
+def read_table(
+    path: str,
+    columns: Optional[Sequence] = None,
+    nrows: Optional[int] = None,
+    sheet: Sheet = 0,
+) -> pd.DataFrame:
+    """Read an ``.xlsx``, ``.csv`` or ``.parquet`` result file; ``columns`` missing from it are ignored."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        usecols = (lambda c: c in set(columns)) if columns is not None else None
+        return pd.read_csv(path, usecols=usecols, nrows=nrows)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        names = (
+            [c for c in columns if c in pf.schema_arrow.names]
+            if columns is not None
+            else None
+        )
+        if nrows is None:
+            return pf.read(columns=names).to_pandas()
+        batch = next(pf.iter_batches(batch_size=max(nrows, 1), columns=names), None)
+        return (
+            batch.to_pandas()
+            if batch is not None
+            else pf.schema_arrow.empty_table().to_pandas()
+        ).iloc[:nrows]
+    return read_excel(path, sheet, columns, nrows)
+
+
+def iter_frame(
+    df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Consecutive row slices of an in-memory frame."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def with_columns(chunk: pd.DataFrame, extra: pd.DataFrame) -> pd.DataFrame:
+    """``chunk`` plus the columns of ``extra`` taken at ``chunk``'s index labels; existing columns are replaced in place."""
+    part = extra.loc[chunk.index]
+    return chunk.assign(**{col: part[col] for col in extra.columns})
+
+
+class TableWriter:
+    """Append frames to an ``.xlsx`` (openpyxl write-only mode), ``.csv`` or ``.parquet`` file.
+
+    Rows go to a temporary file that replaces ``path`` on :meth:`close`, so an
+    interrupted write never leaves a truncated result behind.
+    """
+
+    def __init__(self, path: str, sheet_name: str = "Sheet1"):
+        self.path = path
+        self.format = table_format(path)
+        self.rows = 0
+        self.columns: Optional[List] = None
+        self._tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._parquet = None
+        if self.format == "xlsx":
+            self._wb = Workbook(write_only=True)
+            self._ws = self._wb.create_sheet(str(sheet_name)[:31])
+        elif self.format == "csv":
+            self._fh = open(self._tmp_path, "w", encoding="utf-8", newline="")
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = list(df.columns)
+            if self.format == "xlsx":
+                self._ws.append([str(c) for c in self.columns])
+        elif list(df.columns) != self.columns:
+            raise ValueError(
+                f"Chunk columns {list(df.columns)} differ from {self.columns}"
+            )
+        if self.format == "xlsx":
+            # Excel has no NaN; missing values become empty cells like with to_excel
+            values = df.astype(object).where(df.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                self._ws.append(row)
+        elif self.format == "csv":
+            df.to_csv(self._fh, header=self.rows == 0, index=False)
+        else:
+            self._write_parquet(df)
+        self.rows += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # The first chunk fixes the schema. Excel stores every number as a double; text,
+        # mixed and initially empty columns are stored as strings, so later chunks
+        # always fit
+        if self._parquet is None:
+            schema = pa.schema([(str(c), _arrow_type(df[c])) for c in df.columns])
+            self._parquet = pq.ParquetWriter(self._tmp_path, schema)
+        schema = self._parquet.schema
+        converted = {}
+        for field, col in zip(schema, df.columns):
+            try:
+                converted[field.name] = _to_arrow_dtype(df[col], field.type)
+            except (TypeError, ValueError) as e:
+                raise ValueError(
+                    f"Column {col!r} changes type after row {self.rows}; "
+                    f"write .xlsx or .csv instead ({e})"
+                ) from e
+        table = pa.Table.from_pandas(
+            pd.DataFrame(converted, index=df.index), schema=schema, preserve_index=False
+        )
+        self._parquet.write_table(table)
+
+    def close(self) -> None:
+        if self.format == "xlsx":
+            self._wb.save(self._tmp_path)
+        elif self.format == "csv":
+            self._fh.close()
+        elif self._parquet is not None:
+            self._parquet.close()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.table({}), self._tmp_path)
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        if self.format == "csv":
+            self._fh.close()
+        elif self._parquet is not None:
+            self._parquet.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _arrow_type(series: pd.Series):
+    import pyarrow as pa
+
+    if pd.api.types.is_bool_dtype(series):
+        return pa.bool_()
+    if pd.api.types.is_numeric_dtype(series):
+        return pa.float64()
+    if pd.api.types.is_datetime64_dtype(series):
+        return pa.timestamp("ns")
+    return pa.string()
+
+
+def _to_arrow_dtype(series: pd.Series, arrow_type) -> pd.Series:
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type):
+        return series.astype("string")
+    if pa.types.is_floating(arrow_type):
+        return pd.to_numeric(series).astype("float64")
+    if pa.types.is_timestamp(arrow_type):
+        return pd.to_datetime(series)
+    return series.astype("boolean")
+
+
+def write_chunks(
+    path: str, chunks: Iterable[pd.DataFrame], sheet_name: str = "Sheet1"
+) -> int:
+    """Write ``chunks`` one after another to ``path`` (format by extension); returns the number of rows."""
+    with TableWriter(path, sheet_name) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows
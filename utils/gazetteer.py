@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Offline gazetteer built from our own geocoded project history.
+
+Addresses with known coordinates (``Breite``/``Laenge`` next to
+"Vollstaendige Adresse (Verortung)" in the CRM export, or ``latitude``/
+``longitude``/``geo_query`` in a ``_geocoded.xlsx``) are collapsed per
+normalized address and stored as a small gzip'd JSON file. Lookups use the
+postcode, or failing that the town, as a blocking key and score candidates by
+character-trigram and token overlap.
+
+Build the index with:
+    python utils/gazetteer.py "data/Alle Projekte 15_04_2025 14-34-31.csv"
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.addresses import normalize_addresses
+from utils.geocache import normalize_address
+from utils.snapshots import ADDRESS_COLUMN, LAT_COLUMN, LON_COLUMN, read_project_export
+
+DEFAULT_GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "gazetteer.json.gz",
+)
+DEFAULT_MIN_SCORE = 0.85
+
+_POSTCODE_RE = re.compile(r"\b(\d{4,5})\s+([^,\d]+)")
+_TOKEN_RE = re.compile(r"\w+")
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def fold_address(address: str) -> str:
+    """Comparison key: normalized, umlauts dropped, trailing country removed.
+
+    The CRM export stores umlauts as U+FFFD, so "Österreich" and "\ufffdsterreich"
+    only agree once every non-ASCII character is removed.
+    """
+    text = _NON_ASCII_RE.sub("", normalize_address(address))
+    parts = [p.strip() for p in text.split(",") if p.strip()]
+    if (
+        len(parts) >= 2
+        and not _DIGIT_RE.search(parts[-1])
+        and any(_POSTCODE_RE.search(p) for p in parts[:-1])
+    ):
+        parts = parts[:-1]
+    return ", ".join(" ".join(p.split()) for p in parts)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def split_address(address: str) -> Tuple[Optional[str], Optional[str], Set[str]]:
+    """Return ``(postcode, town, house_numbers)`` of a normalized address."""
+    m = _POSTCODE_RE.search(address)
+    postcode = m.group(1) if m else None
+    town = m.group(2).strip() if m else None
+    numbers = {
+        t for t in _TOKEN_RE.findall(address) if t[0].isdigit() and t != postcode
+    }
+    return postcode, town, numbers
+
+
+class Gazetteer:
+    def __init__(self, addresses: List[str], lats: List[float], lons: List[float]):
+        self.addresses = addresses
+        self.lats = lats
+        self.lons = lons
+        keys = [fold_address(a) for a in addresses]
+        self.exact: Dict[str, int] = {k: i for i, k in enumerate(keys)}
+        self.grams = [trigrams(k) for k in keys]
+        self.tokens = [set(_TOKEN_RE.findall(k)) for k in keys]
+        self.numbers: List[Set[str]] = []
+        self.by_postcode: Dict[str, List[int]] = defaultdict(list)
+        self.by_town: Dict[str, List[int]] = defaultdict(list)
+        self.by_gram: Dict[str, List[int]] = defaultdict(list)
+        for i, a in enumerate(keys):
+            postcode, town, numbers = split_address(a)
+            self.numbers.append(numbers)
+            if postcode:
+                self.by_postcode[postcode].append(i)
+            if town:
+                self.by_town[town].append(i)
+            for g in self.grams[i]:
+                self.by_gram[g].append(i)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, address_col: str, lat_col: str, lon_col: str
+    ) -> "Gazetteer":
+        known = pd.DataFrame(
+            {
+                "address": normalize_addresses(df[address_col]),
+                "lat": pd.to_numeric(df[lat_col], errors="coerce"),
+                "lon": pd.to_numeric(df[lon_col], errors="coerce"),
+            }
+        ).dropna()
+        # Several projects at one site: use the median position per address
+        grouped = known.groupby("address", sort=True)[["lat", "lon"]].median()
+        return cls(
+            grouped.index.tolist(),
+            grouped["lat"].round(7).tolist(),
+            grouped["lon"].round(7).tolist(),
+        )
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_GAZETTEER_PATH) -> "Gazetteer":
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            data = json.load(fh)
+        return cls(data["addresses"], data["lat"], data["lon"])
+
+    def save(self, path: str = DEFAULT_GAZETTEER_PATH) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "version": 1,
+                    "addresses": self.addresses,
+                    "lat": self.lats,
+                    "lon": self.lons,
+                },
+                fh,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+
+    def _candidates(
+        self,
+        address: str,
+        postcode: Optional[str],
+        town: Optional[str],
+        grams: Set[str],
+    ) -> List[int]:
+        if postcode and postcode in self.by_postcode:
+            return self.by_postcode[postcode]
+        if town and town in self.by_town:
+            return self.by_town[town]
+        for part in address.split(", "):
+            if part in self.by_town:
+                return self.by_town[part]
+        # No blocking key: the entries sharing the most trigrams
+        shared = Counter(i for g in grams for i in self.by_gram.get(g, ()))
+        return [i for i, _ in shared.most_common(20)]
+
+    def match(self, query: str) -> Tuple[Optional[int], float]:
+        """Return ``(entry index, score)`` of the best match, score in [0, 1]."""
+        address = fold_address(query)
+        if address in self.exact:
+            return self.exact[address], 1.0
+        postcode, town, numbers = split_address(address)
+        grams = trigrams(address)
+        tokens = set(_TOKEN_RE.findall(address))
+        best, best_score = None, 0.0
+        for i in self._candidates(address, postcode, town, grams):
+            cand_grams = self.grams[i]
+            dice = 2 * len(grams & cand_grams) / (len(grams) + len(cand_grams))
+            jaccard = len(tokens & self.tokens[i]) / len(tokens | self.tokens[i])
+            score = 0.6 * dice + 0.4 * jaccard
+            # A different house number is a different building
+            if numbers != self.numbers[i]:
+                score *= 0.8
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score
+
+
+def detect_columns(df: pd.DataFrame) -> Tuple[str, str, str]:
+    if {"geo_query", "latitude", "longitude"} <= set(df.columns):
+        return "geo_query", "latitude", "longitude"
+    return ADDRESS_COLUMN, LAT_COLUMN, LON_COLUMN
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the offline gazetteer from geocoded project exports."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="Project exports (.csv/.xlsx) or _geocoded.xlsx files"
+    )
+    parser.add_argument(
+        "--output",
+        default=DEFAULT_GAZETTEER_PATH,
+        help=f"Index file (default: {DEFAULT_GAZETTEER_PATH})",
+    )
+    args = parser.parse_args()
+
+    frames = []
+    for path in args.inputs:
+        try:
+            df = read_project_export(path)
+        except Exception as e:
+            sys.stderr.write(f"Failed to read {path}: {e}\n")
+            sys.exit(1)
+        address_col, lat_col, lon_col = detect_columns(df)
+        if not {address_col, lat_col, lon_col} <= set(df.columns):
+            sys.stderr.write(
+                f"{path}: needs columns {address_col!r}, {lat_col!r}, {lon_col!r}\n"
+            )
+            sys.exit(1)
+        if "geo_status" in df.columns:
+            df = df[df["geo_status"].eq("ok")]
+        frames.append(
+            df[[address_col, lat_col, lon_col]].set_axis(
+                ["address", "lat", "lon"], axis=1
+            )
+        )
+
+    gazetteer = Gazetteer.from_frame(
+        pd.concat(frames, ignore_index=True), "address", "lat", "lon"
+    )
+    gazetteer.save(args.output)
+    print(
+        f"Wrote {len(gazetteer)} addresses to {args.output} ({os.path.getsize(args.output) // 1024} KiB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
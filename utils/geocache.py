@@ -0,0 +1,230 @@
+"""Disk-backed geocode cache shared by the CLI and the Streamlit pages.
+
+Entries are keyed by the normalized query, the parameters in ``KEY_PARAMS`` and
+the backend that answered (its name and base URL), so switching the backend or
+the Nominatim instance never serves another service's answers. Entries written
+before the backend was part of the key are no longer found; they age out through
+the TTL and LRU eviction.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from geopy.location import Location
+
+from utils import metrics
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "geocode_cache.sqlite",
+)
+DEFAULT_TTL_DAYS = 180
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Only these query parameters change what Nominatim returns for an address (zoom:
+# reverse lookups)
+KEY_PARAMS = ("language", "country_codes", "viewbox", "bounded", "zoom")
+
+_WS_RE = re.compile(r"\s+")
+_COMMA_RE = re.compile(r"\s*,\s*")
+
+
+def normalize_address(address: str) -> str:
+    text = unicodedata.normalize("NFKC", str(address)).casefold()
+    text = _COMMA_RE.sub(", ", text)
+    text = _WS_RE.sub(" ", text)
+    return text.strip(" ,")
+
+
+def cache_key(
+    query: str, params: Optional[Dict[str, Any]] = None, source: str = ""
+) -> str:
+    """Cache key of ``query`` sent with ``params`` to the backend identified by ``source``."""
+    params = params or {}
+    key_params = {
+        k: str(params[k]) for k in KEY_PARAMS if params.get(k) not in (None, "")
+    }
+    payload = json.dumps(
+        [normalize_address(query), key_params, source],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class GeocodeCache:
+    """SQLite cache of geocoding answers, including negative (not found) answers.
+
+    Entries expire after ``ttl_days``; when more than ``max_entries`` rows are
+    stored, the least recently used ones are dropped.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_days: float = DEFAULT_TTL_DAYS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY,"
+            " query TEXT NOT NULL,"
+            " value TEXT,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed)"
+        )
+        self._conn.commit()
+
+    def get(
+        self, query: str, params: Optional[Dict[str, Any]] = None, source: str = ""
+    ) -> Tuple[bool, Optional[dict]]:
+        """Return ``(found, value)``; ``value`` is None for a cached "not found"."""
+        key = cache_key(query, params, source)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                self.misses += 1
+                metrics.current().count("cache_misses")
+                return False, None
+            self._conn.execute(
+                "UPDATE geocode SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        metrics.current().count("cache_hits")
+        return True, (json.loads(row[0]) if row[0] is not None else None)
+
+    def put(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]],
+        value: Optional[dict],
+        source: str = "",
+    ) -> None:
+        key = cache_key(query, params, source)
+        now = time.time()
+        encoded = json.dumps(value, ensure_ascii=False) if value is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, query, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, str(query), encoded, now, now),
+            )
+            self._conn.commit()
+
+    def delete(
+        self, query: str, params: Optional[Dict[str, Any]] = None, source: str = ""
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM geocode WHERE key = ?", (cache_key(query, params, source),)
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above ``max_entries``."""
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds:
+                cur = self._conn.execute(
+                    "DELETE FROM geocode WHERE created < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+                removed += cur.rowcount
+            if self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+                if count > self.max_entries:
+                    cur = self._conn.execute(
+                        "DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY accessed LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+                    removed += cur.rowcount
+            self._conn.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        ratio = (self.hits / total * 100) if total else 0.0
+        return f"Geocode cache: {self.hits} hits, {self.misses} misses ({ratio:.1f}% hit rate)"
+
+    def close(self) -> None:
+        self.evict()
+        with self._lock:
+            self._conn.close()
+
+
+def location_to_value(loc: Location) -> dict:
+    raw = getattr(loc, "raw", {}) or {}
+    return {
+        "latitude": loc.latitude,
+        "longitude": loc.longitude,
+        "address": loc.address,
+        "raw": {k: raw[k] for k in ("type", "class", "boundingbox") if k in raw},
+    }
+
+
+def value_to_location(value: dict) -> Location:
+    return Location(
+        value.get("address"),
+        (value["latitude"], value["longitude"]),
+        value.get("raw", {}),
+    )
+
+
+class CachedGeocoder:
+    """Wrap a geopy-style ``geocode(query, **params)`` callable with a GeocodeCache.
+
+    Only cache misses reach the wrapped callable (and thus its rate limiter).
+    Exceptions are not cached so failed lookups are retried on the next run.
+    ``source`` names the backend behind ``geocode`` in the cache keys.
+    """
+
+    def __init__(
+        self,
+        geocode: Callable[..., Optional[Location]],
+        cache: GeocodeCache,
+        source: str = "",
+    ):
+        self.geocode = geocode
+        self.cache = cache
+        self.source = source
+
+    def __call__(self, query: str, **params) -> Optional[Location]:
+        found, value = self.cache.get(query, params, self.source)
+        if found:
+            return value_to_location(value) if value is not None else None
+        loc = self.geocode(query, **params)
+        self.cache.put(
+            query,
+            params,
+            location_to_value(loc) if loc is not None else None,
+            self.source,
+        )
+        return loc
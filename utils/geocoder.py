@@ -0,0 +1,464 @@
+"""Concurrent geocoding engine with pluggable backends and per-backend rate limiting.
+
+Backends speak plain HTTP (via ``requests``) so they can point at the public
+Nominatim, our own Nominatim instance, a commercial Nominatim-compatible
+provider, or a local stub server. Defaults can be set through the
+``GEOCODER_BACKEND``, ``GEOCODER_URL``, ``GEOCODER_API_KEY`` and
+``GEOCODER_RATE`` environment variables.
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from geopy.location import Location
+
+from utils import metrics
+from utils.gazetteer import DEFAULT_GAZETTEER_PATH, DEFAULT_MIN_SCORE, Gazetteer
+from utils.geocache import CachedGeocoder, GeocodeCache
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeocoderHTTPError(Exception):
+    def __init__(
+        self, status: int, message: str = "", retry_after: Optional[float] = None
+    ):
+        super().__init__(f"HTTP {status}{': ' + message if message else ''}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, up to ``burst`` saved up."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # Reserve the token now; a negative balance queues callers in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        metrics.current().observe("rate_limit_wait_s", wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class Backend:
+    name = "base"
+    # Whether requests need an API key (``api_key`` or GEOCODER_API_KEY)
+    requires_key = False
+    # Base URL of HTTP backends
+    url: Optional[str] = None
+
+    def __init__(self, rate: float = 1.0, burst: int = 1, timeout: float = 10):
+        self.limiter = TokenBucket(rate, burst)
+        self.timeout = timeout
+
+    def cache_source(self) -> str:
+        """Name and base URL, which tell this backend's answers apart in the geocode cache."""
+        return f"{self.name} {self.url}" if self.url else self.name
+
+    def geocode(self, query: str, **params) -> Optional[Location]:
+        raise NotImplementedError
+
+    def reverse(self, lat: float, lon: float, **params) -> Optional[Location]:
+        raise NotImplementedError(f"The {self.name} backend cannot reverse geocode")
+
+
+class NominatimBackend(Backend):
+    name = "nominatim"
+    default_url = "https://nominatim.openstreetmap.org"
+    # Requests per second allowed against ``default_url`` (the OSM usage policy); None
+    # for no cap
+    public_rate: Optional[float] = 1.0
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        user_agent: str = "streamlit-gis",
+        api_key: Optional[str] = None,
+        rate: float = 1.0,
+        burst: int = 1,
+        timeout: float = 10,
+    ):
+        self.url = (url or self.default_url).rstrip("/")
+        if self.is_public() and (rate <= 0 or rate > self.public_rate):
+            rate, burst = self.public_rate, 1
+        super().__init__(rate=rate, burst=burst, timeout=timeout)
+        self.api_key = api_key
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+
+    def is_public(self) -> bool:
+        """Whether this is the rate-capped public service rather than our own instance or a paid one."""
+        return self.public_rate is not None and self.url == self.default_url.rstrip("/")
+
+    def _request_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        out = {"format": "jsonv2", "limit": 1}
+        if params.get("language"):
+            out["accept-language"] = params["language"]
+        if params.get("country_codes"):
+            out["countrycodes"] = params["country_codes"]
+        if params.get("viewbox"):
+            out["viewbox"] = params["viewbox"]
+            out["bounded"] = params.get("bounded") or 0
+        if self.api_key:
+            out["key"] = self.api_key
+        return out
+
+    def _get(self, path: str, params: Dict[str, Any]) -> Any:
+        self.limiter.acquire()
+        start = time.perf_counter()
+        recorder = metrics.current()
+        try:
+            resp = self.session.get(
+                f"{self.url}/{path}", params=params, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            recorder.count(f"http_{type(e).__name__}")
+            raise
+        finally:
+            recorder.observe("http_latency_s", time.perf_counter() - start)
+        recorder.count(f"http_{resp.status_code}")
+        if resp.status_code != 200:
+            retry_after = resp.headers.get("Retry-After")
+            raise GeocoderHTTPError(
+                resp.status_code,
+                resp.reason or "",
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        return resp.json()
+
+    def geocode(self, query: str, **params) -> Optional[Location]:
+        data = self._get("search", {"q": query, **self._request_params(params)})
+        if not data:
+            return None
+        hit = data[0]
+        return Location(
+            hit.get("display_name"), (float(hit["lat"]), float(hit["lon"])), hit
+        )
+
+    def reverse(self, lat: float, lon: float, **params) -> Optional[Location]:
+        request = {
+            "lat": f"{lat:.7f}",
+            "lon": f"{lon:.7f}",
+            **self._request_params(params),
+        }
+        request.pop("limit")
+        if params.get("zoom") is not None:
+            request["zoom"] = params["zoom"]
+        data = self._get("reverse", request)
+        # Nominatim answers points without anything nearby with {"error": "Unable to
+        # geocode"}
+        if not data or "error" in data:
+            return None
+        return Location(
+            data.get("display_name"), (float(data["lat"]), float(data["lon"])), data
+        )
+
+
+class LocationIQBackend(NominatimBackend):
+    """Commercial provider with a Nominatim-compatible API (requires an API key)."""
+
+    name = "locationiq"
+    default_url = "https://eu1.locationiq.com/v1"
+    requires_key = True
+    public_rate = None
+
+    def _get(self, path: str, params: Dict[str, Any]) -> Any:
+        try:
+            return super()._get(path, params)
+        except GeocoderHTTPError as e:
+            # LocationIQ answers "no result" with a 404 instead of an empty list
+            if e.status == 404:
+                return []
+            raise
+
+
+class GazetteerBackend(Backend):
+    """Offline lookups in our own project history; no network, no rate limit."""
+
+    name = "gazetteer"
+
+    def __init__(
+        self,
+        gazetteer: Optional[Gazetteer] = None,
+        path: str = DEFAULT_GAZETTEER_PATH,
+        min_score: float = DEFAULT_MIN_SCORE,
+        **kwargs,
+    ):
+        super().__init__(rate=0)
+        self.gazetteer = gazetteer if gazetteer is not None else Gazetteer.load(path)
+        self.min_score = min_score
+
+    def geocode(self, query: str, **params) -> Optional[Location]:
+        i, score = self.gazetteer.match(query)
+        if i is None or score < self.min_score:
+            return None
+        g = self.gazetteer
+        return Location(
+            g.addresses[i],
+            (g.lats[i], g.lons[i]),
+            {"type": "gazetteer", "score": round(score, 3)},
+        )
+
+
+BACKENDS: Dict[str, type] = {
+    NominatimBackend.name: NominatimBackend,
+    LocationIQBackend.name: LocationIQBackend,
+    GazetteerBackend.name: GazetteerBackend,
+}
+
+
+def register_backend(cls: type) -> type:
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def make_backend(name: Optional[str] = None, **kwargs) -> Backend:
+    name = name or os.environ.get("GEOCODER_BACKEND") or NominatimBackend.name
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown geocoding backend {name!r}; available: {sorted(BACKENDS)}"
+        )
+    if issubclass(BACKENDS[name], NominatimBackend):
+        kwargs["url"] = kwargs.get("url") or os.environ.get("GEOCODER_URL") or None
+        kwargs["api_key"] = (
+            kwargs.get("api_key") or os.environ.get("GEOCODER_API_KEY") or None
+        )
+    if kwargs.get("rate") is None:
+        kwargs.pop("rate", None)
+        if os.environ.get("GEOCODER_RATE"):
+            kwargs["rate"] = float(os.environ["GEOCODER_RATE"])
+    return BACKENDS[name](**kwargs)
+
+
+def result_from_location(
+    loc: Optional[Location], source: str = "nominatim"
+) -> Dict[str, Any]:
+    if loc is None:
+        return {"geo_status": "not_found", "geo_source": source}
+    # Extract a rough precision from OSM "type" and "class"
+    raw = getattr(loc, "raw", {}) or {}
+    return {
+        "geo_status": "ok",
+        "latitude": loc.latitude,
+        "longitude": loc.longitude,
+        "geo_precision_hint": raw.get("type") or raw.get("class"),
+        "geo_display_name": loc.address,
+        "geo_source": source,
+    }
+
+
+def reverse_query(lat: float, lon: float) -> str:
+    """Text form of a reverse lookup, used as its cache and checkpoint key."""
+    return f"reverse:{lat:.6f},{lon:.6f}"
+
+
+def parse_reverse_query(query: str) -> Tuple[float, float]:
+    lat, lon = query[len("reverse:") :].split(",")
+    return float(lat), float(lon)
+
+
+def location_result(
+    geocode: Callable, query: str, params: Dict[str, Any], source: str = "nominatim"
+) -> Dict[str, Any]:
+    try:
+        loc = geocode(query, **params)
+    except Exception as e:
+        return {"geo_status": f"error: {e}", "geo_source": source}
+    return result_from_location(loc, source)
+
+
+class GeocodingEngine:
+    """Run geocoding requests for many queries on a thread pool.
+
+    The backend's token bucket caps the request rate across all workers; 429
+    and 5xx answers as well as connection errors are retried with exponential
+    backoff (honouring ``Retry-After``). With a cache, only misses reach the
+    backend. With a ``local`` backend (the offline gazetteer), confident local
+    matches are answered without touching the cache or the network. Reverse
+    lookups (:meth:`reverse_many`) always go to ``backend``.
+    """
+
+    def __init__(
+        self,
+        backend: Backend,
+        workers: int = 4,
+        cache: Optional[GeocodeCache] = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+        local: Optional[Backend] = None,
+    ):
+        self.backend = backend
+        self.local = local
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.geocode = (
+            CachedGeocoder(self._geocode_with_retries, cache, backend.cache_source())
+            if cache is not None
+            else self._geocode_with_retries
+        )
+        self.reverse = (
+            CachedGeocoder(self._reverse_with_retries, cache, backend.cache_source())
+            if cache is not None
+            else self._reverse_with_retries
+        )
+
+    def _geocode_with_retries(self, query: str, **params) -> Optional[Location]:
+        return self._with_retries(self.backend.geocode, query, **params)
+
+    def _reverse_with_retries(self, query: str, **params) -> Optional[Location]:
+        return self._with_retries(
+            self.backend.reverse, *parse_reverse_query(query), **params
+        )
+
+    def _with_retries(
+        self, call: Callable[..., Optional[Location]], *args, **params
+    ) -> Optional[Location]:
+        attempt = 0
+        while True:
+            try:
+                return call(*args, **params)
+            except (GeocoderHTTPError, requests.ConnectionError, requests.Timeout) as e:
+                retryable = (
+                    not isinstance(e, GeocoderHTTPError) or e.status in RETRY_STATUSES
+                )
+                if not retryable or attempt >= self.retries:
+                    raise
+                delay = getattr(e, "retry_after", None) or self.backoff * (2**attempt)
+                delay *= 1 + random.random() * 0.1
+                recorder = metrics.current()
+                recorder.count("retries")
+                recorder.observe("retry_sleep_s", delay)
+                time.sleep(delay)
+                attempt += 1
+
+    def geocode_one(
+        self, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        if self.local is not None:
+            loc = self.local.geocode(query)
+            if loc is not None:
+                metrics.current().count("gazetteer_hits")
+                return result_from_location(loc, source=self.local.name)
+        return location_result(
+            self.geocode, query, params or {}, source=self.backend.name
+        )
+
+    def reverse_one(
+        self, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Reverse geocode a :func:`reverse_query`; the result has the same fields as :meth:`geocode_one`."""
+        return location_result(
+            self.reverse, query, params or {}, source=self.backend.name
+        )
+
+    def geocode_many(
+        self,
+        queries: List[str],
+        params: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Geocode ``queries`` concurrently; results keep the input order.
+
+        ``progress(done, total)`` and ``on_result(index, result)`` are called
+        from the calling thread, so they may safely update Streamlit elements
+        or write checkpoints.
+        """
+        return self._run_many(self.geocode_one, queries, params, progress, on_result)
+
+    def reverse_many(
+        self,
+        queries: List[str],
+        params: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Like :meth:`geocode_many` for :func:`reverse_query` strings."""
+        return self._run_many(self.reverse_one, queries, params, progress, on_result)
+
+    def _run_many(
+        self,
+        lookup: Callable[[str, Optional[Dict[str, Any]]], Dict[str, Any]],
+        queries: List[str],
+        params: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[int, int], None]],
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]],
+    ) -> List[Dict[str, Any]]:
+        total = len(queries)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        if self.workers == 1:
+            for i, query in enumerate(queries):
+                results[i] = lookup(query, params)
+                if on_result:
+                    on_result(i, results[i])
+                if progress:
+                    progress(i + 1, total)
+            return results
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Each task runs in a copy of the caller's context, so workers record into
+            # its metrics
+            futures = {
+                pool.submit(contextvars.copy_context().run, lookup, query, params): i
+                for i, query in enumerate(queries)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                results[i] = future.result()
+                if on_result:
+                    on_result(i, results[i])
+                if progress:
+                    progress(done, total)
+        return results
+
+
+def load_gazetteer(
+    path: str = DEFAULT_GAZETTEER_PATH, min_score: float = DEFAULT_MIN_SCORE
+) -> Optional[GazetteerBackend]:
+    """The gazetteer backend if its index file exists, else None."""
+    if not os.path.exists(path):
+        return None
+    return GazetteerBackend(path=path, min_score=min_score)
+
+
+def make_engine(
+    backend: Optional[str] = None,
+    workers: int = 4,
+    cache: Optional[GeocodeCache] = None,
+    retries: int = 3,
+    local: Optional[Backend] = None,
+    **backend_kwargs,
+) -> GeocodingEngine:
+    return GeocodingEngine(
+        make_backend(backend, **backend_kwargs),
+        workers=workers,
+        cache=cache,
+        retries=retries,
+        local=local,
+    )
@@ -0,0 +1,515 @@
+"""Background geocoding jobs that outlive Streamlit reruns and browser sessions.
+
+Jobs run on a process-wide thread pool; their state lives in a SQLite table
+and their input, checkpoint journal and result in ``data/jobs/<id>/``. Pages
+only submit jobs and poll the table, so a widget interaction or a reconnect
+never interrupts a batch. Jobs left "running" by a server restart are marked
+"interrupted" and can be resumed from their checkpoint. Each job belongs to
+the user or browser session that submitted it (:func:`job_owner`), and only
+they see it in the job panel. API keys are never stored, so resuming a job
+that needs one asks for it again.
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import streamlit as st
+
+from utils.addresses import (
+    build_address_series,
+    detect_address_column,
+    geocode_addresses,
+)
+from utils.checkpoint import CheckpointJournal
+from utils.datastore import DATA_DIR
+from utils.excelio import (
+    TABLE_FORMATS,
+    XLSX_MIME,
+    iter_excel,
+    read_excel,
+    read_header,
+    with_columns,
+    write_chunks,
+)
+from utils.geocache import GeocodeCache
+from utils.geocoder import (
+    BACKENDS,
+    Backend,
+    GeocodingEngine,
+    load_gazetteer,
+    make_backend,
+)
+from utils.metrics import Metrics, current, recording
+from utils.reverse import (
+    DEFAULT_GRID_M,
+    detect_coordinate_columns,
+    fill_addresses,
+    reverse_geocode_points,
+)
+from utils.sideserver import download_button
+
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+PROGRESS_INTERVAL = 1.0
+# Written to the jobs this server process queues or runs
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_COLUMNS = [
+    "id",
+    "kind",
+    "label",
+    "status",
+    "created",
+    "started",
+    "finished",
+    "total",
+    "done",
+    "ok",
+    "not_found",
+    "errors",
+    "message",
+    "settings",
+    "owner",
+    "process",
+]
+# Query parameter that keeps an anonymous session's owner token across page reloads
+OWNER_PARAM = "jobs"
+
+
+class JobStore:
+    def __init__(self, path: str = os.path.join(JOBS_DIR, "jobs.sqlite")):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT, label TEXT, status TEXT, created REAL, started REAL, finished REAL,"
+            " total INTEGER DEFAULT 0, done INTEGER DEFAULT 0, ok INTEGER DEFAULT 0, not_found INTEGER DEFAULT 0,"
+            " errors INTEGER DEFAULT 0, message TEXT, settings TEXT, owner TEXT, process TEXT)"
+        )
+        # Tables from before jobs had owners and processes
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner", "process"):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        self._conn.commit()
+
+    def create(
+        self,
+        kind: str,
+        label: str,
+        settings: Dict[str, Any],
+        owner: Optional[str] = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, label, status, created, settings, owner, process)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    label,
+                    "queued",
+                    time.time(),
+                    json.dumps(settings),
+                    owner,
+                    PROCESS_ID,
+                ),
+            )
+            self._conn.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        jobs = self._select("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def recent(
+        self, kind: Optional[str] = None, limit: int = 20, owner: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Newest jobs first, optionally only of ``kind`` and of ``owner``."""
+        conditions = {"kind = ?": kind, "owner = ?": owner}
+        where = [c for c, v in conditions.items() if v is not None]
+        args = tuple(v for v in conditions.values() if v is not None)
+        clause = f"WHERE {' AND '.join(where)} " if where else ""
+        return self._select(f"{clause}ORDER BY created DESC LIMIT ?", (*args, limit))
+
+    def _select(self, clause: str, args: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs {clause}", args
+            ).fetchall()
+        jobs = [dict(zip(_COLUMNS, row)) for row in rows]
+        for job in jobs:
+            job["settings"] = json.loads(job["settings"] or "{}")
+        return jobs
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def result_path(job_id: str, fmt: str = "xlsx") -> str:
+    return os.path.join(job_dir(job_id), f"result.{fmt}")
+
+
+def metrics_path(job_id: str) -> str:
+    return os.path.join(job_dir(job_id), "metrics.json")
+
+
+def job_result(job: Dict[str, Any]) -> str:
+    """Path of a job's result file in the format it was submitted with."""
+    return result_path(job["id"], job["settings"].get("format", "xlsx"))
+
+
+class JobRunner:
+    def __init__(self, workers: int = 2):
+        self.store = JobStore()
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="geocode-job"
+        )
+        self._backends: Dict[tuple, Backend] = {}
+        self._lock = threading.Lock()
+        # Nothing can still be running for jobs of a previous server process; jobs of
+        # this one are still on the pool of the runner this one replaces
+        for job in self.store._select(
+            "WHERE status IN ('queued', 'running') AND process IS NOT ?", (PROCESS_ID,)
+        ):
+            self.store.update(
+                job["id"],
+                status="interrupted",
+                message="Server restarted; resume to continue",
+            )
+
+    def _backend(
+        self, settings: Dict[str, Any], credentials: Dict[str, Any]
+    ) -> Backend:
+        # Jobs against the same endpoint with the same key share one backend and thus
+        # one rate limit
+        api_key = credentials.get("api_key")
+        key = (
+            settings.get("backend"),
+            settings.get("url"),
+            settings.get("user_agent"),
+            settings.get("rate"),
+            hashlib.sha256(api_key.encode("utf-8")).hexdigest() if api_key else None,
+        )
+        with self._lock:
+            if key not in self._backends:
+                self._backends[key] = make_backend(
+                    settings.get("backend"),
+                    url=settings.get("url"),
+                    api_key=api_key,
+                    user_agent=settings.get("user_agent"),
+                    rate=settings.get("rate"),
+                )
+            return self._backends[key]
+
+    def submit(
+        self,
+        kind: str,
+        filename: str,
+        data,
+        settings: Dict[str, Any],
+        credentials: Optional[Dict[str, Any]] = None,
+        owner: Optional[str] = None,
+    ) -> str:
+        """Queue a geocoding job for an uploaded workbook (bytes or a binary file object).
+        ``credentials`` are never persisted."""
+        job_id = self.store.create(kind, filename, settings, owner)
+        os.makedirs(job_dir(job_id), exist_ok=True)
+        with open(os.path.join(job_dir(job_id), "input.xlsx"), "wb") as fh:
+            if isinstance(data, bytes):
+                fh.write(data)
+            else:
+                data.seek(0)
+                shutil.copyfileobj(data, fh)
+        self.pool.submit(self._run, job_id, settings, credentials or {})
+        return job_id
+
+    @staticmethod
+    def needs_key(job: Dict[str, Any]) -> bool:
+        """Whether resuming ``job`` needs an API key, which went away with the process that ran it."""
+        backend = BACKENDS.get(
+            job["settings"].get("backend") or os.environ.get("GEOCODER_BACKEND") or ""
+        )
+        return bool(
+            backend and backend.requires_key and not os.environ.get("GEOCODER_API_KEY")
+        )
+
+    def resume(self, job_id: str, credentials: Optional[Dict[str, Any]] = None) -> None:
+        """Continue ``job_id`` from its checkpoint; ``credentials`` as for :meth:`submit`."""
+        job = self.store.get(job_id)
+        self.store.update(job_id, status="queued", message=None, process=PROCESS_ID)
+        self.pool.submit(self._run, job_id, job["settings"], credentials or {})
+
+    def _run(
+        self, job_id: str, settings: Dict[str, Any], credentials: Dict[str, Any]
+    ) -> None:
+        # Stage timings, request latencies, waits and cache hits end up in metrics.json
+        # for the Diagnostics page
+        job_metrics = Metrics(f"job {job_id}")
+        with recording(job_metrics):
+            try:
+                self._execute(job_id, settings, credentials)
+            finally:
+                job_metrics.write(metrics_path(job_id))
+
+    def _execute(
+        self, job_id: str, settings: Dict[str, Any], credentials: Dict[str, Any]
+    ) -> None:
+        store = self.store
+        store.update(job_id, status="running", started=time.time())
+        cache = None
+        try:
+            # Only the address columns are loaded; all other columns are streamed
+            # through when writing
+            input_path = os.path.join(job_dir(job_id), "input.xlsx")
+            sheet = settings.get("sheet") or 0
+            with current().stage("read_input"):
+                header = read_header(input_path, sheet)
+                reverse = settings.get("mode") == "reverse"
+                if reverse:
+                    lat_col, lon_col = detect_coordinate_columns(
+                        header, settings.get("lat_col"), settings.get("lon_col")
+                    )
+                    if lat_col is None or lon_col is None:
+                        raise ValueError(
+                            "No coordinate columns found. Please specify latitude and longitude columns."
+                        )
+                    fill_col = settings.get("fill_col")
+                    df = read_excel(
+                        input_path, sheet, columns=[lat_col, lon_col, fill_col]
+                    )
+                elif settings.get("address_cols"):
+                    df = read_excel(input_path, sheet, columns=settings["address_cols"])
+                    address_series = build_address_series(df, settings["address_cols"])
+                else:
+                    col = detect_address_column(
+                        pd.DataFrame(columns=header), settings.get("address_col")
+                    )
+                    if col is None:
+                        raise ValueError(
+                            "No address column found. Please specify address columns."
+                        )
+                    address_series = read_excel(input_path, sheet, columns=[col])[col]
+
+            # The gazetteer only knows addresses -> coordinates
+            local = (
+                load_gazetteer()
+                if settings.get("use_gazetteer", True) and not reverse
+                else None
+            )
+            if settings.get("offline"):
+                if reverse:
+                    raise ValueError("Reverse geocoding needs an online backend")
+                if local is None:
+                    raise ValueError(
+                        "Offline mode needs a gazetteer (utils/gazetteer.py)"
+                    )
+                engine = GeocodingEngine(local, workers=1)
+            else:
+                cache = GeocodeCache()
+                engine = GeocodingEngine(
+                    self._backend(settings, credentials),
+                    workers=settings.get("workers", 4),
+                    cache=cache,
+                    local=local,
+                )
+
+            params = settings.get("params") or {}
+            grid_m = settings.get("grid_m", DEFAULT_GRID_M)
+            journal = CheckpointJournal(
+                os.path.join(job_dir(job_id), "checkpoint.jsonl"),
+                {**params, "grid_m": grid_m} if reverse else params,
+            )
+            known = {
+                k: r
+                for k, r in journal.load().items()
+                if not str(r.get("geo_status")).startswith("error")
+            }
+            # Progress is counted in distinct addresses (grid cells for reverse jobs),
+            # including those already answered in the checkpoint
+            counts = Counter(
+                str(r.get("geo_status")).split(":")[0] for r in known.values()
+            )
+
+            def on_result(key, result):
+                journal.append(key, result)
+                counts[result["geo_status"].split(":")[0]] += 1
+
+            def progress(done, total):
+                store.update(
+                    job_id,
+                    done=len(known) + done,
+                    total=len(known) + total,
+                    ok=counts["ok"],
+                    not_found=counts["not_found"],
+                    errors=counts["error"],
+                )
+
+            with journal.open(resume=True):
+                if reverse:
+                    results, summary = reverse_geocode_points(
+                        df[lat_col],
+                        df[lon_col],
+                        engine,
+                        params,
+                        grid_m,
+                        progress,
+                        known=known,
+                        on_result=on_result,
+                        progress_interval=PROGRESS_INTERVAL,
+                    )
+                else:
+                    results, summary = geocode_addresses(
+                        address_series,
+                        engine,
+                        params,
+                        progress,
+                        known=known,
+                        on_result=on_result,
+                        progress_interval=PROGRESS_INTERVAL,
+                    )
+
+            if reverse:
+                extra = results
+                if fill_col:
+                    existing = df[fill_col] if fill_col in df.columns else None
+                    extra = results.assign(
+                        **{
+                            fill_col: fill_addresses(
+                                existing, results, settings.get("overwrite", False)
+                            )
+                        }
+                    )
+            elif settings.get("columns") == "latlon":
+                extra = pd.DataFrame(
+                    {"lat": results["latitude"], "lon": results["longitude"]}
+                )
+            else:
+                extra = results.assign(geo_query=address_series)
+            with current().stage("write_output", rows=len(extra)):
+                write_chunks(
+                    result_path(job_id, settings.get("format", "xlsx")),
+                    (
+                        with_columns(chunk, extra)
+                        for chunk in iter_excel(input_path, sheet)
+                    ),
+                    sheet_name=settings.get("sheet") or "Sheet1",
+                )
+
+            if cache is not None:
+                summary += f". {cache.summary()}"
+            store.update(
+                job_id,
+                status="done",
+                finished=time.time(),
+                total=sum(counts.values()),
+                done=sum(counts.values()),
+                ok=counts["ok"],
+                not_found=counts["not_found"],
+                errors=counts["error"],
+                message=summary,
+            )
+        except Exception as e:
+            store.update(job_id, status="failed", finished=time.time(), message=str(e))
+        finally:
+            if cache is not None:
+                cache.close()
+
+
+def job_owner() -> str:
+    """Owner of the jobs submitted in this session: the logged-in user, else a token kept in the page URL."""
+    try:
+        if st.user.is_logged_in:
+            return f"user:{st.user.email}"
+    except (AttributeError, KeyError):
+        pass
+    if "job_owner" not in st.session_state:
+        token = st.query_params.get(OWNER_PARAM)
+        st.session_state["job_owner"] = (
+            token if token and token.isalnum() else secrets.token_hex(16)
+        )
+    st.query_params[OWNER_PARAM] = st.session_state["job_owner"]
+    return f"session:{st.session_state['job_owner']}"
+
+
+@st.cache_resource
+def get_runner() -> JobRunner:
+    return JobRunner(workers=int(os.environ.get("GEOCODER_JOB_WORKERS", 2)))
+
+
+def job_panel(kind: str, key: str) -> None:
+    """List this session's recent jobs of ``kind`` with live progress and downloads; refreshes itself every 2 s."""
+    owner = job_owner()
+
+    @st.fragment(run_every=2)
+    def _panel():
+        runner = get_runner()
+        jobs = runner.store.recent(kind, owner=owner)
+        if not jobs:
+            st.caption("No geocoding jobs yet.")
+            return
+        for job in jobs:
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(job["created"]))
+            st.markdown(f"**{job['label']}** · {created} · `{job['status']}`")
+            if job["status"] in ("queued", "running") and job["total"]:
+                st.progress(
+                    min(job["done"] / job["total"], 1.0),
+                    text=f"{job['done']}/{job['total']} "
+                    + (
+                        "grid cells"
+                        if job["settings"].get("mode") == "reverse"
+                        else "unique addresses"
+                    ),
+                )
+            st.caption(
+                f"ok={job['ok']} • not_found={job['not_found']} • errors={job['errors']}"
+                + (f" — {job['message']}" if job["message"] else "")
+            )
+            path = job_result(job)
+            if job["status"] == "done" and os.path.exists(path):
+                fmt = job["settings"].get("format", "xlsx")
+                download_button(
+                    "📥 Download result",
+                    path,
+                    f"geocoded_{os.path.splitext(job['label'])[0]}.{fmt}",
+                    TABLE_FORMATS[fmt],
+                    key=f"{key}-dl-{job['id']}",
+                )
+            elif job["status"] == "interrupted":
+                api_key = None
+                if runner.needs_key(job):
+                    api_key = st.text_input(
+                        "API key",
+                        type="password",
+                        key=f"{key}-key-{job['id']}",
+                        help="Keys are never stored, so a job interrupted by a restart needs it again",
+                    )
+                if st.button(
+                    "Resume", key=f"{key}-resume-{job['id']}", disabled=api_key == ""
+                ):
+                    runner.resume(job["id"], {"api_key": api_key} if api_key else None)
+
+    _panel()
@@ -0,0 +1,165 @@
+"""Memoized kepler.gl HTML for ``components.html``.
+
+``KeplerGl._repr_html_`` re-serializes every row (``to_dict("split")`` and
+``json.dumps``) on each rerun. Here each dataset is encoded once per content
+key into a columnar payload: one JSON array per column, with repetitive text
+columns dictionary-encoded. A small script rebuilds kepler's DataFrame format
+in the browser. The assembled page is cached per (data keys, config), so
+toggling the map height or reusing a config never touches the data again.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+# Text columns with at most this share of distinct values are sent as dictionary + codes
+DICTIONARY_RATIO = 0.5
+# Above this many points the Project Map gets per-zoom clusters instead of raw rows
+MAX_MAP_POINTS = 20_000
+
+_DECODE = """
+(function() {
+    function column(v, n) {
+        if (v && v.dict) {
+            var out = new Array(n);
+            for (var i = 0; i < n; i++) { out[i] = v.codes[i] < 0 ? null : v.dict[v.codes[i]]; }
+            return out;
+        }
+        return v;
+    }
+    var encoded = window.__keplerglColumnar || {}, data = {};
+    Object.keys(encoded).forEach(function(name) {
+        var p = encoded[name], n = p.length, cols = p.columns;
+        var arrays = cols.map(function(c, j) { return column(p.values[j], n); });
+        var rows = new Array(n);
+        for (var i = 0; i < n; i++) {
+            var row = new Array(cols.length);
+            for (var j = 0; j < cols.length; j++) { row[j] = arrays[j][i]; }
+            rows[i] = row;
+        }
+        data[name] = {columns: cols, data: rows, index: []};
+    });
+    window.__keplerglDataConfig.data = data;
+})();
+"""
+
+
+def point_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, str, str]:
+    """``(rows with numeric coordinates, lat column, lon column)`` of a geocoded table."""
+    lat_col = "latitude" if "latitude" in df.columns else "lat"
+    lon_col = "longitude" if "longitude" in df.columns else "lon"
+    df = df.assign(
+        **{
+            lat_col: pd.to_numeric(df[lat_col], errors="coerce"),
+            lon_col: pd.to_numeric(df[lon_col], errors="coerce"),
+        }
+    )
+    return df.dropna(subset=[lat_col, lon_col]), lat_col, lon_col
+
+
+def frame_key(df: pd.DataFrame) -> str:
+    """Content hash of a frame (values, column names and dtypes)."""
+    h = hashlib.sha1()
+    h.update(
+        json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode("utf-8")
+    )
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:20]
+
+
+def _column_json(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_json(orient="values", date_format="iso")
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.to_json(orient="values", double_precision=7)
+    codes, uniques = pd.factorize(series.astype("string"))
+    if len(series) and len(uniques) <= DICTIONARY_RATIO * len(series):
+        return '{"dict":%s,"codes":%s}' % (
+            pd.Series(uniques, dtype="object").to_json(
+                orient="values", force_ascii=False
+            ),
+            json.dumps(codes.astype("int32").tolist()),
+        )
+    return series.astype("string").to_json(orient="values", force_ascii=False)
+
+
+def encode_columnar(df: pd.DataFrame) -> str:
+    """JSON ``{"columns", "length", "values"}`` with one array (or dictionary) per column."""
+    values = ",".join(_column_json(df[c]) for c in df.columns)
+    return '{"columns":%s,"length":%d,"values":[%s]}' % (
+        json.dumps([str(c) for c in df.columns], ensure_ascii=False),
+        len(df),
+        values,
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _encoded(name: str, key: str, _df: pd.DataFrame) -> str:
+    # Keyed by (name, content key) only; the frame itself is not hashed again
+    return encode_columnar(_df)
+
+
+@st.cache_resource(show_spinner=False)
+def _template() -> Tuple[str, str]:
+    spec = importlib.util.find_spec("keplergl")
+    path = os.path.join(spec.submodule_search_locations[0], "static", "keplergl.html")
+    with open(path, encoding="utf-8") as fh:
+        html = fh.read()
+    k = html.find("<body>")
+    return html[:k], html[k + len("<body>") :]
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _page(
+    keys: Tuple[Tuple[str, str], ...],
+    config_json: str,
+    read_only: bool,
+    center_map: bool,
+    _payloads: Dict[str, str],
+) -> str:
+    head, body = _template()
+    options = json.dumps({"readOnly": read_only, "centerMap": center_map})
+    # "</" inside JSON strings would end the script element early
+    columnar = "{%s}" % ",".join(
+        f"{json.dumps(name)}:{_payloads[name]}" for name, _ in keys
+    )
+    columnar = columnar.replace("</", "<\\/")
+    script = (
+        f"window.__keplerglColumnar = {columnar};"
+        f'window.__keplerglDataConfig = {{"config": {config_json}, "options": {options}}};'
+        + _DECODE
+    )
+    return f"{head}<body><script>{script}</script>{body}"
+
+
+def kepler_html(
+    datasets: Dict[str, pd.DataFrame],
+    config: Optional[dict] = None,
+    read_only: bool = False,
+    center_map: bool = False,
+    keys: Optional[Dict[str, str]] = None,
+) -> str:
+    """Same page as ``KeplerGl(data=datasets, config=config)._repr_html_()``, memoized.
+
+    ``keys`` may name a version per dataset (e.g. the dataset version plus any
+    filter) to skip hashing the frame's content.
+    """
+    keys = dict(keys or {})
+    payloads = {}
+    for name, df in datasets.items():
+        key = keys.get(name) or frame_key(df)
+        keys[name] = key
+        payloads[name] = _encoded(name, key, df)
+    config_json = json.dumps(config or {}, sort_keys=True)
+    return _page(
+        tuple((name, keys[name]) for name in datasets),
+        config_json,
+        read_only,
+        center_map,
+        payloads,
+    )
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""Local, incrementally filled store for the measurement station's ``download.cgi`` feed.
+
+Measurements are kept in SQLite as ``(channel, ts) -> value, status`` and
+every successfully downloaded window is recorded per channel, so a query only
+downloads what is not stored yet. Per-bucket count/sum/min/max rollups (1 min,
+15 min, 1 h, 1 day) are maintained on insert, so long ranges are read at a
+resolution that keeps the number of points roughly constant. Missing time is split into day-aligned
+chunks that are fetched concurrently; channels missing the same chunk share
+one request.
+
+    python utils/messtation.py fetch --start 2025-09-29 --end 2025-10-01
+    python utils/messtation.py export --channels 12327,12333 --start 2025-09-29 --end 2025-10-01 --output m.csv
+
+The endpoint and login come from ``MESSTATION_URL``, ``MESSTATION_USER`` and
+``MESSTATION_PASSWORD``, so the store can run against a local stub.
+"""
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.downsample import DEFAULT_MAX_POINTS, ROLLUPS, merge_buckets, width_for
+from utils.snapshots import parse_decimal_comma
+
+DEFAULT_URL = os.environ.get(
+    "MESSTATION_URL", "http://176.66.66.28/cgi-bin/download.cgi"
+)
+DEFAULT_USER = os.environ.get("MESSTATION_USER", "admin")
+DEFAULT_PASSWORD = os.environ.get("MESSTATION_PASSWORD", "1AQuality")
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "messtation.sqlite",
+)
+DEFAULT_CHANNELS = [
+    12327,
+    12333,
+    12111,
+    12213,
+    12189,
+    12117,
+    12339,
+    12153,
+    12195,
+    12171,
+]
+CHUNK = timedelta(days=1)
+# Data this close to "now" may still change on the station and is never marked as
+# complete
+SETTLE = timedelta(minutes=30)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_seconds(ts: datetime) -> int:
+    return int(
+        (pd.Timestamp(ts).to_pydatetime().replace(tzinfo=None) - _EPOCH).total_seconds()
+    )
+
+
+def _from_seconds(seconds: int) -> datetime:
+    return _EPOCH + timedelta(seconds=int(seconds))
+
+
+def parse_channels(text: str) -> List[int]:
+    """``"12327,12333"`` -> ``[12327, 12333]``."""
+    return [int(c) for c in str(text).replace(" ", "").split(",") if c]
+
+
+def _parse_timestamps(values: pd.Series) -> pd.Series:
+    iso = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    if iso.notna().mean() >= 0.9:
+        return iso
+    return pd.to_datetime(values, format="mixed", dayfirst=True, errors="coerce")
+
+
+def parse_download(text: str, channels: Sequence[int]) -> pd.DataFrame:
+    """Long frame ``ts, channel, value, status`` from one ``download.cgi`` CSV response.
+
+    The response has a header line (``header_name``), the timestamp in the first
+    column and one value column per requested channel in request order, each
+    optionally followed by a column named ``...status...`` (``status`` flag).
+    Decimals use commas (``dec=COMMA``), so the separator is ``;`` or a tab.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return pd.DataFrame(
+            {
+                "ts": pd.Series(dtype="datetime64[ns]"),
+                "channel": pd.Series(dtype="int64"),
+                "value": pd.Series(dtype="float64"),
+                "status": pd.Series(dtype="string"),
+            }
+        )
+    sep = max([";", "\t", ","], key=lines[0].count)
+    df = pd.read_csv(io.StringIO("\n".join(lines)), sep=sep, dtype=str)
+    status_cols = {
+        i for i, c in enumerate(df.columns) if i > 0 and "status" in str(c).lower()
+    }
+    value_cols = [i for i in range(1, len(df.columns)) if i not in status_cols]
+    if len(value_cols) != len(channels):
+        raise ValueError(
+            f"Expected {len(channels)} value columns, got {len(value_cols)}: {list(df.columns)}"
+        )
+    ts = _parse_timestamps(df.iloc[:, 0])
+    frames = []
+    for channel, i in zip(channels, value_cols):
+        status = (
+            df.iloc[:, i + 1]
+            if i + 1 in status_cols
+            else pd.Series(pd.NA, index=df.index)
+        )
+        frames.append(
+            pd.DataFrame(
+                {
+                    "ts": ts,
+                    "channel": channel,
+                    "value": parse_decimal_comma(df.iloc[:, i]),
+                    "status": status.astype("string"),
+                }
+            )
+        )
+    out = pd.concat(frames, ignore_index=True)
+    return out[out["ts"].notna()]
+
+
+def _merge_intervals(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(
+    start: int, end: int, covered: List[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """Parts of ``[start, end)`` not in the (merged) ``covered`` intervals."""
+    gaps, cursor = [], start
+    for c_start, c_end in covered:
+        if c_end <= cursor or c_start >= end:
+            continue
+        if c_start > cursor:
+            gaps.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class StationStore:
+    """Append-only measurements plus the windows already downloaded, per channel."""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS measurements (channel INTEGER, ts INTEGER, value REAL, status TEXT,"
+            " PRIMARY KEY (channel, ts)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS coverage (channel INTEGER, start INTEGER, end INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS coverage_channel ON coverage (channel)"
+        )
+        has_rollups = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'rollups'"
+        ).fetchone()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups (width INTEGER, channel INTEGER, bucket INTEGER,"
+            " n INTEGER, sum REAL, min REAL, max REAL, PRIMARY KEY (width, channel, bucket)) WITHOUT ROWID"
+        )
+        if not has_rollups:
+            # Stores created before rollups existed
+            self._update_rollups(None, None, None)
+        self._conn.commit()
+
+    def _update_rollups(
+        self,
+        channels: Optional[Sequence[int]],
+        first: Optional[int],
+        last: Optional[int],
+    ) -> None:
+        """Recompute the rollup buckets touching ``[first, last]`` (everything when None); caller holds the lock."""
+        for width in ROLLUPS.values():
+            where, params = ["value IS NOT NULL"], [width, width, width]
+            if channels is not None:
+                where.append(f"channel IN ({','.join('?' * len(channels))})")
+                params += list(channels)
+            if first is not None:
+                where.append("ts >= ? AND ts < ?")
+                params += [first // width * width, (last // width + 1) * width]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rollups SELECT ?, channel, ts / ? * ? AS bucket, COUNT(value),"
+                f" SUM(value), MIN(value), MAX(value) FROM measurements WHERE {' AND '.join(where)}"
+                " GROUP BY channel, bucket",
+                params,
+            )
+
+    def coverage(self, channel: int) -> List[Tuple[int, int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start, end FROM coverage WHERE channel = ?", (channel,)
+            ).fetchall()
+        return _merge_intervals(rows)
+
+    def missing(
+        self, channels: Sequence[int], start: datetime, end: datetime
+    ) -> Dict[int, List[Tuple[datetime, datetime]]]:
+        """Per channel, the parts of ``[start, end)`` that were never downloaded."""
+        s, e = _to_seconds(start), _to_seconds(end)
+        return {
+            c: [
+                (_from_seconds(a), _from_seconds(b))
+                for a, b in _subtract(s, e, self.coverage(c))
+            ]
+            for c in channels
+        }
+
+    def add(
+        self,
+        measurements: pd.DataFrame,
+        channels: Sequence[int],
+        start: datetime,
+        end: datetime,
+    ) -> None:
+        """Store one downloaded window; ``[start, end)`` counts as complete for ``channels``."""
+        rows = zip(
+            measurements["channel"].astype("int64").tolist(),
+            (measurements["ts"].astype("datetime64[s]").astype("int64")).tolist(),
+            measurements["value"]
+            .astype("float64")
+            .where(measurements["value"].notna(), None)
+            .tolist(),
+            measurements["status"]
+            .astype("object")
+            .where(measurements["status"].notna(), None)
+            .tolist(),
+        )
+        s, e = _to_seconds(start), _to_seconds(end)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?)", rows
+            )
+            if len(measurements):
+                seconds = measurements["ts"].astype("datetime64[s]").astype("int64")
+                self._update_rollups(
+                    sorted(set(measurements["channel"].astype("int64").tolist())),
+                    int(seconds.min()),
+                    int(seconds.max()),
+                )
+            for channel in channels if e > s else ():
+                merged = _merge_intervals(
+                    self._conn.execute(
+                        "SELECT start, end FROM coverage WHERE channel = ?", (channel,)
+                    ).fetchall()
+                    + [(s, e)]
+                )
+                self._conn.execute("DELETE FROM coverage WHERE channel = ?", (channel,))
+                self._conn.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?)",
+                    [(channel, a, b) for a, b in merged],
+                )
+            self._conn.commit()
+
+    def query(
+        self, channels: Sequence[int], start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        """Stored measurements of ``channels`` in ``[start, end)``, long format sorted by channel and time."""
+        marks = ",".join("?" * len(channels))
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT channel, ts, value, status FROM measurements WHERE channel IN ({marks})"
+                " AND ts >= ? AND ts < ? ORDER BY channel, ts",
+                self._conn,
+                params=[*channels, _to_seconds(start), _to_seconds(end)],
+            )
+        df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        df["status"] = df["status"].astype("string")
+        return df[["ts", "channel", "value", "status"]]
+
+    def query_rollup(
+        self, channels: Sequence[int], start: datetime, end: datetime, width: int
+    ) -> pd.DataFrame:
+        """Buckets of ``width`` seconds (one of :data:`ROLLUPS`): ``ts, channel, count, mean, min, max``."""
+        marks = ",".join("?" * len(channels))
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT channel, bucket AS ts, n AS count, sum / n AS mean, min, max FROM rollups"
+                f" WHERE width = ? AND channel IN ({marks}) AND bucket >= ? AND bucket < ?"
+                " ORDER BY channel, bucket",
+                self._conn,
+                params=[
+                    width,
+                    *channels,
+                    _to_seconds(start) // width * width,
+                    _to_seconds(end),
+                ],
+            )
+        df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        return df[["ts", "channel", "count", "mean", "min", "max"]]
+
+    def count(self, channels: Sequence[int], start: datetime, end: datetime) -> int:
+        marks = ",".join("?" * len(channels))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM measurements WHERE channel IN ({marks}) AND ts >= ? AND ts < ?",
+                [*channels, _to_seconds(start), _to_seconds(end)],
+            ).fetchone()[0]
+
+    def series(
+        self,
+        channels: Sequence[int],
+        start: datetime,
+        end: datetime,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        """``ts, channel, mean, min, max`` with about ``max_points`` points per channel whatever the range,
+        and the bucket width in seconds (None for raw measurements).
+
+        Reads the nearest finer rollup and merges its buckets up to :func:`utils.downsample.width_for`.
+        """
+        if self.count(channels, start, end) <= max_points * max(len(channels), 1):
+            raw = self.query(channels, start, end)
+            return (
+                raw.assign(mean=raw["value"], min=raw["value"], max=raw["value"])[
+                    ["ts", "channel", "mean", "min", "max"]
+                ],
+                None,
+            )
+        width = width_for(_to_seconds(end) - _to_seconds(start), max_points)
+        rollup = max(w for w in ROLLUPS.values() if width % w == 0)
+        df = self.query_rollup(channels, start, end, rollup)
+        if width > rollup:
+            df = merge_buckets(df, width)
+        return df.drop(columns="count"), width
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class StationClient:
+    def __init__(
+        self,
+        url: str = DEFAULT_URL,
+        user: str = DEFAULT_USER,
+        password: str = DEFAULT_PASSWORD,
+        timeout: float = 60,
+        retries: int = 3,
+        backoff: float = 1.0,
+    ):
+        self.url, self.user, self.password = url, user, password
+        self.timeout, self.retries, self.backoff = timeout, retries, backoff
+        self.session = requests.Session()
+
+    def request_url(
+        self, channels: Sequence[int], start: datetime, end: datetime
+    ) -> str:
+        # download.cgi takes bare flags (header_name, nohtml, status), so the query is
+        # built by hand
+        return (
+            f"{self.url}?loginstring={self.user}&user_pw={self.password}&dec=COMMA&header_name&nohtml&status"
+            f"&avg3={','.join(str(c) for c in channels)}"
+            f"&tstart={start:%Y-%m-%d,%H:%M:%S}&tend={end:%Y-%m-%d,%H:%M:%S}"
+        )
+
+    def fetch(
+        self, channels: Sequence[int], start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        url = self.request_url(channels, start, end)
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                break
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+        df = parse_download(response.content.decode("latin-1"), channels)
+        # tend is inclusive on the station; the store works with half-open windows
+        return df[(df["ts"] >= start) & (df["ts"] < end)]
+
+
+def plan_requests(
+    missing: Dict[int, List[Tuple[datetime, datetime]]], chunk: timedelta = CHUNK
+) -> List[Tuple[Tuple[int, ...], datetime, datetime]]:
+    """Split the missing windows on a ``chunk`` grid; channels missing the same piece share a request."""
+    pieces: Dict[Tuple[datetime, datetime], List[int]] = {}
+    for channel, windows in missing.items():
+        for start, end in windows:
+            cell = datetime.combine(start.date(), datetime.min.time())
+            while cell < end:
+                piece = (max(start, cell), min(end, cell + chunk))
+                if piece[0] < piece[1]:
+                    pieces.setdefault(piece, []).append(channel)
+                cell += chunk
+    return [
+        (tuple(sorted(channels)), s, e) for (s, e), channels in sorted(pieces.items())
+    ]
+
+
+class Messtation:
+    """Measurements served from the local store, downloading only what is missing."""
+
+    def __init__(
+        self,
+        store: Optional[StationStore] = None,
+        client: Optional[StationClient] = None,
+        workers: int = 4,
+    ):
+        self.store = store or StationStore()
+        self.client = client or StationClient()
+        self.workers = workers
+
+    def update(
+        self,
+        channels: Sequence[int],
+        start: datetime,
+        end: datetime,
+        progress: Optional[Callable[[int, int], None]] = None,
+        recent: bool = True,
+    ) -> Tuple[int, List[str]]:
+        """Download the missing parts of ``[start, end)`` (up to now); returns ``(requests made, errors)``.
+
+        The last ``SETTLE`` is never complete, so it is downloaded again on every call unless ``recent`` is false.
+        """
+        now = datetime.now()
+        end = min(end, now)
+        settled = min(end, now - SETTLE)
+        plan = plan_requests(
+            self.store.missing(channels, start, end if recent else settled)
+        )
+        errors: List[str] = []
+        if not plan:
+            return 0, errors
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="messtation"
+        ) as pool:
+            futures = {
+                pool.submit(self.client.fetch, chans, s, e): (chans, s, e)
+                for chans, s, e in plan
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                chans, s, e = futures[future]
+                try:
+                    df = future.result()
+                except Exception as exc:
+                    errors.append(f"{s:%Y-%m-%d %H:%M}–{e:%Y-%m-%d %H:%M}: {exc}")
+                else:
+                    # Only the settled part is marked complete; recent data is fetched
+                    # again next time
+                    self.store.add(df, chans, s, max(s, min(e, settled)))
+                if progress:
+                    progress(done, len(plan))
+        return len(plan), errors
+
+    def get(
+        self,
+        channels: Sequence[int],
+        start: datetime,
+        end: datetime,
+        refresh: bool = True,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> pd.DataFrame:
+        """Long-format measurements of ``channels`` in ``[start, end)``."""
+        if refresh:
+            self.update(channels, start, end, progress)
+        return self.store.query(channels, start, end)
+
+
+def to_wide(df: pd.DataFrame) -> pd.DataFrame:
+    """One column per channel, indexed by timestamp."""
+    return df.pivot_table(
+        index="ts", columns="channel", values="value", aggfunc="first"
+    ).sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download and query measurement station data."
+    )
+    parser.add_argument("command", choices=["fetch", "export"])
+    parser.add_argument(
+        "--channels",
+        default=",".join(str(c) for c in DEFAULT_CHANNELS),
+        help="Comma-separated channel ids (avg3=...)",
+    )
+    parser.add_argument(
+        "--start",
+        required=True,
+        help="Start (inclusive), e.g. 2025-09-29 or 2025-09-29T06:00",
+    )
+    parser.add_argument("--end", required=True, help="End (exclusive)")
+    parser.add_argument(
+        "--store",
+        default=DEFAULT_STORE_PATH,
+        help=f"SQLite store (default: {DEFAULT_STORE_PATH})",
+    )
+    parser.add_argument("--url", default=DEFAULT_URL, help="download.cgi endpoint")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Export from the store without downloading",
+    )
+    parser.add_argument(
+        "--output", default=None, help="CSV file for export (default: stdout)"
+    )
+    args = parser.parse_args()
+
+    try:
+        channels = parse_channels(args.channels)
+        start, end = (
+            pd.Timestamp(args.start).to_pydatetime(),
+            pd.Timestamp(args.end).to_pydatetime(),
+        )
+    except ValueError as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    station = Messtation(
+        StationStore(args.store), StationClient(args.url), workers=args.workers
+    )
+
+    if not args.offline:
+        made, errors = station.update(
+            channels,
+            start,
+            end,
+            progress=lambda done, total: print(
+                f"\r{done}/{total} requests", end="", flush=True
+            ),
+        )
+        print(
+            f"\n{made} requests, {len(errors)} failed"
+            if made
+            else "Everything already stored"
+        )
+        for error in errors:
+            sys.stderr.write(f"{error}\n")
+    if args.command == "export":
+        wide = to_wide(station.store.query(channels, start, end))
+        wide.to_csv(args.output or sys.stdout, sep=";", decimal=",")
+        if args.output:
+            print(f"Wrote {len(wide)} rows to {args.output}")
+    station.store.close()
+
+
+if __name__ == "__main__":
+    main()
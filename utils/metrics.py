@@ -0,0 +1,241 @@
+"""Lightweight run metrics: stage timers, histograms, counters and peak memory.
+
+A :class:`Metrics` collects where one run (a CLI invocation, a geocoding job)
+spends its time. Code deep in the stack (HTTP requests, the rate limiter,
+retries, the geocode cache) records into whichever collector is active via
+:func:`current`, installed for a block with :func:`recording`; without one,
+recording does nothing. The engine's worker threads inherit the collector of
+the thread that started them.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds (seconds) of the histogram buckets; one more bucket catches everything
+# above
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far (None where unavailable)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Histogram:
+    """Counts per bucket plus count/sum/min/max; percentiles are interpolated within buckets."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6),
+            "min": round(self.min, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max, 6),
+            "buckets": [
+                [le, n] for le, n in zip(list(self.buckets) + [None], self.counts)
+            ],
+        }
+
+
+class Metrics:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Any] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: Optional[int] = None) -> Iterator[None]:
+        """Time a block; repeated stages add up. ``rows`` gives the stage a rows/s figure."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start, rows)
+
+    def add_stage(self, name: str, seconds: float, rows: Optional[int] = None) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+            if rows is not None:
+                entry["rows"] = entry.get("rows", 0) + rows
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                stages[name] = {"seconds": round(s["seconds"], 4), "calls": s["calls"]}
+                if "rows" in s:
+                    stages[name]["rows"] = s["rows"]
+                    stages[name]["rows_per_s"] = (
+                        round(s["rows"] / s["seconds"], 1) if s["seconds"] else None
+                    )
+            hits, misses = self.counters.get("cache_hits", 0), self.counters.get(
+                "cache_misses", 0
+            )
+            return {
+                "name": self.name,
+                "started": time.strftime(
+                    "%Y-%m-%dT%H:%M:%S", time.localtime(self.started)
+                ),
+                "elapsed_s": round(time.perf_counter() - self._start, 3),
+                "peak_rss_mb": peak_rss_mb(),
+                "cache_hit_ratio": (
+                    round(hits / (hits + misses), 4) if hits + misses else None
+                ),
+                "stages": stages,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {
+                    name: h.to_dict() for name, h in self.histograms.items()
+                },
+            }
+
+    def summary(self) -> str:
+        """One line: the slowest stages, request latency and waits."""
+        data = self.to_dict()
+        parts = [
+            f"{name} {s['seconds']:.2f}s"
+            for name, s in sorted(
+                data["stages"].items(), key=lambda item: -item[1]["seconds"]
+            )[:4]
+        ]
+        latency = data["histograms"].get("http_latency_s", {})
+        if latency.get("count"):
+            parts.append(
+                f"{latency['count']} requests p50 {latency['p50'] * 1000:.0f}ms p99 {latency['p99'] * 1000:.0f}ms"
+            )
+        wait = data["histograms"].get("rate_limit_wait_s", {})
+        if wait.get("count"):
+            parts.append(f"rate-limit wait {wait['sum']:.1f}s")
+        if data["counters"].get("retries"):
+            parts.append(f"{int(data['counters']['retries'])} retries")
+        if data["peak_rss_mb"] is not None:
+            parts.append(f"peak {data['peak_rss_mb']:.0f} MB")
+        return "Metrics: " + ", ".join(parts)
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+        os.replace(tmp_path, path)
+
+
+class _NullMetrics(Metrics):
+    """Collector used when nothing is recording: every call is a no-op."""
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: Optional[int] = None) -> Iterator[None]:
+        yield
+
+    def add_stage(self, name: str, seconds: float, rows: Optional[int] = None) -> None:
+        pass
+
+    def observe(self, name: str, value: float) -> None:
+        pass
+
+    def count(self, name: str, n: float = 1) -> None:
+        pass
+
+    def gauge(self, name: str, value: Any) -> None:
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+_CURRENT: ContextVar[Optional[Metrics]] = ContextVar("metrics", default=None)
+
+
+def current() -> Metrics:
+    """The collector of the enclosing :func:`recording` block, or a no-op one."""
+    return _CURRENT.get() or NULL_METRICS
+
+
+@contextlib.contextmanager
+def recording(metrics: Metrics) -> Iterator[Metrics]:
+    token = _CURRENT.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _CURRENT.reset(token)
@@ -0,0 +1,121 @@
+"""Batch reprojection of point coordinates to WGS84 by their EPSG code.
+
+Field data mixes WGS84 with MGI/Austria GK (EPSG:31254-31256) and UTM. Rows
+are grouped by EPSG code and every group is transformed in one vectorized
+pyproj call; transformers are built once per CRS pair. Projected coordinates
+are expected as easting in the ``lon`` column and northing in the ``lat``
+column; rows that land outside the CRS's area of use that way but inside it
+with the two swapped (a common mix-up in hand-typed Rechts-/Hochwerte) are
+read swapped.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from pyproj import CRS, Transformer
+from pyproj.exceptions import CRSError
+
+WGS84 = 4326
+# Degrees a point may lie outside the CRS's area of use and still count as inside
+AREA_MARGIN = 1.0
+
+
+@lru_cache(maxsize=64)
+def transformer(source: int, target: int = WGS84) -> Transformer:
+    """Shared ``always_xy`` transformer for one CRS pair (pyproj transformers are thread-safe)."""
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+@lru_cache(maxsize=64)
+def _area(epsg: int):
+    area = CRS.from_epsg(epsg).area_of_use
+    if area is None:
+        return -180.0, -90.0, 180.0, 90.0
+    return (
+        area.west - AREA_MARGIN,
+        area.south - AREA_MARGIN,
+        area.east + AREA_MARGIN,
+        area.north + AREA_MARGIN,
+    )
+
+
+def _inside(lon: np.ndarray, lat: np.ndarray, area) -> np.ndarray:
+    west, south, east, north = area
+    return (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+
+
+class Reprojected(NamedTuple):
+    lat: np.ndarray
+    lon: np.ndarray
+    # rows with a non-WGS84 EPSG code that were transformed
+    transformed: np.ndarray
+    # rows whose EPSG code is unknown to PROJ or whose coordinates could not be placed
+    # (lat/lon are NaN)
+    failed: np.ndarray
+
+
+def to_wgs84(x, y, epsg, default: int = WGS84) -> Reprojected:
+    """WGS84 ``lat``/``lon`` for points ``(x, y)`` given in the CRS of their row's ``epsg`` code.
+
+    Rows without a code are taken as ``default``.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    codes = pd.array(epsg, dtype="Int64").fillna(default).to_numpy(dtype="int64")
+    lat, lon = y.copy(), x.copy()
+    transformed = np.zeros(len(x), dtype=bool)
+    failed = np.zeros(len(x), dtype=bool)
+    for code in np.unique(codes):
+        if code == WGS84:
+            continue
+        rows = np.flatnonzero(codes == code)
+        try:
+            to = transformer(int(code))
+            area = _area(int(code))
+        except CRSError:
+            lat[rows] = lon[rows] = np.nan
+            failed[rows] = True
+            continue
+        gx, gy = (
+            np.asarray(v, dtype="float64") for v in to.transform(x[rows], y[rows])
+        )
+        outside = np.flatnonzero(~_inside(gx, gy, area))
+        if len(outside):
+            sx, sy = (
+                np.asarray(v, dtype="float64")
+                for v in to.transform(y[rows][outside], x[rows][outside])
+            )
+            swap = _inside(sx, sy, area)
+            gx[outside[swap]], gy[outside[swap]] = sx[swap], sy[swap]
+        bad = ~np.isfinite(gx) | ~np.isfinite(gy)
+        lon[rows], lat[rows] = np.where(bad, np.nan, gx), np.where(bad, np.nan, gy)
+        transformed[rows] = ~bad
+        failed[rows] = bad & ~(np.isnan(x[rows]) | np.isnan(y[rows]))
+    return Reprojected(lat, lon, transformed, failed)
+
+
+def reproject_frame(
+    df: pd.DataFrame,
+    lat_col: str = "lat",
+    lon_col: str = "lon",
+    epsg_col: str = "EPSG",
+    default: int = WGS84,
+) -> pd.DataFrame:
+    """``df`` with ``lat_col``/``lon_col`` in WGS84; the values as read are kept in ``source_y``/``source_x``."""
+    result = to_wgs84(
+        df[lon_col],
+        df[lat_col],
+        df[epsg_col] if epsg_col in df.columns else [pd.NA] * len(df),
+        default,
+    )
+    return df.assign(
+        **{
+            "source_x": df[lon_col],
+            "source_y": df[lat_col],
+            lat_col: result.lat,
+            lon_col: result.lon,
+            "reprojected": result.transformed,
+        }
+    )
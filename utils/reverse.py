@@ -0,0 +1,181 @@
+"""Reverse geocoding of coordinate columns on a snapped grid.
+
+Points are snapped to cells of about ``grid_m`` metres and every distinct cell
+is looked up once, at its centre, through the same rate-limited engine and
+cache as forward geocoding. Boreholes and sites clustered on one plot thus
+cost one request instead of one each, and a later run over the same area is
+answered from the cache.
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+from utils.addresses import (
+    PROGRESS_INTERVAL,
+    broadcast_results,
+    clean_addresses,
+    result_frame,
+    throttled,
+)
+from utils.geocoder import reverse_query
+from utils.snapshots import parse_decimal_comma
+
+if TYPE_CHECKING:
+    from utils.geocoder import GeocodingEngine
+
+REVERSE_COLUMNS = ["rev_status", "rev_address", "rev_precision_hint", "rev_source"]
+REVERSE_DTYPES = {
+    "rev_status": "category",
+    "rev_address": "string",
+    "rev_precision_hint": "category",
+    "rev_source": "category",
+}
+DEFAULT_GRID_M = 10.0
+# Nominatim zoom 18: building/address level
+DEFAULT_ZOOM = 18
+METERS_PER_DEGREE = 111_320.0
+# Geocoding result field -> reverse column
+_FIELDS = {
+    "geo_status": "rev_status",
+    "geo_display_name": "rev_address",
+    "geo_precision_hint": "rev_precision_hint",
+    "geo_source": "rev_source",
+}
+_COORDINATE_PAIRS = [("breite", "laenge"), ("latitude", "longitude"), ("lat", "lon")]
+
+
+def detect_coordinate_columns(
+    columns, lat_col: Optional[str] = None, lon_col: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """``(lat, lon)`` column names, given explicitly (case-insensitive) or by common names."""
+    by_lower = {str(c).lower(): c for c in columns}
+    if lat_col or lon_col:
+        return by_lower.get(str(lat_col).lower()), by_lower.get(str(lon_col).lower())
+    for lat, lon in _COORDINATE_PAIRS:
+        if lat in by_lower and lon in by_lower:
+            return by_lower[lat], by_lower[lon]
+    return None, None
+
+
+def snap_points(
+    lat, lon, grid_m: float = DEFAULT_GRID_M
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return ``(codes, cell_lat, cell_lon)``: every point's grid cell (-1 for missing or invalid
+    coordinates) and the centre of each distinct cell, numbered in order of first appearance.
+
+    Cells are ``grid_m`` metres high; their width in degrees of longitude
+    follows their latitude, so they stay about ``grid_m`` metres wide.
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    valid = (
+        np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    )
+    dlat = grid_m / METERS_PER_DEGREE
+    row = np.where(valid, np.round(lat / dlat), 0).astype("int64")
+    dlon = grid_m / (
+        METERS_PER_DEGREE * np.maximum(np.cos(np.radians(row * dlat)), 0.01)
+    )
+    col = np.where(valid, np.round(lon / dlon), 0).astype("int64")
+    rows, cols = row[valid], col[valid]
+    height = width = 1
+    if len(rows):
+        rows, cols = rows - rows.min(), cols - cols.min()
+        height, width = int(rows.max()) + 1, int(cols.max()) + 1
+    # One int64 per cell hashes much faster than (row, col) pairs, which only tiny grids
+    # over large areas need
+    keys = (
+        rows * width + cols
+        if height < 2**62 // width
+        else pd.MultiIndex.from_arrays([rows, cols])
+    )
+    cell_codes, _ = pd.factorize(keys)
+    codes = np.full(len(lat), -1, dtype="int64")
+    codes[valid] = cell_codes
+    # Codes follow first appearance, so the first row of each cell gives its centre
+    _, first = np.unique(cell_codes, return_index=True)
+    firsts = np.flatnonzero(valid)[first]
+    return codes, row[firsts] * dlat, col[firsts] * dlon[firsts]
+
+
+def cell_queries(
+    lat, lon, grid_m: float = DEFAULT_GRID_M
+) -> Tuple[np.ndarray, List[str]]:
+    """``(codes, queries)``: each row's cell as in :func:`snap_points` and one reverse query per cell."""
+    codes, cell_lat, cell_lon = snap_points(lat, lon, grid_m)
+    return codes, [
+        reverse_query(a, b) for a, b in zip(cell_lat.tolist(), cell_lon.tolist())
+    ]
+
+
+def reverse_geocode_points(
+    lat: pd.Series,
+    lon: pd.Series,
+    engine: "GeocodingEngine",
+    params: Optional[Dict[str, Any]] = None,
+    grid_m: float = DEFAULT_GRID_M,
+    progress: Optional[Callable[[int, int], None]] = None,
+    known: Optional[Dict[str, Dict[str, Any]]] = None,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    progress_interval: float = PROGRESS_INTERVAL,
+) -> Tuple[pd.DataFrame, str]:
+    """Reverse geocode each distinct grid cell once and fan the results out to all rows.
+
+    ``lat``/``lon`` may hold decimal-comma strings. Works like
+    ``utils.addresses.geocode_addresses``: ``known`` and ``on_result`` are
+    keyed by the cell's reverse query. Returns a frame with
+    ``REVERSE_COLUMNS`` aligned to ``lat`` (``rev_status == "no_coordinates"``
+    where a point is missing) and a one-line summary.
+    """
+    recorder = metrics.current()
+    with recorder.stage("snap", rows=len(lat)):
+        codes, queries = cell_queries(
+            parse_decimal_comma(lat), parse_decimal_comma(lon), grid_m
+        )
+        params = {"zoom": DEFAULT_ZOOM, **(params or {})}
+        known = known or {}
+        reused = np.array([q in known for q in queries], dtype=bool)
+        pending = [q for q, r in zip(queries, reused) if not r]
+    callback = (lambda i, result: on_result(pending[i], result)) if on_result else None
+    with recorder.stage("reverse_geocoding", rows=len(pending)):
+        records = engine.reverse_many(
+            pending, params, throttled(progress, progress_interval), on_result=callback
+        )
+    with recorder.stage("assembly", rows=len(lat)):
+        ordered: List[Dict[str, Any]] = [{}] * len(queries)
+        for pos in np.flatnonzero(reused):
+            ordered[pos] = known[queries[pos]]
+        for pos, record in zip(np.flatnonzero(~reused), records):
+            ordered[pos] = record
+        cells = result_frame(
+            [{_FIELDS[k]: v for k, v in r.items() if k in _FIELDS} for r in ordered],
+            dtypes=REVERSE_DTYPES,
+        )
+        out = broadcast_results(
+            codes,
+            cells,
+            lat.index,
+            missing={"rev_status": "no_coordinates"},
+            dtypes=REVERSE_DTYPES,
+        )
+    recorder.gauge("grid_cells", len(queries))
+    located = int((codes >= 0).sum())
+    ratio = (len(queries) / located * 100) if located else 0.0
+    summary = f"Unique cells ({grid_m:g} m grid): {len(queries)} / {located} rows with coordinates ({ratio:.1f}%)"
+    if reused.any():
+        summary += f", {int(reused.sum())} reused from earlier results"
+    return out, summary
+
+
+def fill_addresses(
+    current: Optional[pd.Series], results: pd.DataFrame, overwrite: bool = False
+) -> pd.Series:
+    """``current`` addresses with empty ones (or all, with ``overwrite``) replaced by found ``rev_address``es."""
+    found = results["rev_address"].where(results["rev_status"].eq("ok"))
+    if current is None:
+        return found
+    current = clean_addresses(current)
+    return found.fillna(current) if overwrite else current.fillna(found)
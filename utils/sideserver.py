@@ -0,0 +1,182 @@
+"""HTTP server thread next to Streamlit for responses Streamlit cannot stream itself.
+
+Streamlit has no route for map tiles and keeps every ``st.download_button``
+payload in memory, so both are served from a second port instead
+(``TILE_SERVER_PORT``, default 8766; 0 disables it). It listens on
+``TILE_SERVER_HOST``, by default only on 127.0.0.1; set it to ``0.0.0.0`` when
+browsers on other machines load the app directly. Modules register a
+handler for a path prefix with :func:`route`; :func:`publish` makes a single
+file available under an unguessable ``/files/`` URL for ``FILE_TTL`` seconds
+and sends it in blocks.
+Behind a proxy, ``TILE_SERVER_URL`` is the server's public base URL. Without
+it, :func:`reachable_server` only hands the server to pages when the browser can
+connect to it on the page's host.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import ParseResult, quote, urlparse
+
+import streamlit as st
+
+DEFAULT_PORT = int(os.environ.get("TILE_SERVER_PORT", 8766))
+DEFAULT_HOST = os.environ.get("TILE_SERVER_HOST", "127.0.0.1")
+LOOPBACK = {"localhost", "127.0.0.1", "::1"}
+BLOCK_SIZE = 1 << 20
+# Published downloads expire after this many seconds (pages publish again on every
+# rerun) ...
+FILE_TTL = 3600
+# ... and only the most recently published ones are kept
+MAX_FILES = 256
+
+# path prefix -> handler(request, parsed url)
+ROUTES: Dict[str, Callable[[BaseHTTPRequestHandler, ParseResult], None]] = {}
+# token -> (path, download file name, MIME type, expiry), oldest first
+_FILES: "OrderedDict[str, Tuple[str, str, str, float]]" = OrderedDict()
+_FILES_LOCK = threading.Lock()
+_SECRET = os.urandom(16)
+_FILE_PATH = re.compile(r"^/files/(\w+)/[^/]+$")
+
+
+def route(prefix: str):
+    """Register the decorated function for requests whose path starts with ``prefix``."""
+
+    def register(handler):
+        ROUTES[prefix] = handler
+        return handler
+
+    return register
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        for prefix, handler in ROUTES.items():
+            if url.path.startswith(prefix):
+                handler(self, url)
+                return
+        self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SideServer:
+    def __init__(self, port: int = DEFAULT_PORT, host: str = DEFAULT_HOST):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="side-server", daemon=True
+        )
+        self.thread.start()
+
+
+@st.cache_resource
+def side_server() -> Optional[SideServer]:
+    """The process-wide server, or None if disabled (``TILE_SERVER_PORT=0``) or the port is taken."""
+    if DEFAULT_PORT == 0:
+        return None
+    try:
+        return SideServer(DEFAULT_PORT)
+    except OSError:
+        return None
+
+
+def _page_host() -> str:
+    """Host name the browser used for the Streamlit page."""
+    return urlparse("//" + (st.context.headers.get("Host") or "localhost")).hostname
+
+
+def reachable_server() -> Optional[SideServer]:
+    """The side server if the browser of this session can reach it, else None.
+
+    That is the case when ``TILE_SERVER_URL`` is set, when the server listens on
+    more than loopback, or when the page itself was loaded from this machine.
+    """
+    server = side_server()
+    if server is None:
+        return None
+    if (
+        os.environ.get("TILE_SERVER_URL")
+        or DEFAULT_HOST not in LOOPBACK
+        or _page_host() in LOOPBACK
+    ):
+        return server
+    return None
+
+
+def base_url(server: SideServer) -> str:
+    """``TILE_SERVER_URL``, or the scheme and host of the Streamlit page on the server's port."""
+    configured = os.environ.get("TILE_SERVER_URL")
+    if configured:
+        return configured.rstrip("/")
+    scheme = urlparse(st.context.url or "").scheme or "http"
+    host = _page_host()
+    return f"{scheme}://{f'[{host}]' if ':' in host else host}:{server.port}"
+
+
+def publish(path: str, file_name: str, mime: str) -> str:
+    """URL path under which the server streams ``path`` as an attachment named ``file_name``.
+
+    The token changes with the file's modification time, so a rewritten file gets a new URL.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}".encode("utf-8")
+    token = hashlib.sha256(_SECRET + key).hexdigest()[:32]
+    now = time.monotonic()
+    with _FILES_LOCK:
+        _FILES[token] = (path, file_name, mime, now + FILE_TTL)
+        _FILES.move_to_end(token)
+        while _FILES and (
+            len(_FILES) > MAX_FILES or next(iter(_FILES.values()))[3] < now
+        ):
+            _FILES.popitem(last=False)
+    return f"/files/{token}/{quote(file_name)}"
+
+
+@route("/files/")
+def _serve_file(request: BaseHTTPRequestHandler, url: ParseResult) -> None:
+    m = _FILE_PATH.match(url.path)
+    with _FILES_LOCK:
+        entry = _FILES.get(m.group(1)) if m else None
+    if entry is None or entry[3] < time.monotonic() or not os.path.exists(entry[0]):
+        request.send_error(404)
+        return
+    path, file_name, mime, _ = entry
+    with open(path, "rb") as fh:
+        request.send_response(200)
+        request.send_header("Content-Type", mime)
+        request.send_header("Content-Length", str(os.fstat(fh.fileno()).st_size))
+        request.send_header(
+            "Content-Disposition", f"attachment; filename*=UTF-8''{quote(file_name)}"
+        )
+        request.end_headers()
+        shutil.copyfileobj(fh, request.wfile, BLOCK_SIZE)
+
+
+def download_button(
+    label: str, path: str, file_name: str, mime: str, key: Optional[str] = None
+) -> None:
+    """Download ``path`` streamed from the side server; if the browser cannot reach it, fall back to
+    ``st.download_button``, which reads the file only when clicked."""
+    server = reachable_server()
+    if server is not None:
+        st.link_button(
+            label, base_url(server) + publish(path, file_name, mime), key=key
+        )
+        return
+
+    def data() -> bytes:
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    st.download_button(
+        label, data=data, file_name=file_name, mime=mime, key=key, on_click="ignore"
+    )
@@ -0,0 +1,284 @@
+"""Reading CRM project exports and diffing two snapshots of them."""
+
+import codecs
+import os
+import re
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils import excelio
+
+ID_COLUMN = "Projekt"
+CHECKSUM_COLUMN = "Zeilenprüfsumme"
+MODIFIED_COLUMN = "Geändert am"
+ADDRESS_COLUMN = "Vollstaendige Adresse (Verortung)"
+LAT_COLUMN = "Breite"
+LON_COLUMN = "Laenge"
+
+# Column names as they should appear after ingest; exports regularly arrive with broken
+# umlauts (latin-1 mojibake or U+FFFD), so names are matched on ASCII letters only
+CANONICAL_COLUMNS = [
+    ID_COLUMN,
+    CHECKSUM_COLUMN,
+    MODIFIED_COLUMN,
+    "Projektbezeichnung",
+    "Team",
+    LAT_COLUMN,
+    LON_COLUMN,
+    ADDRESS_COLUMN,
+]
+# Fallbacks for dumps without the CRM's UUID/checksum (e.g. the full project workbook)
+ID_FALLBACKS = ["Nummer"]
+MODIFIED_FALLBACKS = ["Modified On"]
+COORDINATE_COLUMNS = [LAT_COLUMN, LON_COLUMN, "lat", "lon"]
+# Spreads the occurrence number of a repeated id over the whole 64-bit key space
+_OCCURRENCE_STEP = np.uint64(0x9E3779B97F4A7C15)
+
+_NON_ASCII_LETTERS = re.compile(r"[^a-z0-9()]")
+
+
+def _ascii_key(name: str) -> str:
+    return _NON_ASCII_LETTERS.sub("", str(name).lower())
+
+
+_CANONICAL_KEYS = {_ascii_key(c): c for c in CANONICAL_COLUMNS}
+
+
+def canonical_name(name):
+    return _CANONICAL_KEYS.get(_ascii_key(name), name)
+
+
+def canonical_columns(df: pd.DataFrame) -> pd.DataFrame:
+    renames = {c: canonical_name(c) for c in df.columns if canonical_name(c) != c}
+    return df.rename(columns=renames) if renames else df
+
+
+def parse_decimal_comma(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    return pd.to_numeric(
+        series.astype("string").str.strip().str.replace(",", ".", regex=False),
+        errors="coerce",
+    ).astype("float64")
+
+
+def read_csv_export(path, **kwargs) -> pd.DataFrame:
+    """Read a ``;``-separated CRM CSV that may be UTF-8 or latin-1 encoded."""
+    try:
+        return pd.read_csv(path, sep=";", encoding="utf-8-sig", **kwargs)
+    except UnicodeDecodeError:
+        if hasattr(path, "seek"):
+            path.seek(0)
+        return pd.read_csv(path, sep=";", encoding="latin-1", **kwargs)
+
+
+def csv_encoding(path: str) -> str:
+    """``utf-8-sig`` if the whole file decodes as UTF-8, else ``latin-1``; reads the file in blocks."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as fh:
+        try:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return "latin-1"
+    return "utf-8-sig"
+
+
+def _is_csv(path) -> bool:
+    return str(getattr(path, "name", path)).lower().endswith(".csv")
+
+
+def _normalize_export(df: pd.DataFrame) -> pd.DataFrame:
+    df = canonical_columns(df)
+    for col in COORDINATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_decimal_comma(df[col])
+    return df
+
+
+def export_columns(path, sheet_name=0) -> List[str]:
+    """Canonical column names of a project export, reading only its header."""
+    if _is_csv(path):
+        return [
+            canonical_name(c) for c in read_csv_export(path, dtype=str, nrows=0).columns
+        ]
+    return [canonical_name(c) for c in excelio.read_header(path, sheet_name)]
+
+
+def read_project_export(
+    path, sheet_name=0, columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    """Read a project export (CSV or Excel) with canonical column names and float coordinates.
+
+    ``columns`` (canonical names) limits what is read; names the export lacks are ignored.
+    """
+    wanted = set(columns) if columns is not None else None
+    if _is_csv(path):
+        usecols = (
+            (lambda c: canonical_name(c) in wanted) if wanted is not None else None
+        )
+        df = read_csv_export(path, dtype=str, usecols=usecols)
+    else:
+        header = excelio.read_header(path, sheet_name)
+        raw = (
+            [c for c in header if canonical_name(c) in wanted]
+            if wanted is not None
+            else None
+        )
+        df = excelio.read_excel(path, sheet_name, columns=raw)
+    return _normalize_export(df)
+
+
+def iter_project_export(
+    path: str,
+    sheet_name=0,
+    chunk_rows: int = excelio.CHUNK_ROWS,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """:func:`read_project_export` of a file path in chunks of ``chunk_rows`` rows (index continues across chunks),
+    optionally limited to ``columns`` as there."""
+    wanted = set(columns) if columns is not None else None
+    if _is_csv(path):
+        usecols = (
+            (lambda c: canonical_name(c) in wanted) if wanted is not None else None
+        )
+        with pd.read_csv(
+            path,
+            sep=";",
+            encoding=csv_encoding(path),
+            dtype=str,
+            usecols=usecols,
+            chunksize=chunk_rows,
+        ) as reader:
+            for chunk in reader:
+                yield _normalize_export(chunk)
+        return
+    raw = None
+    if wanted is not None:
+        raw = [
+            c
+            for c in excelio.read_header(path, sheet_name)
+            if canonical_name(c) in wanted
+        ]
+    for chunk in excelio.iter_excel(
+        path, sheet_name, columns=raw, chunk_rows=chunk_rows
+    ):
+        yield _normalize_export(chunk)
+
+
+def _first_present(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
+    return next((c for c in candidates if c in df.columns), None)
+
+
+def id_column(df: pd.DataFrame) -> Optional[str]:
+    return _first_present(df, [ID_COLUMN] + ID_FALLBACKS)
+
+
+def row_keys(ids: pd.Series) -> np.ndarray:
+    """64-bit key per row: a hash of the project id plus its occurrence, as some dumps repeat an id
+    (the n-th occurrences in two snapshots are paired)."""
+    ids = ids.astype("string").fillna("")
+    occurrence = ids.groupby(ids, sort=False).cumcount().to_numpy(dtype="uint64")
+    # Ids are nearly unique, so factorizing them first (categorize) would only cost time
+    return (
+        pd.util.hash_array(ids.to_numpy(dtype=object), categorize=False)
+        + occurrence * _OCCURRENCE_STEP
+    )
+
+
+def version_columns(df: pd.DataFrame, exclude: Optional[List[str]] = None) -> List[str]:
+    """Columns whose values identify a row's version: the CRM's checksum and modified timestamp where the
+    export has a checksum, otherwise all (non-excluded) columns."""
+    if CHECKSUM_COLUMN in df.columns:
+        modified = _first_present(df, [MODIFIED_COLUMN] + MODIFIED_FALLBACKS)
+        return [CHECKSUM_COLUMN] + ([modified] if modified else [])
+    excluded = set(exclude or [])
+    return [c for c in df.columns if c not in excluded]
+
+
+def content_hashes(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """64-bit hash per row of ``columns``."""
+    return pd.util.hash_pandas_object(
+        df[list(columns)].astype("string"), index=False, categorize=False
+    ).to_numpy()
+
+
+def match_rows(previous_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Position in ``previous_keys`` of every key in ``keys`` (-1 where absent), through a hash index."""
+    index = pd.Index(previous_keys)
+    if not index.is_unique:
+        raise ValueError("Row keys of the snapshot collide")
+    return index.get_indexer(keys)
+
+
+class ExportDiff(NamedTuple):
+    # "new", "changed" or "unchanged" for every row of the newer export (aligned to its
+    # index)
+    status: pd.Series
+    # rows of the older export whose id no longer appears
+    deleted: pd.DataFrame
+
+    def counts(self) -> dict:
+        counts = self.status.value_counts()
+        return {s: int(counts.get(s, 0)) for s in ("new", "changed", "unchanged")} | {
+            "deleted": len(self.deleted)
+        }
+
+    def summary(self) -> str:
+        c = self.counts()
+        return f"New: {c['new']}, changed: {c['changed']}, unchanged: {c['unchanged']}, deleted: {c['deleted']}"
+
+
+def diff_exports(
+    new: pd.DataFrame, previous: pd.DataFrame, exclude: Optional[List[str]] = None
+) -> ExportDiff:
+    """Classify rows of ``new`` against ``previous`` by project id, checksum and modified timestamp.
+
+    ``exclude`` lists columns ignored when a checksum has to be computed
+    (e.g. the geocoding result columns of a previous ``_geocoded`` file).
+    """
+    key = id_column(new)
+    if key is None or key not in previous.columns:
+        raise KeyError(
+            f"Both exports need a project id column ({[ID_COLUMN] + ID_FALLBACKS})"
+        )
+    exclude = list(exclude or []) + [
+        c for c in previous.columns if c not in new.columns
+    ]
+    columns = [c for c in version_columns(new, exclude) if c in previous.columns]
+    pos = match_rows(row_keys(previous[key]), row_keys(new[key]))
+    found = pos >= 0
+    changed = (
+        content_hashes(new, columns)
+        != content_hashes(previous, columns)[np.where(found, pos, 0)]
+    )
+    status = np.select([~found, changed], ["new", "changed"], "unchanged")
+
+    still_there = np.zeros(len(previous), dtype=bool)
+    still_there[pos[found]] = True
+    return ExportDiff(
+        pd.Series(status, index=new.index, name="change"), previous[~still_there]
+    )
+
+
+def align_previous(
+    new: pd.DataFrame, previous: pd.DataFrame, columns: List[str]
+) -> pd.DataFrame:
+    """``previous[columns]`` re-indexed onto the rows of ``new`` by project id (NaN where absent)."""
+    key = id_column(new)
+    left = pd.DataFrame({"_id": new[key].astype("string")}, index=new.index)
+    left["_occ"] = left.groupby("_id").cumcount()
+    right = previous[[c for c in columns if c in previous.columns]].copy()
+    right["_id"] = previous[key].astype("string")
+    right["_occ"] = right.groupby("_id").cumcount()
+    aligned = left.merge(right, on=["_id", "_occ"], how="left").drop(
+        columns=["_id", "_occ"]
+    )
+    return aligned.set_axis(new.index).reindex(columns=columns)
+
+
+def output_path_for(input_path: str, suffix: str = "_geocoded.xlsx") -> str:
+    return os.path.splitext(input_path)[0] + suffix
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Grid spatial index over lat/lon points with bbox, radius, k-nearest and bulk join queries.
+
+Points are bucketed into fixed-size lat/lon cells and sorted by cell id, so a
+query only touches the cells it overlaps (found with ``np.searchsorted``) and
+measures exact haversine distances on those candidates. The bulk join is fully
+vectorized: the only Python loop runs over neighbouring cell offsets.
+
+    python utils/spatial.py radius --lat 47.8 --lon 13.04 --km 5
+    python utils/spatial.py nearest --lat 47.8 --lon 13.04 --k 3
+    python utils/spatial.py bbox --south 47 --west 12 --north 48 --east 14
+    python utils/spatial.py join --km 2 --output projects_boreholes.csv
+"""
+import argparse
+import math
+import os
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import datastore
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_DEG = 0.05
+TEST_COLUMNS = [
+    "Bohrung",
+    "SPT",
+    "Schurf",
+    "DPH",
+    "CPT",
+    "GPH",
+    "DLP",
+    "Feldversuch",
+    "Versickerung",
+    "Wasseranalyse",
+]
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(a, dtype="float64")) for a in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _lon_span_deg(km: float, lat: float) -> float:
+    cos_lat = max(math.cos(math.radians(min(abs(lat), 89.0))), 1e-6)
+    return min(km / (KM_PER_DEG_LAT * cos_lat), 360.0)
+
+
+class SpatialIndex:
+    """Index over ``lat``/``lon`` arrays; results are positions into those arrays (NaN points are skipped)."""
+
+    def __init__(self, lat, lon, cell_deg: float = DEFAULT_CELL_DEG):
+        self.lat = np.asarray(lat, dtype="float64")
+        self.lon = np.asarray(lon, dtype="float64")
+        self.cell_deg = cell_deg
+        self.ncols = int(math.ceil(360 / cell_deg)) + 1
+        valid = np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.lon)))
+        keys = self._keys(self.lat[valid], self.lon[valid])
+        order = np.argsort(keys, kind="stable")
+        self.positions = valid[order]
+        self.keys = keys[order]
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, lat_col: str = "lat", lon_col: str = "lon", **kwargs
+    ) -> "SpatialIndex":
+        return cls(
+            df[lat_col].to_numpy(dtype="float64", na_value=np.nan),
+            df[lon_col].to_numpy(dtype="float64", na_value=np.nan),
+            **kwargs,
+        )
+
+    def _rows_cols(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.floor((np.asarray(lat) + 90) / self.cell_deg).astype("int64")
+        cols = np.floor((np.asarray(lon) + 180) / self.cell_deg).astype("int64")
+        return rows, cols
+
+    def _keys(self, lat, lon) -> np.ndarray:
+        rows, cols = self._rows_cols(lat, lon)
+        return rows * self.ncols + cols
+
+    def _cell_ranges(
+        self, keys_lo: np.ndarray, keys_hi: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return np.searchsorted(self.keys, keys_lo, "left"), np.searchsorted(
+            self.keys, keys_hi, "right"
+        )
+
+    def bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Positions of points inside the box (``west > east`` crosses the antimeridian)."""
+        if west > east:
+            return np.concatenate(
+                [
+                    self.bbox(south, west, north, 180.0),
+                    self.bbox(south, -180.0, north, east),
+                ]
+            )
+        (r0, r1), (c0, c1) = self._rows_cols([south, north], [west, east])
+        rows = np.arange(r0, r1 + 1)
+        starts, ends = self._cell_ranges(rows * self.ncols + c0, rows * self.ncols + c1)
+        cand = self.positions[_expand_ranges(starts, ends)]
+        lat, lon = self.lat[cand], self.lon[cand]
+        return cand[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+
+    def radius(
+        self, lat: float, lon: float, km: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions and distances (km) of points within ``km`` of the centre, nearest first."""
+        dlat = km / KM_PER_DEG_LAT
+        dlon = _lon_span_deg(km, abs(lat) + dlat)
+        west, east = lon - dlon, lon + dlon
+        if dlon >= 180:
+            west, east = -180.0, 180.0
+        else:
+            west = west + 360 if west < -180 else west
+            east = east - 360 if east > 180 else east
+        cand = self.bbox(max(lat - dlat, -90), west, min(lat + dlat, 90), east)
+        dist = haversine_km(lat, lon, self.lat[cand], self.lon[cand])
+        keep = dist <= km
+        order = np.argsort(dist[keep], kind="stable")
+        return cand[keep][order], dist[keep][order]
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``k`` nearest points (positions, distances in km), nearest first."""
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype="int64"), np.empty(0)
+        km = self.cell_deg * KM_PER_DEG_LAT
+        # Everything within the search radius is exact, so stop once it holds k points
+        while True:
+            pos, dist = self.radius(lat, lon, km)
+            if len(pos) >= k or km > math.pi * EARTH_RADIUS_KM:
+                return pos[:k], dist[:k]
+            km *= 2
+
+    def join(self, lat, lon, km: float) -> pd.DataFrame:
+        """All pairs (query position ``left``, index position ``right``, ``distance_km``) within ``km``."""
+        qlat = np.asarray(lat, dtype="float64")
+        qlon = np.asarray(lon, dtype="float64")
+        qpos = np.flatnonzero(~(np.isnan(qlat) | np.isnan(qlon)))
+        empty = pd.DataFrame(
+            {
+                "left": np.empty(0, "int64"),
+                "right": np.empty(0, "int64"),
+                "distance_km": np.empty(0),
+            }
+        )
+        if len(qpos) == 0 or len(self) == 0:
+            return empty
+        qrows, qcols = self._rows_cols(qlat[qpos], qlon[qpos])
+        max_lat = min(float(np.max(np.abs(qlat[qpos]))) + km / KM_PER_DEG_LAT, 89.0)
+        dr = int(math.ceil(km / KM_PER_DEG_LAT / self.cell_deg))
+        dc = min(int(math.ceil(_lon_span_deg(km, max_lat) / self.cell_deg)), self.ncols)
+        lefts, rights = [], []
+        for off in range(-dr, dr + 1):
+            keys = (qrows + off) * self.ncols + qcols
+            # One contiguous key range per query covers all column offsets of this row
+            starts, ends = self._cell_ranges(keys - dc, keys + dc)
+            counts = ends - starts
+            lefts.append(np.repeat(qpos, counts))
+            rights.append(self.positions[_expand_ranges(starts, ends)])
+        left = np.concatenate(lefts)
+        right = np.concatenate(rights)
+        dist = haversine_km(qlat[left], qlon[left], self.lat[right], self.lon[right])
+        keep = dist <= km
+        pairs = pd.DataFrame(
+            {"left": left[keep], "right": right[keep], "distance_km": dist[keep]}
+        )
+        if 2 * dc + 1 >= self.ncols:
+            # Column ranges wrapped into neighbouring rows and may overlap
+            pairs = pairs.drop_duplicates(["left", "right"])
+        return pairs.sort_values(
+            ["left", "distance_km"], kind="stable", ignore_index=True
+        )
+
+
+def _expand_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(s, e)`` for all pairs without a Python loop."""
+    counts = np.maximum(ends - starts, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype="int64")
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + (np.arange(total) - offsets)
+
+
+def projects_with_boreholes(
+    projects: pd.DataFrame,
+    boreholes: pd.DataFrame,
+    km: float,
+    index: Optional[SpatialIndex] = None,
+    project_cols=("Breite", "Laenge"),
+    borehole_cols=("lat", "lon"),
+) -> pd.DataFrame:
+    """Spatial join: one row per (project, borehole) pair closer than ``km``."""
+    index = index or SpatialIndex.from_frame(boreholes, *borehole_cols)
+    pairs = index.join(
+        projects[project_cols[0]].to_numpy(dtype="float64", na_value=np.nan),
+        projects[project_cols[1]].to_numpy(dtype="float64", na_value=np.nan),
+        km,
+    )
+    left = projects.iloc[pairs["left"].to_numpy()].reset_index(drop=True)
+    right = (
+        boreholes.iloc[pairs["right"].to_numpy()]
+        .reset_index(drop=True)
+        .add_prefix("bohr_")
+    )
+    return pd.concat([left, right, pairs[["distance_km"]].round(3)], axis=1)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _index(name: str, version: str, lat_col: str, lon_col: str) -> SpatialIndex:
+    return SpatialIndex.from_frame(datastore.load(name), lat_col, lon_col)
+
+
+def load_index(name: str, lat_col: str = "lat", lon_col: str = "lon") -> SpatialIndex:
+    """Spatial index of dataset ``name``, shared across sessions and rebuilt only when the dataset version changes."""
+    return _index(name, datastore.dataset_version(name), lat_col, lon_col)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Spatial queries over boreholes and projects."
+    )
+    parser.add_argument(
+        "--dataset", default="boreholes", help="Dataset to search (default: boreholes)"
+    )
+    parser.add_argument(
+        "--output", default=None, help="Write the result as CSV instead of printing it"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("radius", help="Points within --km of a location")
+    p.add_argument("--lat", type=float, required=True)
+    p.add_argument("--lon", type=float, required=True)
+    p.add_argument("--km", type=float, required=True)
+    p = sub.add_parser("nearest", help="The --k points nearest to a location")
+    p.add_argument("--lat", type=float, required=True)
+    p.add_argument("--lon", type=float, required=True)
+    p.add_argument("--k", type=int, default=5)
+    p = sub.add_parser("bbox", help="Points inside a bounding box")
+    for name in ("south", "west", "north", "east"):
+        p.add_argument(f"--{name}", type=float, required=True)
+    p = sub.add_parser("join", help="Every project with the boreholes within --km")
+    p.add_argument("--km", type=float, required=True)
+    p.add_argument(
+        "--projects", default="projects", help="Project dataset (default: projects)"
+    )
+    args = parser.parse_args()
+
+    try:
+        points = datastore.read_dataset(args.dataset)
+    except (FileNotFoundError, KeyError) as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    lat_col, lon_col = (
+        ("lat", "lon") if "lat" in points.columns else ("Breite", "Laenge")
+    )
+    index = SpatialIndex.from_frame(points, lat_col, lon_col)
+
+    if args.command == "join":
+        result = projects_with_boreholes(
+            datastore.read_dataset(args.projects),
+            points,
+            args.km,
+            index=index,
+            borehole_cols=(lat_col, lon_col),
+        )
+    elif args.command == "bbox":
+        result = points.iloc[index.bbox(args.south, args.west, args.north, args.east)]
+    else:
+        if args.command == "radius":
+            pos, dist = index.radius(args.lat, args.lon, args.km)
+        else:
+            pos, dist = index.nearest(args.lat, args.lon, args.k)
+        result = points.iloc[pos].assign(distance_km=np.round(dist, 3))
+
+    if args.output:
+        result.to_csv(args.output, index=False, sep=";", decimal=",")
+        print(f"Wrote {len(result)} rows to {args.output}")
+    else:
+        with pd.option_context("display.max_rows", 200, "display.width", 200):
+            print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""GeoJSON point tiles for the project and borehole layers.
+
+Tiles are cut on demand from a per-dataset point store: up to
+``CLUSTER_MAX_ZOOM`` a tile holds the grid clusters of :mod:`utils.clusters`,
+above it the raw points found through a :class:`utils.spatial.SpatialIndex`.
+Rendered tiles are kept in an in-memory LRU and on disk under
+``data/.cache/tiles/<dataset>/<version>/``; a new dataset version gets a new
+directory and the old ones are removed.
+
+The :mod:`utils.sideserver` thread next to Streamlit serves
+``/tiles/<dataset>/<version>/<z>/<x>/<y>.geojson``, and :class:`GeoJSONTiles` is a Leaflet layer that fetches only
+the tiles of the current view:
+
+    python utils/tiles.py serve --port 8766
+    python utils/tiles.py seed boreholes --max-zoom 8
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import ParseResult, parse_qs, quote
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from branca.element import MacroElement
+from jinja2 import Template
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import datastore
+from utils.clusters import ClusterPyramid, mercator_xy
+from utils.sideserver import DEFAULT_HOST, DEFAULT_PORT, SideServer, route
+from utils.spatial import SpatialIndex
+
+TILES_DIR = os.path.join(datastore.CACHE_DIR, "tiles")
+CLUSTER_MAX_ZOOM = 14
+MAX_ZOOM = 22
+LRU_SIZE = 2048
+# Filtered sources (``?column=&value=``) kept at once, each with a pyramid and index of
+# its own
+FILTERED_SOURCES = 8
+
+
+class TileLayer(NamedTuple):
+    lat: str
+    lon: str
+    # Value counts per cluster are kept for these columns
+    categories: Tuple[str, ...]
+    # Properties of single points; the first ones make up the tooltip
+    columns: Tuple[str, ...]
+    label: str
+    # Columns a tile request may filter on
+    filters: Tuple[str, ...] = ()
+
+
+TILE_LAYERS: Dict[str, TileLayer] = {
+    "boreholes": TileLayer(
+        "lat",
+        "lon",
+        ("Projektname",),
+        ("Projektnummer", "Projektname", "Standort"),
+        "Bohrlöcher",
+        ("Projektname",),
+    ),
+    "projects": TileLayer(
+        "Breite",
+        "Laenge",
+        ("Team",),
+        ("Projektbezeichnung", "Team"),
+        "Projekte",
+        ("Team",),
+    ),
+    "geocoded": TileLayer(
+        "latitude",
+        "longitude",
+        ("Team", "geo_status"),
+        ("Projektbezeichnung", "Team", "geo_status"),
+        "Projekte",
+        ("Team", "geo_status"),
+    ),
+}
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """``(south, west, north, east)`` of an XYZ tile."""
+    n = 2**z
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def _where_key(where: Optional[Tuple[str, str]]) -> str:
+    if where is None:
+        return "all"
+    return hashlib.sha1(json.dumps(list(where)).encode("utf-8")).hexdigest()[:12]
+
+
+class TileSource:
+    """Points of one dataset version (optionally filtered), indexed for tile cutting."""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        df: pd.DataFrame,
+        where: Optional[Tuple[str, str]] = None,
+    ):
+        layer = TILE_LAYERS[name]
+        if layer.lat not in df.columns and {"lat", "lon"} <= set(df.columns):
+            layer = layer._replace(lat="lat", lon="lon")
+        if where is not None:
+            df = df[df[where[0]].astype("string") == where[1]]
+        self.name, self.version, self.where, self.layer = name, version, where, layer
+        self.columns = [c for c in layer.columns if c in df.columns]
+        self.pyramid = ClusterPyramid(
+            df, layer.lat, layer.lon, layer.categories, max_zoom=CLUSTER_MAX_ZOOM
+        )
+        points = self.pyramid.points
+        self.index = SpatialIndex.from_frame(points, layer.lat, layer.lon)
+        self.x, self.y = mercator_xy(self.index.lat, self.index.lon)
+
+    def frame(self, z: int, x: int, y: int) -> pd.DataFrame:
+        if z <= CLUSTER_MAX_ZOOM:
+            return self.pyramid.with_columns(self.pyramid.tile(z, x, y), self.columns)
+        pos = self.index.bbox(*tile_bounds(z, x, y))
+        # Points on a shared edge belong to exactly one tile
+        n = 2**z
+        pos = pos[(np.floor(self.x[pos] * n) == x) & (np.floor(self.y[pos] * n) == y)]
+        points = self.pyramid.points.iloc[pos]
+        out = pd.DataFrame(
+            {"lat": self.index.lat[pos], "lon": self.index.lon[pos], "count": 1}
+        )
+        for col in self.columns:
+            out[col] = points[col].to_numpy()
+        return out
+
+    def render(self, z: int, x: int, y: int) -> bytes:
+        frame = self.frame(z, x, y)
+        records = json.loads(
+            frame.drop(columns=["point"], errors="ignore").to_json(orient="records")
+        )
+        features = []
+        for rec in records:
+            lat, lon = rec.pop("lat"), rec.pop("lon")
+            if rec["count"] > 1:
+                first = self.layer.categories[0] if self.layer.categories else None
+                detail = rec.get(f"{first}_breakdown") if first else None
+                rec["label"] = f"{rec['count']} {self.layer.label}" + (
+                    f": {detail}" if detail else ""
+                )
+            else:
+                rec["label"] = " – ".join(
+                    str(rec[c]) for c in self.columns if rec.get(c) is not None
+                )
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [round(lon, 6), round(lat, 6)],
+                    },
+                    "properties": rec,
+                }
+            )
+        return json.dumps(
+            {"type": "FeatureCollection", "features": features},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = LRU_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: bytes) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class TileCache:
+    """Tiles of all datasets: memory LRU, then disk, then cut from the current :class:`TileSource`."""
+
+    def __init__(
+        self,
+        directory: str = TILES_DIR,
+        maxsize: int = LRU_SIZE,
+        filtered: int = FILTERED_SOURCES,
+    ):
+        self.directory = directory
+        self.memory = LRUCache(maxsize)
+        self.filtered = filtered
+        self._sources: Dict[str, TileSource] = {}
+        self._filtered: "OrderedDict[tuple, TileSource]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def source(self, name: str, where: Optional[Tuple[str, str]] = None) -> TileSource:
+        """The dataset's current source; ``where`` must name one of the layer's filter columns and a value
+        that occurs in it (KeyError otherwise), as it comes from the tile URL."""
+        version = datastore.dataset_version(name)
+        with self._lock:
+            current = self._sources.get(name)
+            if current is None or current.version != version:
+                current = TileSource(name, version, datastore.read_dataset(name))
+                self._sources[name] = current
+                for key in [k for k in self._filtered if k[0] == name]:
+                    del self._filtered[key]
+                self._prune(name, version)
+            if where is None:
+                return current
+            column, value = where
+            if column not in TILE_LAYERS[name].filters:
+                raise KeyError(f"{name} tiles cannot be filtered by {column!r}")
+            key = (name, version, where)
+            filtered = self._filtered.get(key)
+            if filtered is None:
+                points = current.pyramid.points
+                if not (points[column].astype("string") == value).any():
+                    raise KeyError(f"No {name} points with {column} = {value!r}")
+                filtered = TileSource(name, version, points, where)
+                self._filtered[key] = filtered
+                while len(self._filtered) > self.filtered:
+                    (old_name, old_version, old_where), _ = self._filtered.popitem(
+                        last=False
+                    )
+                    shutil.rmtree(
+                        os.path.join(
+                            self.directory, old_name, old_version, _where_key(old_where)
+                        ),
+                        ignore_errors=True,
+                    )
+            self._filtered.move_to_end(key)
+            return filtered
+
+    def _prune(self, name: str, version: str) -> None:
+        root = os.path.join(self.directory, name)
+        if os.path.isdir(root):
+            for entry in os.listdir(root):
+                if entry != version:
+                    shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+    def path(
+        self,
+        name: str,
+        version: str,
+        where: Optional[Tuple[str, str]],
+        z: int,
+        x: int,
+        y: int,
+    ) -> str:
+        return os.path.join(
+            self.directory,
+            name,
+            version,
+            _where_key(where),
+            str(z),
+            str(x),
+            f"{y}.geojson",
+        )
+
+    def get(
+        self, name: str, z: int, x: int, y: int, where: Optional[Tuple[str, str]] = None
+    ) -> Tuple[bytes, str]:
+        """Return ``(GeoJSON bytes, dataset version)`` of one tile."""
+        source = self.source(name, where)
+        key = (name, source.version, where, z, x, y)
+        data = self.memory.get(key)
+        if data is not None:
+            return data, source.version
+        path = self.path(name, source.version, where, z, x, y)
+        if os.path.exists(path):
+            with open(path, "rb") as fh:
+                data = fh.read()
+        else:
+            data = source.render(z, x, y)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        self.memory.put(key, data)
+        return data, source.version
+
+
+_TILE_PATH = re.compile(r"^/tiles/(\w+)/([\w-]+)/(\d+)/(\d+)/(\d+)\.geojson$")
+
+
+_CACHE: Optional[TileCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def tile_cache() -> TileCache:
+    """The process-wide tile cache behind the ``/tiles/`` route."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = TileCache()
+        return _CACHE
+
+
+@route("/tiles/")
+def _serve_tile(request: BaseHTTPRequestHandler, url: ParseResult) -> None:
+    m = _TILE_PATH.match(url.path)
+    if not m or m.group(1) not in TILE_LAYERS:
+        request.send_error(404)
+        return
+    name, version = m.group(1), m.group(2)
+    z, x, y = (int(v) for v in m.groups()[2:])
+    if z > MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        request.send_error(404)
+        return
+    query = parse_qs(url.query)
+    where = (
+        (query["column"][0], query["value"][0])
+        if "column" in query and "value" in query
+        else None
+    )
+    try:
+        data, current = tile_cache().get(name, z, x, y, where)
+    except (FileNotFoundError, KeyError) as e:
+        request.send_error(404, str(e))
+        return
+    request.send_response(200)
+    request.send_header("Content-Type", "application/geo+json")
+    request.send_header("Content-Length", str(len(data)))
+    request.send_header("Access-Control-Allow-Origin", "*")
+    # The URL names the version, so a matching tile never changes
+    request.send_header(
+        "Cache-Control", "public, max-age=86400" if version == current else "no-cache"
+    )
+    request.end_headers()
+    request.wfile.write(data)
+
+
+def tile_path(name: str, where: Optional[Tuple[str, str]] = None) -> str:
+    """URL path template of a dataset's tiles for the current version."""
+    path = f"/tiles/{name}/{datastore.dataset_version(name)}/{{z}}/{{x}}/{{y}}.geojson"
+    if where is not None:
+        path += f"?column={quote(where[0])}&value={quote(where[1])}"
+    return path
+
+
+class GeoJSONTiles(MacroElement):
+    """Leaflet layer that loads GeoJSON point tiles for the visible area and drops them when they leave it.
+
+    ``base_url`` defaults to ``TILE_SERVER_URL`` or, in the browser, the page's protocol and host on ``port``.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var base = {{ this.base_url|tojson }};
+            if (!base) {
+                // The map is rendered in a srcdoc iframe, which has no host of its own
+                var loc = location;
+                try { loc = loc.hostname ? loc : window.parent.location; } catch (e) {}
+                var protocol = loc.protocol === "https:" ? "https:" : "http:";
+                base = protocol + "//" + (loc.hostname || "localhost") + ":" + {{ this.port }};
+            }
+            var path = {{ this.path|tojson }};
+            var layers = {};
+            var grid = L.gridLayer({tileSize: 256, maxZoom: 22, updateWhenZooming: false});
+            grid.createTile = function(coords) {
+                var key = grid._tileCoordsToKey(coords);
+                var url = base + path.replace("{z}", coords.z).replace("{x}", coords.x).replace("{y}", coords.y);
+                fetch(url).then(function(r) { return r.json(); }).then(function(fc) {
+                    if (!grid._tiles[key]) { return; }
+                    layers[key] = L.geoJSON(fc, {
+                        pointToLayer: function(feature, latlng) {
+                            var n = feature.properties.count;
+                            return L.circleMarker(latlng, {
+                                radius: n > 1 ? 8 + 3 * Math.log2(n) : 5, color: {{ this.color|tojson }},
+                                fillOpacity: n > 1 ? 0.5 : 0.9, weight: 1
+                            });
+                        },
+                        onEachFeature: function(feature, layer) { layer.bindTooltip(String(feature.properties.label)); }
+                    }).addTo(map);
+                });
+                return document.createElement("div");
+            };
+            grid.on("tileunload", function(e) {
+                var key = grid._tileCoordsToKey(e.coords);
+                if (layers[key]) { map.removeLayer(layers[key]); delete layers[key]; }
+            });
+            grid.addTo(map);
+        })();
+        {% endmacro %}
+    """
+    )
+
+    def __init__(
+        self,
+        name: str,
+        where: Optional[Tuple[str, str]] = None,
+        base_url: Optional[str] = None,
+        port: int = DEFAULT_PORT,
+        color: str = "#1f77b4",
+    ):
+        super().__init__()
+        self._name = "GeoJSONTiles"
+        self.path = tile_path(name, where)
+        self.base_url = base_url or os.environ.get("TILE_SERVER_URL", "")
+        self.port = port
+        self.color = color
+
+
+def seed(
+    cache: TileCache, name: str, max_zoom: int, where: Optional[Tuple[str, str]] = None
+) -> int:
+    """Pre-render every non-empty tile of ``name`` up to ``max_zoom``; returns the number of tiles."""
+    source = cache.source(name, where)
+    count = 0
+    for z in range(max_zoom + 1):
+        n = 2**z
+        tiles = set(
+            zip(
+                np.floor(source.x * n).astype("int64"),
+                np.floor(source.y * n).astype("int64"),
+            )
+        )
+        for x, y in sorted(tiles):
+            cache.get(name, z, int(x), int(y), where)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve or pre-render GeoJSON point tiles."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="Run the tile server in the foreground")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help=f"Interface to listen on (default: {DEFAULT_HOST})",
+    )
+    p = sub.add_parser("seed", help="Pre-render tiles into the disk cache")
+    p.add_argument("dataset", choices=sorted(TILE_LAYERS))
+    p.add_argument("--max-zoom", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        try:
+            print(
+                f"Rendered {seed(TileCache(), args.dataset, args.max_zoom)} tiles of {args.dataset}"
+            )
+        except FileNotFoundError as e:
+            sys.stderr.write(f"{e}\n")
+            sys.exit(1)
+        return
+
+    server = SideServer(args.port, args.host)
+    print(
+        f"Serving tiles on http://{args.host}:{server.port}/tiles/<dataset>/<version>/<z>/<x>/<y>.geojson"
+    )
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
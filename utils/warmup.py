@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Warm-up at server start: heavy imports and the cached data the pages read first.
+
+Streamlit runs no app code before the first browser session, so a cold server
+makes its first visitor wait for leafmap and altair to import (seconds, mostly
+their shared ``jsonschema`` dependency) and for the datasets, cluster pyramids,
+spatial index and kepler.gl payload to be built. Launched as
+
+    python utils/warmup.py [streamlit options, e.g. --server.port 8501]
+
+the app is served like ``streamlit run Home.py`` while a background thread does
+that work at once. Every page calls :func:`page` first, which starts it as well,
+so under plain ``streamlit run`` the warm-up begins with the first session on
+whichever page it opens.
+``GIS_WARMUP=0`` turns it off. Step timings and the time to the first rendered
+page are kept in :data:`STARTUP` and shown on the Diagnostics page.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import NoReturn, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import Metrics
+
+HOME_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Home.py"
+)
+# Imported in the background; the pages import them again for free
+HEAVY_MODULES = ["altair", "folium", "streamlit_folium", "leafmap.foliumap"]
+WARM_DATASETS = ["boreholes", "projects", "geocoded", "changes"]
+RUNTIME_TIMEOUT = 30.0
+
+STARTUP = Metrics("startup")
+# Wall-clock start of the server when launched through main(); None under plain
+# ``streamlit run``
+SERVER_STARTED: Optional[float] = None
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_rendered = set()
+
+
+def warm_imports() -> None:
+    for name in HEAVY_MODULES:
+        with STARTUP.stage(f"import {name}"):
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+
+
+def warm_data() -> None:
+    """Fill the ``st.cache_*`` caches behind the default views of the map pages."""
+    from utils import datastore
+    from utils.changes import overlay_frame
+    from utils.clusters import load_pyramid
+    from utils.keplermap import MAX_MAP_POINTS, kepler_html, point_frame
+    from utils.spatial import load_index
+
+    available = []
+    for name in WARM_DATASETS:
+        try:
+            datastore.source_path(name)
+        except FileNotFoundError:
+            continue
+        with STARTUP.stage(f"load {name}"):
+            datastore.load(name)
+        available.append(name)
+
+    if "boreholes" in available:
+        with STARTUP.stage("boreholes pyramid"):
+            load_pyramid("boreholes", "lat", "lon", ["Projektname"])
+        with STARTUP.stage("boreholes index"):
+            load_index("boreholes")
+    if "geocoded" in available:
+        # The Project Map's first view: all points, or clusters at the default detail
+        # level, and the changes overlay
+        with STARTUP.stage("project map payload"):
+            df, lat_col, lon_col = point_frame(datastore.load("geocoded"))
+            version = datastore.dataset_version("geocoded")
+            if len(df) > MAX_MAP_POINTS:
+                pyramid = load_pyramid(
+                    "geocoded", lat_col, lon_col, ["Team", "geo_status"]
+                )
+                detail = pyramid.zoom_for(MAX_MAP_POINTS)
+                datasets = {"Status": pyramid.clusters(detail).drop(columns="point")}
+                keys = {"Status": f"{version}-z{detail}"}
+            else:
+                datasets, keys = {"Status": df}, {"Status": f"{version}-all"}
+            if "changes" in available:
+                datasets["Changes"] = overlay_frame(datastore.load("changes"))
+                keys["Changes"] = datastore.dataset_version("changes")
+            kepler_html(datasets, keys=keys)
+
+
+def run() -> Metrics:
+    """Warm up synchronously; returns :data:`STARTUP`."""
+    started = time.perf_counter()
+    warm_imports()
+    # The st.cache_* storage belongs to the Streamlit runtime, which the launcher starts
+    # after this thread; without one (bare mode, tests) the caches fall back to plain
+    # memory
+    from streamlit.runtime import Runtime
+
+    deadline = time.monotonic() + RUNTIME_TIMEOUT
+    while not Runtime.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    try:
+        warm_data()
+    except Exception as e:
+        STARTUP.gauge("warmup_error", str(e))
+    elapsed = time.perf_counter() - started
+    STARTUP.gauge("warmup_s", round(elapsed, 3))
+    steps = ", ".join(
+        f"{name} {stage['seconds']:.2f}s"
+        for name, stage in STARTUP.to_dict()["stages"].items()
+        if not name.startswith("render ")
+    )
+    sys.stderr.write(f"Warm-up finished in {elapsed:.1f} s: {steps}\n")
+    return STARTUP
+
+
+def start() -> Optional[threading.Thread]:
+    """Start the warm-up thread once per server process (not with ``GIS_WARMUP=0``)."""
+    global _thread
+    if os.environ.get("GIS_WARMUP", "1") == "0":
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run, name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def page() -> float:
+    """Call first on every page: starts the warm-up and returns the render start for
+    :func:`rendered` and :func:`stop`."""
+    start()
+    return time.perf_counter()
+
+
+def stop(page: str, started: float) -> NoReturn:
+    """``st.stop()`` for a page that ends early; what it shows counts as its render."""
+    import streamlit as st
+
+    rendered(page, started)
+    st.stop()
+
+
+def rendered(page: str, started: float) -> None:
+    """Record a page's first render, which took since ``started`` (``time.perf_counter()``)."""
+    with _lock:
+        if page in _rendered:
+            return
+        _rendered.add(page)
+        first = len(_rendered) == 1
+    STARTUP.add_stage(f"render {page}", time.perf_counter() - started)
+    if first and SERVER_STARTED is not None:
+        ttfr = round(time.time() - SERVER_STARTED, 3)
+        STARTUP.gauge("time_to_first_render_s", ttfr)
+        sys.stderr.write(
+            f"First page ({page}) rendered {ttfr:.2f} s after server start\n"
+        )
+
+
+def main(started: Optional[float] = None) -> None:
+    global SERVER_STARTED
+    SERVER_STARTED = started or time.time()
+    start()
+    from streamlit.web import cli
+
+    sys.argv = ["streamlit", "run", HOME_PATH, *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    launched = time.time()
+    # Run main() of the module the pages import, not of this __main__ copy, so they
+    # share STARTUP
+    from utils import warmup
+
+    warmup.main(launched)